@@ -0,0 +1,5 @@
+# Benchmarks and golden output checks of the scaling core. Run from the repository
+# root, not under a test runner:
+#
+#   python -m benchmarks.bench             # timings and memory per pass
+#   python -m benchmarks.golden            # every engine against the golden hashes
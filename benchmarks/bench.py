@@ -0,0 +1,170 @@
+# Benchmarks of the scaling core: times every stage of a scale (see harness.STAGES)
+# for test images of several kinds, sizes and formats, scale factors and engines,
+# and reports pixels per second and peak memory.
+#
+#   python -m benchmarks.bench
+#   python -m benchmarks.bench --engines numpy --sizes 256,512 --scales 2 --json numpy.json
+#   python -m benchmarks.bench --png sprite.png --scales 4,8
+#
+# Times are the best of --repeat runs. Peak memory is measured in a separate run
+# with tracemalloc (Python 3 only), next to what superxbr.peak_memory() predicts;
+# tracing makes that run several times slower, --no-memory leaves it out.
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from superxbr.cascade import format_bytes
+from superxbr.core import peak_memory
+
+from .harness import STAGES, harness_engines, run_stages, traced_peak
+from .images import KINDS, png_image, test_image
+
+# Timer for the stages: wall time, as precise as the platform offers.
+clock = getattr(time, "perf_counter", time.time)
+
+# One benchmark case: an image, how to scale it and with which engine.
+class Case(object):
+
+    def __init__(self, name, width, height, pixels, rgba, scale_factor, engine):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+        self.rgba = rgba
+        self.scale_factor = scale_factor
+        self.engine = engine
+
+    def output_pixels(self):
+        return self.width * self.height * self.scale_factor * self.scale_factor
+
+# Runs a case repeat times, and once more traced if memory is True. Returns its
+# report as a dict.
+def run_case(case, engines, repeat, memory=True):
+    engine = engines[case.engine]
+    best = None
+    for i in range(repeat):
+        times = run_stages(engine, case.pixels, case.width, case.height, case.scale_factor, case.rgba,
+                           clock=clock)[1]
+        if best is None or sum(times) < sum(best):
+            best = times
+    total = sum(best)
+    peak = None
+    if memory:
+        peak = traced_peak(run_stages, engine, case.pixels, case.width, case.height, case.scale_factor,
+                           case.rgba)
+    return {
+        "image": case.name,
+        "width": case.width,
+        "height": case.height,
+        "format": "RGBA" if case.rgba else "RGB",
+        "scale": case.scale_factor,
+        "engine": case.engine,
+        "seconds": dict(zip(STAGES, best)),
+        "total_seconds": total,
+        "pixels_per_second": case.output_pixels() / total if total else None,
+        "peak_bytes": peak,
+        "predicted_peak_bytes": peak_memory(case.width, case.height, case.scale_factor,
+                                            "python" if case.engine == "loops" else case.engine),
+    }
+
+# Builds the cases for the command line arguments.
+def collect_cases(args):
+    images = []
+    for path in args.png:
+        for rgba in args.formats:
+            width, height, pixels = png_image(path, rgba)
+            images.append((os.path.basename(path), width, height, pixels, rgba))
+    for kind in args.kinds:
+        for size in args.sizes:
+            for rgba in args.formats:
+                images.append((kind, size, size, test_image(kind, size, size, rgba), rgba))
+    return [Case(name, width, height, pixels, rgba, scale_factor, engine)
+            for name, width, height, pixels, rgba in images
+            for scale_factor in args.scales
+            for engine in args.engines]
+
+def number_list(text):
+    return [int(value) for value in text.split(",")]
+
+def name_list(text):
+    return [value for value in text.split(",") if value]
+
+def parse_args(argv, engines):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench",
+        description="Time every pass of the Super-xBR scaler and measure its peak memory.")
+    parser.add_argument("--engines", type=name_list, default=sorted(set(engines) - set(["loops"])),
+                        help="comma separated engines out of %s (default: all but loops, the slow "
+                             "reference)" % ", ".join(sorted(engines)))
+    parser.add_argument("--kinds", type=name_list, default=list(KINDS),
+                        help="comma separated generated images out of %s (default: all)" % ", ".join(KINDS))
+    parser.add_argument("--sizes", type=number_list, default=[32, 64, 128],
+                        help="comma separated widths of the square generated images (default 32,64,128)")
+    parser.add_argument("--formats", type=name_list, default=["rgba", "rgb"],
+                        help="comma separated pixel formats, rgba and/or rgb (default both)")
+    parser.add_argument("--scales", type=number_list, default=[2, 4, 8],
+                        help="comma separated scale factors (default 2,4,8)")
+    parser.add_argument("--png", action="append", default=[], metavar="FILE",
+                        help="also benchmark a PNG image; may be given several times")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest counts (default 1)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the traced run measuring peak memory")
+    parser.add_argument("--json", metavar="FILE", help="also write the reports to FILE as JSON")
+    args = parser.parse_args(argv)
+
+    for name in args.engines:
+        if name not in engines:
+            parser.error("unknown or unavailable engine: %s" % name)
+    for kind in args.kinds:
+        if kind not in KINDS:
+            parser.error("unknown image kind: %s" % kind)
+    for name in args.formats:
+        if name not in ("rgba", "rgb"):
+            parser.error("unknown pixel format: %s" % name)
+    args.formats = [name == "rgba" for name in args.formats]
+    for scale_factor in args.scales:
+        if scale_factor < 2 or scale_factor & (scale_factor - 1):
+            parser.error("scale factor not a power of 2: %d" % scale_factor)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+# Table row of a report.
+def report_line(report):
+    seconds = report["seconds"]
+    peak = report["peak_bytes"]
+    return "%-28s %-7s %9.4f %9.4f %9.4f %9.4f %9.4f %9.4f %8.3f %10s %10s" % (
+        "%s %dx%d %s x%d" % (report["image"], report["width"], report["height"], report["format"],
+                             report["scale"]),
+        report["engine"], seconds["to pixels"], seconds["first"], seconds["second"], seconds["third"],
+        seconds["to bytes"], report["total_seconds"], (report["pixels_per_second"] or 0) / 1e6,
+        "-" if peak is None else format_bytes(peak), format_bytes(report["predicted_peak_bytes"]))
+
+def main(argv=None):
+    engines = harness_engines()
+    args = parse_args(sys.argv[1:] if argv is None else argv, engines)
+
+    print("%-28s %-7s %9s %9s %9s %9s %9s %9s %8s %10s %10s" % (
+        "case", "engine", "to pixels", "first", "second", "third", "to bytes", "total", "Mpx/s", "peak",
+        "predicted"))
+    reports = []
+    for case in collect_cases(args):
+        report = run_case(case, engines, args.repeat, args.memory)
+        reports.append(report)
+        print(report_line(report))
+        sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "reports": reports}, f, indent=1, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
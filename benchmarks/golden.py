@@ -0,0 +1,291 @@
+# Golden output checks: hashes of the buffer every pass of every 2x step leaves
+# behind, for a fixed set of test images, made once with kernel.superxbr_loops(),
+# the plain loops every engine must match bit for bit, and kept in golden.json.
+#
+#   python -m benchmarks.golden                   # check every engine
+#   python -m benchmarks.golden --engines numpy   # check some of them
+#   python -m benchmarks.golden --update          # remake golden.json with the loops
+#
+# Engines with passes (see harness.harness_engines()) are checked pass by pass, so a
+# difference shows up at the first pass that makes it. The ways of running them
+# that have no passes of their own to hook into (superxbr.scale() on one and on
+# several processes, the streaming scaler and the scaler through scratch files)
+# are checked against the final hash. The incremental scaler is checked against
+# superxbr.scale() after edits at the interior, the borders and the corners of some
+# of the cases, both its whole output and the rows it reports as changed. The batch
+# scaler of the command line is checked on the files of a directory with a damaged
+# one among them, which must fail on its own while the others come out as the
+# golden hashes say.
+# Remaking golden.json is only right when the output is meant to change, together
+# with kernel.ALGORITHM_VERSION.
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+from superxbr.cli import main as cli_main
+from superxbr.core import ENGINES, scale
+from superxbr.incremental import IncrementalScale
+from superxbr.kernel import ALGORITHM_VERSION, PASS_NAMES
+from superxbr.mapped import scale_mapped
+from superxbr.png import PNG_SIGNATURE, write_chunk, write_png
+from superxbr.stream import BufferRows, scale_stream
+
+from .harness import harness_engines, pass_hashes
+from .images import png_image, test_image
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden.json")
+
+# (image kind, width, height, RGBA, scale factor) of every golden case: the sizes
+# and formats the benchmarks cover at sizes the loops get through quickly, images
+# narrower than the border of the second pass, and one large enough for the
+# engines to split every pass into several bands.
+GOLDEN_CASES = [
+    ("sprite", 24, 16, True, 2), ("sprite", 24, 16, True, 4), ("sprite", 24, 16, True, 8),
+    ("sprite", 24, 16, False, 2), ("sprite", 24, 16, False, 4), ("sprite", 24, 16, False, 8),
+    ("noise", 13, 9, True, 2), ("noise", 13, 9, True, 4), ("noise", 13, 9, True, 8),
+    ("noise", 13, 9, False, 2), ("noise", 13, 9, False, 4),
+    ("sprite", 1, 1, True, 4), ("noise", 3, 2, True, 8), ("noise", 7, 1, False, 4), ("noise", 1, 5, True, 4),
+    ("sprite", 200, 180, True, 2),
+]
+
+# Cases of the incremental check: images with interior pixels and border rows of
+# their own, and one tall enough for edits at the top and the bottom to be updated
+# as separate groups of rows (see incremental.GROUP_GAP).
+INCREMENTAL_CASES = [
+    ("sprite", 24, 16, True, 2), ("sprite", 24, 16, True, 4), ("noise", 13, 9, True, 2), ("noise", 13, 9, True, 4),
+    ("noise", 13, 9, False, 4), ("noise", 13, 60, True, 2),
+]
+
+# Worker processes the batch check runs with: this process, and a pool.
+BATCH_WORKERS = [1, 2]
+
+# Band height of the streaming check, small enough for several bands per case.
+STREAM_BAND_ROWS = 8
+
+def case_name(kind, width, height, rgba, scale_factor):
+    return "%s %dx%d %s x%d" % (kind, width, height, "RGBA" if rgba else "RGB", scale_factor)
+
+# Golden hashes by case name, as pass_hashes() returns them.
+def load_golden():
+    with open(GOLDEN_FILE) as f:
+        golden = json.load(f)
+    if golden["algorithm_version"] != ALGORITHM_VERSION:
+        raise ValueError("%s was made for version %d of the algorithm's output, not %d; remake it with "
+                         "--update" % (GOLDEN_FILE, golden["algorithm_version"], ALGORITHM_VERSION))
+    return golden["cases"]
+
+def save_golden(cases):
+    with open(GOLDEN_FILE, "w") as f:
+        json.dump({"algorithm_version": ALGORITHM_VERSION, "cases": cases}, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+# Final scaled bytes of a case for each way of running engine_name that has no passes
+# of its own, as {"scale": ..., "parallel": ..., "stream": ..., "mapped": ...}.
+def scaled_outputs(engine_name, pixels, width, height, rgba, scale_factor):
+    out_width = width * scale_factor
+    streamed = bytearray(out_width * height * scale_factor * 4)
+    scale_stream(BufferRows(pixels, width, 4 if rgba else 3), BufferRows(streamed, out_width), width, height,
+                 scale_factor, rgba, engine_name, band_rows=STREAM_BAND_ROWS)
+    mapped = bytearray(len(streamed))
+    scale_mapped(pixels, BufferRows(mapped, out_width), width, height, scale_factor, rgba, engine_name,
+                 band_rows=STREAM_BAND_ROWS)
+    return {
+        "scale": scale(pixels, width, height, scale_factor, rgba, engine_name),
+        "parallel": scale(pixels, width, height, scale_factor, rgba, engine_name, workers=2),
+        "stream": bytes(streamed),
+        "mapped": bytes(mapped),
+    }
+
+# (description, pixels) of the edits the incremental check makes one after the
+# other, as (x, y) pixels of a width * height image to invert.
+def incremental_edits(width, height):
+    return [
+        ("interior", [(width // 2, height // 2)]),
+        ("top left corner", [(0, 0)]),
+        ("bottom right corner", [(width - 1, height - 1)]),
+        ("top right and bottom left corners", [(width - 1, 0), (0, height - 1)]),
+        ("left and right borders", [(0, height // 2), (width - 1, height // 3)]),
+        ("top and bottom borders", [(width // 3, 0), (width // 2, height - 1)]),
+        ("interior and corner", [(width // 3, height // 2), (width - 1, height - 1)]),
+    ]
+
+# Lines describing where IncrementalScale.update() differs from scale() on engine_name
+# after each of the edits above, if it does: in the whole output, or in the output
+# from before with only the rows update() reports as changed written again.
+def incremental_differences(engine_name, pixels, width, height, rgba, scale_factor):
+    channels = 4 if rgba else 3
+    out_width = width * scale_factor
+    image = IncrementalScale(pixels, width, height, scale_factor, rgba, engine_name)
+    pixels = bytearray(pixels)
+    written = bytearray(image.rows())
+    problems = []
+    for description, points in incremental_edits(width, height):
+        for x, y in points:
+            for i in range((y * width + x) * channels, (y * width + x + 1) * channels):
+                pixels[i] ^= 0xFF
+        changed = image.update(bytes(pixels))
+        image.write_rows(BufferRows(written, out_width), changed)
+        expected = scale(bytes(pixels), width, height, scale_factor, rgba, engine_name)
+        if image.rows() != expected:
+            problems.append("incremental output differs after the %s edit" % description)
+        elif bytes(written) != expected:
+            problems.append("incremental changed rows miss some after the %s edit" % description)
+    return problems
+
+# Writes a PNG file with a valid header and image data that is not zlib data, as a
+# damaged file has.
+def write_damaged_png(path):
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        write_chunk(f, b"IHDR", struct.pack(">IIBBBBB", 4, 4, 8, 6, 0, 0, 0))
+        write_chunk(f, b"IDAT", b"not image data")
+        write_chunk(f, b"IEND", b"")
+
+# Lines describing where `python -m superxbr --batch` goes wrong on engine_name with
+# workers processes, if it does, for the RGBA cases at scale_factor written as PNG
+# files to a directory with a damaged file in the middle: the damaged file must be
+# the only one reported, and the others must match their final golden hashes.
+def batch_differences(engine_name, workers, cases, golden, scale_factor):
+    directory = tempfile.mkdtemp(prefix="superxbr-golden-")
+    try:
+        inputs = os.path.join(directory, "in")
+        outputs = os.path.join(directory, "out")
+        os.mkdir(inputs)
+        expected = {}
+        for number, case in enumerate(cases):
+            kind, width, height = case[:3]
+            name = "%d.png" % (2 * number)
+            write_png(os.path.join(inputs, name), width, height, test_image(kind, width, height))
+            expected[name] = golden[case_name(*case)][-1][-1]
+        damaged = os.path.join(inputs, "1.png")
+        write_damaged_png(damaged)
+
+        errors = os.path.join(directory, "errors")
+        stderr = sys.stderr
+        sys.stderr = open(errors, "w")
+        try:
+            status = cli_main(["--batch", "-q", "-s", str(scale_factor), "--engine", engine_name,
+                               "-j", str(workers), inputs, "-o", outputs])
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+        with open(errors) as f:
+            reported = [line.split(": ")[1] for line in f if line.startswith("superxbr: ")]
+
+        problems = []
+        if status != 1:
+            problems.append("exit status %r instead of 1" % status)
+        if reported != [damaged]:
+            problems.append("reported %s instead of the damaged file" %
+                            (", ".join(os.path.basename(path) for path in reported) or "nothing"))
+        for name, final in sorted(expected.items()):
+            output = os.path.join(outputs, name)
+            if not os.path.exists(output):
+                problems.append("%s not written" % name)
+            elif hashlib.sha1(png_image(output)[2]).hexdigest() != final:
+                problems.append("%s output differs" % name)
+        return problems
+    finally:
+        shutil.rmtree(directory)
+
+# Lines describing where the hashes of a case differ from the golden ones, if they do.
+def pass_differences(golden, hashes):
+    if len(golden) != len(hashes):
+        return ["%d steps instead of %d" % (len(hashes), len(golden))]
+    for step, (expected, actual) in enumerate(zip(golden, hashes), 1):
+        for pass_number, (a, b) in enumerate(zip(expected, actual), 1):
+            if a != b:
+                return ["%s pass of step %d differs" % (PASS_NAMES[pass_number], step)]
+    return []
+
+def parse_args(argv, engines):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.golden",
+        description="Check every pass of the Super-xBR engines against golden hashes of the reference loops.")
+    parser.add_argument("--engines", default=",".join(sorted(engines)),
+                        help="comma separated engines out of %s (default: all)" % ", ".join(sorted(engines)))
+    parser.add_argument("--update", action="store_true",
+                        help="remake %s with the reference loops instead of checking" %
+                             os.path.basename(GOLDEN_FILE))
+    args = parser.parse_args(argv)
+    args.engines = [name for name in args.engines.split(",") if name]
+    for name in args.engines:
+        if name not in engines:
+            parser.error("unknown or unavailable engine: %s" % name)
+    return args
+
+def main(argv=None):
+    engines = harness_engines()
+    args = parse_args(sys.argv[1:] if argv is None else argv, engines)
+
+    if args.update:
+        cases = {}
+        for case in GOLDEN_CASES:
+            kind, width, height, rgba, scale_factor = case
+            pixels = test_image(kind, width, height, rgba)
+            cases[case_name(*case)] = pass_hashes(engines["loops"], pixels, width, height, scale_factor, rgba)
+            print("%s: done" % case_name(*case))
+        save_golden(cases)
+        return 0
+
+    try:
+        golden = load_golden()
+    except (IOError, OSError, ValueError, KeyError) as e:
+        print("golden: %s" % e, file=sys.stderr)
+        return 2
+
+    failures = 0
+    for case in GOLDEN_CASES:
+        kind, width, height, rgba, scale_factor = case
+        name = case_name(*case)
+        if name not in golden:
+            print("%s: no golden hashes, remake them with --update" % name)
+            failures += 1
+            continue
+        pixels = test_image(kind, width, height, rgba)
+        final = golden[name][-1][-1]
+        for engine_name in args.engines:
+            problems = pass_differences(golden[name], pass_hashes(engines[engine_name], pixels, width, height,
+                                                                  scale_factor, rgba))
+            if engine_name in ENGINES:
+                for way, scaled in sorted(scaled_outputs(engine_name, pixels, width, height, rgba,
+                                                         scale_factor).items()):
+                    if hashlib.sha1(scaled).hexdigest() != final:
+                        problems.append("%s output differs" % way)
+            print("%s, %s: %s" % (name, engine_name, "; ".join(problems) or "ok"))
+            failures += len(problems) > 0
+
+    for case in INCREMENTAL_CASES:
+        kind, width, height, rgba, scale_factor = case
+        pixels = test_image(kind, width, height, rgba)
+        for engine_name in args.engines:
+            if engine_name not in ENGINES:
+                continue
+            problems = incremental_differences(engine_name, pixels, width, height, rgba, scale_factor)
+            print("%s, %s incremental: %s" % (case_name(*case), engine_name, "; ".join(problems) or "ok"))
+            failures += len(problems) > 0
+
+    # the batch reads RGBA PNG files, all at one scale factor
+    batch_cases = [case for case in GOLDEN_CASES if case[3] and case[4] == 2 and case[1] * case[2] < 1000]
+    for engine_name in args.engines:
+        if engine_name not in ENGINES:
+            continue
+        for workers in BATCH_WORKERS:
+            problems = batch_differences(engine_name, workers, batch_cases, golden, 2)
+            print("batch x2 with a damaged file, %s, %d workers: %s" % (engine_name, workers,
+                                                                       "; ".join(problems) or "ok"))
+            failures += len(problems) > 0
+    if failures:
+        print("%d failed" % failures)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
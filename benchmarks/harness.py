@@ -0,0 +1,97 @@
+# Runs the scaler pass by pass, so that the benchmarks can time every pass and the
+# golden checks can hash the buffer every pass leaves behind.
+#
+# The engines' 2x scalers are their PASSES run one after the other (see
+# kernel.run_passes()), so running the passes here one by one, with the cascade's
+# buffers (see cascade.py), scales exactly as superxbr.scale() does.
+
+import hashlib
+import time
+
+from superxbr import kernel
+from superxbr.cascade import buffer_sizes, cascade_steps, step_buffer
+from superxbr.core import ENGINES
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2: no peak memory measurement
+    tracemalloc = None
+
+# Stages a scale is timed in, in order: the conversion of the original bytes to packed
+# pixels, the three passes (summed over the 2x steps) and the conversion of the
+# result back to bytes.
+STAGES = ("to pixels", "first", "second", "third", "to bytes")
+
+# Engines the harness runs by name: the installed engines of superxbr.core, and
+# "loops", kernel.superxbr_loops(), the reference every engine must match.
+def harness_engines():
+    engines = dict((name, (module, module.PASSES)) for name, module in ENGINES.items())
+    engines["loops"] = (kernel, kernel.LOOP_PASSES)
+    return engines
+
+def no_progress(pass_number, fraction):
+    pass
+
+# Hex digest of the first count packed pixels of an engine buffer.
+def pixels_hash(module, pixels, count):
+    return hashlib.sha1(module.pixels_to_bytes(pixels, 0, count)).hexdigest()
+
+# Scales RGBA bytes (or RGB bytes if rgba is False) of width * height pixels by
+# scale_factor with the passes of an engine from harness_engines(), like scale().
+# after_pass, if given, is called as after_pass(step, pass_number, buffer, count)
+# after every pass, step counting the 2x steps from 1 and buffer holding count
+# output pixels of that step; the time it takes is left out of the stage times.
+# Returns (scaled RGBA bytes, seconds per stage as in STAGES).
+def run_stages(engine, pixels, width, height, scale_factor, rgba=True, after_pass=None, clock=time.time):
+    module, passes = engine
+    times = [0.0] * len(STAGES)
+
+    start = clock()
+    source = module.pixels_from_bytes(pixels, rgba)
+    times[0] = clock() - start
+
+    steps = cascade_steps(scale_factor)
+    final = width * height * scale_factor * scale_factor
+    buffers = [module.allocate(size) for size in buffer_sizes(final, steps)]
+    for step in range(steps):
+        output_data = buffers[step_buffer(step, steps)]
+        for pass_number, run_pass in enumerate(passes, 1):
+            start = clock()
+            run_pass(source, width, height, output_data, no_progress)
+            times[pass_number] += clock() - start
+            if after_pass is not None:
+                after_pass(step + 1, pass_number, output_data, width * height * 4)
+        source = output_data
+        width *= 2
+        height *= 2
+
+    start = clock()
+    scaled = module.pixels_to_bytes(source, 0, width * height)
+    times[-1] = clock() - start
+    return scaled, times
+
+# Hashes (see pixels_hash()) of the buffer after every pass of a scale with
+# run_stages(), as a list of [first, second, third] per 2x step.
+def pass_hashes(engine, pixels, width, height, scale_factor, rgba=True):
+    module = engine[0]
+    hashes = []
+    def after_pass(step, pass_number, buffer, count):
+        if pass_number == 1:
+            hashes.append([])
+        hashes[-1].append(pixels_hash(module, buffer, count))
+    run_stages(engine, pixels, width, height, scale_factor, rgba, after_pass)
+    return hashes
+
+# Bytes Python allocated at the peak of calling function(*args), counting NumPy
+# arrays too, or None on Python 2. Tracing slows every allocation down, so this
+# should not be timed.
+def traced_peak(function, *args):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
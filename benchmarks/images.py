@@ -0,0 +1,93 @@
+# Test images for the benchmarks and golden checks, generated from a seed so that
+# they come out byte for byte the same on every platform and Python version.
+#
+# - sprite: pixel art on a transparent background, outlined shapes in a small
+#   palette with some dithering, mostly uniform areas like real sprites.
+# - noise: random bytes in every channel, the worst case with no uniform areas.
+
+from superxbr.png import read_png
+from superxbr.pixels import as_bytes, rgba_to_rgb
+
+KINDS = ("sprite", "noise")
+
+# Palette of the sprites, as RGB.
+SPRITE_PALETTE = [(34, 32, 52), (69, 40, 60), (102, 57, 49), (143, 86, 59), (223, 113, 38), (217, 160, 102),
+                  (238, 195, 154), (251, 242, 54), (153, 229, 80), (106, 190, 48), (55, 148, 110),
+                  (91, 110, 225), (99, 155, 255), (203, 219, 252), (255, 255, 255), (172, 50, 50)]
+
+# Deterministic pseudo random numbers, the same on Python 2 and 3 (unlike random.Random).
+class Numbers(object):
+
+    def __init__(self, seed):
+        self.state = (seed * 2654435761 + 1) & 0xffffffff
+
+    # Integer from 0 to limit - 1.
+    def below(self, limit):
+        # xorshift32
+        x = self.state
+        x ^= (x << 13) & 0xffffffff
+        x ^= x >> 17
+        x ^= (x << 5) & 0xffffffff
+        self.state = x
+        return x % limit
+
+# RGBA bytes of a random sprite of width * height pixels.
+def sprite(width, height, seed=1):
+    numbers = Numbers(seed)
+    pixels = bytearray(width * height * 4)
+
+    def fill(x0, y0, x1, y1, colour, inside=None):
+        for y in range(max(0, y0), min(height, y1)):
+            for x in range(max(0, x0), min(width, x1)):
+                if inside is None or inside(x, y):
+                    i = (y * width + x) * 4
+                    pixels[i:i + 4] = bytearray(colour + (255,))
+
+    for shape in range(max(1, width * height // 48)):
+        colour = SPRITE_PALETTE[numbers.below(len(SPRITE_PALETTE))]
+        outline = tuple(c // 3 for c in colour)
+        w = 2 + numbers.below(max(1, width // 3))
+        h = 2 + numbers.below(max(1, height // 3))
+        x0 = numbers.below(width) - w // 2
+        y0 = numbers.below(height) - h // 2
+        kind = numbers.below(3)
+        if kind == 0:
+            fill(x0, y0, x0 + w, y0 + h, outline)
+            fill(x0 + 1, y0 + 1, x0 + w - 1, y0 + h - 1, colour)
+        elif kind == 1:
+            cx = x0 + w / 2.0
+            cy = y0 + h / 2.0
+            rx = w / 2.0
+            ry = h / 2.0
+            fill(x0, y0, x0 + w, y0 + h, outline,
+                 lambda x, y: ((x + 0.5 - cx) / rx) ** 2 + ((y + 0.5 - cy) / ry) ** 2 <= 1)
+            fill(x0, y0, x0 + w, y0 + h, colour,
+                 lambda x, y: ((x + 0.5 - cx) / (rx - 1)) ** 2 + ((y + 0.5 - cy) / (ry - 1)) ** 2 <= 1
+                 if rx > 1 and ry > 1 else False)
+        else:
+            # checkerboard dithering between two palette colours
+            fill(x0, y0, x0 + w, y0 + h, colour, lambda x, y: (x + y) % 2 == 0)
+            fill(x0, y0, x0 + w, y0 + h, outline, lambda x, y: (x + y) % 2 == 1)
+    return bytes(pixels)
+
+# RGBA bytes of random noise of width * height pixels.
+def noise(width, height, seed=1):
+    numbers = Numbers(seed)
+    return bytes(bytearray(numbers.below(256) for i in range(width * height * 4)))
+
+# Pixels of a test image: RGBA bytes, or RGB bytes if rgba is False, of a generated
+# kind (see KINDS) or a PNG file.
+def test_image(kind, width, height, rgba=True, seed=1):
+    if kind == "sprite":
+        pixels = sprite(width, height, seed)
+    elif kind == "noise":
+        pixels = noise(width, height, seed)
+    else:
+        raise ValueError("unknown image kind: %s (available: %s)" % (kind, ", ".join(KINDS)))
+    return pixels if rgba else bytes(rgba_to_rgb(pixels))
+
+# (width, height, RGBA bytes, or RGB bytes if rgba is False) of a PNG file.
+def png_image(path, rgba=True):
+    width, height, pixels = read_png(path)
+    pixels = as_bytes(pixels)
+    return width, height, pixels if rgba else bytes(rgba_to_rgb(pixels))
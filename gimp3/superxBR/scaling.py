@@ -0,0 +1,426 @@
+# The scaling side of the GIMP 3 plugin (superxBR.py next to this file): reading
+# and writing layers through GEGL buffers and running the superxbr package on them,
+# as the GIMP 2 plugin at the top of the repository does through pixel regions.
+# superxBR.py only imports this module once one of its procedures runs, since
+# importing the scaling core imports NumPy, which would slow down the query GIMP
+# runs every plugin for at startup.
+#
+# Pixels go through GEGL as 8-bit non-linear RGBA whatever the layer's format,
+# converted by GEGL on the way, in bands of whole rows of the buffer's native tiles,
+# so a layer is never fetched in one piece.
+
+import os
+
+import gi
+gi.require_version("Gimp", "3.0")
+gi.require_version("Gegl", "0.4")
+from gi.repository import Gegl, Gimp
+
+import superxbr
+from superxbr.cli import FileJob, collect_jobs, error_text
+from superxbr.kernel import PASS_NAMES
+from superxbr.profile import Profile, stage_end, stage_start, write_report
+from superxbr.progress import cancel_on_signals
+from superxbr.stream import BAND_ROWS
+
+# Babl format of the pixels handed to and taken from the scaler.
+PIXEL_FORMAT = "R'G'B'A u8"
+
+# Images whose whole-image scaling would need more memory than this (in bytes) are
+# streamed through the GEGL buffers in bands of rows, with memory proportional to
+# their width.
+STREAM_MEMORY = 256 << 20
+
+# If $SUPERXBR_SCRATCH names a directory, images above STREAM_MEMORY are scaled with
+# the buffers of the cascade in memory-mapped temporary files there instead of
+# streamed (see superxbr/mapped.py).
+SCRATCH_DIRECTORY = os.environ.get("SUPERXBR_SCRATCH") or None
+
+# Cache of scaled layers, shared with the GIMP 2 plugin, see superxBR.py at the top
+# of the repository.
+RESULT_CACHE = superxbr.ResultCache()
+
+# Progress callback for the scaling engines that drives GIMP's progress bar, as in
+# the GIMP 2 plugin: one bar over every pass of every step, updated a few times a
+# second and cancelled with cancel, with a message naming the step and the memory
+# the scaler holds at its peak.
+def gimp_progress(drawable_name, memory, cancel):
+    bar = superxbr.ThrottledProgress(Gimp.progress_update, cancel)
+    current_pass = [None]
+    def update(step, steps, pass_number, fraction):
+        if (step, pass_number) != current_pass[0]:
+            step_text = " (step %d of %d)" % (step, steps) if steps > 1 else ""
+            message = "Running " + PASS_NAMES[pass_number] + " pass of Super-xBR" + step_text + \
+                      " on " + drawable_name + ", using " + superxbr.format_bytes(memory) + "..."
+            if current_pass[0] is None:
+                Gimp.progress_init(message)
+            else:
+                Gimp.progress_set_text(message)
+            current_pass[0] = (step, pass_number)
+        bar.scale(step, steps, pass_number, fraction)
+    return update
+
+# Name the incremental scaling state of a layer is kept under in the cache: its
+# image's file, or the image's ID in this session for images never saved, and the
+# layer's name.
+def layer_name(image, drawable):
+    image_file = image.get_file()
+    path = image_file.get_path() if image_file is not None else None
+    return "%s|%s" % (path or "image %d" % image.get_id(), drawable.get_name())
+
+# If $SUPERXBR_PROFILE names a file, every run writes a report of how long each of
+# its stages took there as JSON (see superxbr/profile.py), replacing the last one.
+def run_profile(image, drawable, scale_factor):
+    if not os.environ.get("SUPERXBR_PROFILE"):
+        return None
+    return Profile(layer=layer_name(image, drawable), width=drawable.get_width(), height=drawable.get_height(),
+                   scale=scale_factor)
+
+# Row store (see superxbr/stream.py) reading and writing whole rows of a GEGL
+# buffer as RGBA bytes, or as pixel_bytes bytes per pixel of another Babl format;
+# a pixel_format of None is the buffer's own.
+class GeglRows(object):
+
+    def __init__(self, buffer, width, pixel_format=PIXEL_FORMAT, pixel_bytes=4):
+        self.buffer = buffer
+        self.width = width
+        self.pixel_format = pixel_format
+        self.pixel_bytes = pixel_bytes
+
+    def read(self, y0, y1):
+        return self.buffer.get(Gegl.Rectangle.new(0, y0, self.width, y1 - y0), 1.0, self.pixel_format,
+                               Gegl.AbyssPolicy.CLAMP)
+
+    def write(self, y0, data):
+        rows = len(data) // (self.width * self.pixel_bytes)
+        self.buffer.set(Gegl.Rectangle.new(0, y0, self.width, rows), self.pixel_format, bytes(data))
+
+# Rows per band of a buffer's reads and writes: whole rows of its tiles, about
+# BAND_ROWS of them.
+def tile_band_rows(buffer):
+    tile_height = buffer.get_property("tile-height")
+    return max(tile_height, BAND_ROWS // tile_height * tile_height)
+
+# RGBA bytes (or others, as for GeglRows) of the width * height pixels of a buffer,
+# read band of tiles by band of tiles.
+def read_pixels(buffer, width, height, pixel_format=PIXEL_FORMAT, pixel_bytes=4):
+    rows = GeglRows(buffer, width, pixel_format, pixel_bytes)
+    band_rows = tile_band_rows(buffer)
+    row_bytes = width * pixel_bytes
+    pixels = bytearray(height * row_bytes)
+    for y0 in range(0, height, band_rows):
+        y1 = min(height, y0 + band_rows)
+        pixels[y0 * row_bytes:y1 * row_bytes] = rows.read(y0, y1)
+    return bytes(pixels)
+
+# Writes RGBA bytes (or others, as for GeglRows) of width * height pixels to a
+# buffer, band of tiles by band of tiles.
+def write_pixels(buffer, width, height, pixels, pixel_format=PIXEL_FORMAT, pixel_bytes=4):
+    rows = GeglRows(buffer, width, pixel_format, pixel_bytes)
+    band_rows = tile_band_rows(buffer)
+    row_bytes = width * pixel_bytes
+    pixels = memoryview(pixels)
+    for y0 in range(0, height, band_rows):
+        rows.write(y0, pixels[y0 * row_bytes:min(height, y0 + band_rows) * row_bytes])
+
+# Merges what was written to a drawable's shadow buffer into it, as one undo step.
+def finish_drawable(drawable, shadow, width, height):
+    shadow.flush()
+    drawable.merge_shadow(True)
+    drawable.update(0, 0, width, height)
+
+# Streams width * height RGBA pixels through the streaming scaler into a drawable's
+# shadow buffer. Its steps read back the rows the last one wrote, which only come
+# back as written from an 8-bit non-linear drawable; others are streamed into a
+# temporary file first and copied over band by band.
+def stream_drawable(source, image, shadow, width, height, scale_factor, progress, skip_transparent,
+                    profile=None):
+    out_width = width * scale_factor
+    out_height = height * scale_factor
+    if image.get_precision() == Gimp.Precision.U8_NON_LINEAR:
+        superxbr.scale_stream(source, GeglRows(shadow, out_width), width, height, scale_factor,
+                              progress=progress, skip_transparent=skip_transparent, profile=profile)
+        return
+    scaled = superxbr.FileRows(out_width)
+    try:
+        superxbr.scale_stream(source, scaled, width, height, scale_factor, progress=progress,
+                              skip_transparent=skip_transparent, profile=profile)
+        destination = GeglRows(shadow, out_width)
+        band_rows = tile_band_rows(shadow)
+        for y in range(0, out_height, band_rows):
+            destination.write(y, scaled.read(y, min(y + band_rows, out_height)))
+    finally:
+        scaled.close()
+
+# Runs scale_image(cancel) in an undo group of image, cancelled by cancel_file or a
+# signal, and ends the group however it ends.
+def cancellable(image, scale_image, cancel_file):
+    cancel = superxbr.Cancel(cancel_file)
+    Gimp.context_push()
+    image.undo_group_start()
+    try:
+        with cancel_on_signals(cancel):
+            scale_image(cancel)
+    except superxbr.Cancelled:
+        pass
+    finally:
+        image.undo_group_end()
+        Gimp.context_pop()
+
+# Scales a drawable to out_width * out_height into a new layer of its image and
+# flattens the image. Sizes that are not a power of 2 times the drawable's are
+# resampled from the smallest power of 2 scale that covers them (see
+# superxbr/resample.py), without the incremental state. The passes run on workers
+# processes (0 for one per CPU), except for the incremental state and streamed
+# images, which are scaled on one.
+def scale_drawable(image, drawable, out_width, out_height, skip_transparent, incremental, workers, cancel):
+    original_width = drawable.get_width()
+    original_height = drawable.get_height()
+
+    scale_factor = out_width // original_width
+    resizing = not superxbr.valid_scale_factor(scale_factor) or \
+        (out_width, out_height) != (original_width * scale_factor, original_height * scale_factor)
+
+    source = drawable.get_buffer()
+
+    # Large images are streamed through the buffers band by band instead, or scaled
+    # through scratch files.
+    if resizing:
+        memory = superxbr.resize_memory(original_width, original_height, out_width, out_height, workers=workers)
+    elif incremental:
+        # the incremental state holds every step, see superxbr/incremental.py
+        memory = superxbr.incremental_memory(original_width, original_height, scale_factor)
+    else:
+        memory = superxbr.peak_memory(original_width, original_height, scale_factor, workers=workers)
+    large = memory > STREAM_MEMORY
+    mapped = large and SCRATCH_DIRECTORY is not None
+    streaming = large and not mapped
+    if resizing:
+        memory = superxbr.resize_memory(original_width, original_height, out_width, out_height, workers=workers,
+                                        stream=streaming, directory=SCRATCH_DIRECTORY if mapped else None)
+    elif streaming:
+        memory = superxbr.stream_memory(original_width, original_height, scale_factor)
+    elif mapped:
+        memory = superxbr.mapped_memory(original_width, original_height, scale_factor)
+    progress = gimp_progress(drawable.get_name(), memory, cancel)
+    profile = run_profile(image, drawable, scale_factor)
+    if profile is not None:
+        profile.info.update(streaming=streaming, mapped=mapped, size=(out_width, out_height),
+                            incremental=incremental and not (large or resizing))
+
+    if resizing or not streaming:
+        start = stage_start(profile)
+        original_pixel_data = read_pixels(source, original_width, original_height)
+        stage_end(profile, start, "buffer read", original_width * original_height, len(original_pixel_data))
+    if not (large or resizing):
+        if incremental:
+            # the same pixels again are a cache hit; otherwise only the parts that
+            # changed since the last run on this layer are scaled again
+            start = stage_start(profile)
+            key = superxbr.cache_key(original_pixel_data, original_width, original_height, True, scale_factor,
+                                     skip_transparent)
+            output_data = RESULT_CACHE.get(key)
+            stage_end(profile, start, "cache get", 0 if output_data is None else out_width * out_height,
+                      0 if output_data is None else len(output_data))
+            if output_data is None:
+                # the layer is a new one, so it takes every row, not just the changed ones
+                scaled_image, _ = superxbr.rescale(RESULT_CACHE, layer_name(image, drawable), original_pixel_data,
+                                                   original_width, original_height, scale_factor,
+                                                   progress=progress, skip_transparent=skip_transparent,
+                                                   profile=profile)
+                output_data = scaled_image.rows(profile=profile)
+                start = stage_start(profile)
+                RESULT_CACHE.put(key, output_data)
+                stage_end(profile, start, "cache put", out_width * out_height, len(output_data))
+        else:
+            output_data = superxbr.scale(original_pixel_data, original_width, original_height, scale_factor,
+                                         progress=progress, workers=workers, skip_transparent=skip_transparent,
+                                         cache=RESULT_CACHE, profile=profile)
+
+    dest_layer = Gimp.Layer.new(image, "scaled", out_width, out_height, Gimp.ImageType.RGBA_IMAGE, 100.0,
+                                Gimp.LayerMode.NORMAL)
+
+    image_width = image.get_width()
+    image_height = image.get_height()
+    image.resize(out_width, out_height, 0, 0)
+
+    image.insert_layer(dest_layer, None, 0)
+    shadow = dest_layer.get_shadow_buffer()
+    if large or resizing:
+        try:
+            if resizing:
+                superxbr.resize_rows(original_pixel_data, GeglRows(shadow, out_width), original_width,
+                                     original_height, out_width, out_height, progress=progress, workers=workers,
+                                     skip_transparent=skip_transparent, cache=RESULT_CACHE, profile=profile,
+                                     stream=streaming, directory=SCRATCH_DIRECTORY if mapped else None)
+            elif streaming:
+                stream_drawable(GeglRows(source, original_width), image, shadow, original_width, original_height,
+                                scale_factor, progress, skip_transparent, profile)
+            else:
+                superxbr.scale_mapped(original_pixel_data, GeglRows(shadow, out_width), original_width,
+                                      original_height, scale_factor, progress=progress, workers=workers,
+                                      skip_transparent=skip_transparent, profile=profile,
+                                      directory=SCRATCH_DIRECTORY, band_rows=tile_band_rows(shadow))
+        except superxbr.Cancelled:
+            image.remove_layer(dest_layer)
+            image.resize(image_width, image_height, 0, 0)
+            raise
+    else:
+        start = stage_start(profile)
+        write_pixels(shadow, out_width, out_height, output_data)
+        stage_end(profile, start, "buffer write", out_width * out_height, len(output_data))
+
+    start = stage_start(profile)
+    finish_drawable(dest_layer, shadow, out_width, out_height)
+    stage_end(profile, start, "layer update", out_width * out_height)
+
+    start = stage_start(profile)
+    image.flatten()
+    stage_end(profile, start, "flatten", out_width * out_height)
+
+    if profile is not None:
+        profile.close()
+        write_report(os.environ["SUPERXBR_PROFILE"], profile.report())
+
+# Every layer of an image or layer group that is not a group itself, top to bottom.
+def leaf_layers(layers):
+    for layer in layers:
+        if layer.is_group():
+            for child in leaf_layers(layer.get_children()):
+                yield child
+        else:
+            yield layer
+
+# A job of the batch scaler (see superxbr/batch.py): a layer, scaled in place, as
+# in the GIMP 2 plugin. The layer grows to the scaled size, keeping its place in
+# the scaled image, and its mask, if any, grows with GIMP's own scaling, without
+# interpolation (see scale_layers()). The job keeps the pixels of the layer and its
+# mask it read until the batch is over, to put the layer back if the batch is
+# cancelled; the mask's in its own format, so they come back exactly.
+class LayerJob(object):
+
+    def __init__(self, image, layer, scale_factor):
+        self.image = image
+        self.layer = layer
+        self.scale_factor = scale_factor
+        self.width = layer.get_width()
+        self.height = layer.get_height()
+        self.offsets = tuple(layer.get_offsets()[-2:])
+        self.pixels = None
+        self.mask_pixels = None
+        self.resized = False
+
+    def read(self):
+        self.pixels = read_pixels(self.layer.get_buffer(), self.width, self.height)
+        mask = self.layer.get_mask()
+        if mask is not None:
+            self.mask_pixels = read_pixels(mask.get_buffer(), self.width, self.height, None, mask.get_bpp())
+        return self.pixels, True
+
+    # Scales the layer to its new size and place, ready for its scaled pixels.
+    # Returns its shadow buffer.
+    def resize(self):
+        x, y = self.offsets
+        self.resized = True
+        self.layer.scale(self.width * self.scale_factor, self.height * self.scale_factor, False)
+        self.layer.set_offsets(x * self.scale_factor, y * self.scale_factor)
+        return self.layer.get_shadow_buffer()
+
+    def write(self, scaled):
+        out_width = self.width * self.scale_factor
+        out_height = self.height * self.scale_factor
+        shadow = self.resize()
+        write_pixels(shadow, out_width, out_height, scaled)
+        finish_drawable(self.layer, shadow, out_width, out_height)
+
+    # Puts the layer and its mask back to their size, place and pixels before
+    # resize(), if it was resized.
+    def restore(self):
+        if not self.resized:
+            return
+        self.layer.scale(self.width, self.height, False)
+        self.layer.set_offsets(*self.offsets)
+        shadow = self.layer.get_shadow_buffer()
+        write_pixels(shadow, self.width, self.height, self.pixels)
+        finish_drawable(self.layer, shadow, self.width, self.height)
+        if self.mask_pixels is not None:
+            mask = self.layer.get_mask()
+            shadow = mask.get_shadow_buffer()
+            write_pixels(shadow, self.width, self.height, self.mask_pixels, None, mask.get_bpp())
+            finish_drawable(mask, shadow, self.width, self.height)
+        self.resized = False
+
+    # Scales the layer band by band instead of write(), for layers too large to scale
+    # in memory: through scratch files in SCRATCH_DIRECTORY if it is set, streamed
+    # otherwise. Its pixels are read at once, as the layer is scaled before the first
+    # band is written, but they are a fraction of the scaled pixels the scaler never
+    # holds.
+    def stream(self, progress, skip_transparent):
+        out_width = self.width * self.scale_factor
+        out_height = self.height * self.scale_factor
+        pixels = self.read()[0]
+        shadow = self.resize()
+        if SCRATCH_DIRECTORY is not None:
+            superxbr.scale_mapped(pixels, GeglRows(shadow, out_width), self.width, self.height, self.scale_factor,
+                                  progress=progress, skip_transparent=skip_transparent,
+                                  directory=SCRATCH_DIRECTORY, band_rows=tile_band_rows(shadow))
+        else:
+            stream_drawable(superxbr.BufferRows(pixels, self.width), self.image, shadow, self.width, self.height,
+                            self.scale_factor, progress, skip_transparent)
+        finish_drawable(self.layer, shadow, out_width, out_height)
+
+# Scales the layers of jobs and the image's canvas with them, as the GIMP 2 plugin
+# does: on one pool of worker processes (0 for one per CPU), with layers needing more
+# than STREAM_MEMORY streamed afterwards, one by one. If cancelled, the layers scaled
+# so far are put back.
+def scale_layers(image, scale_factor, skip_transparent, workers, cancel):
+    # GIMP only has to make room for the scaled pixels, which overwrite the layers,
+    # and the masks come back from their pixels as they were if cancelled; the
+    # context this sets is popped with the undo group, see cancellable()
+    Gimp.context_set_interpolation(Gimp.InterpolationType.NONE)
+    jobs = [LayerJob(image, layer, scale_factor) for layer in leaf_layers(image.get_layers())]
+    streamed = [job for job in jobs if superxbr.peak_memory(job.width, job.height, scale_factor) > STREAM_MEMORY]
+    pooled = [job for job in jobs if job not in streamed]
+    total = float(sum(job.width * job.height for job in jobs)) or 1.0
+    done = sum(job.width * job.height for job in pooled) / total
+
+    Gimp.progress_init("Running Super-xBR on %d layers..." % len(jobs))
+    bar = superxbr.ThrottledProgress(Gimp.progress_update, cancel)
+    try:
+        superxbr.scale_batch(pooled, scale_factor, workers=workers, progress=bar.part(0.0, done),
+                             skip_transparent=skip_transparent, cache=RESULT_CACHE)
+        for job in streamed:
+            share = job.width * job.height / total
+            job.stream(bar.part(done, share).scale, skip_transparent)
+            done += share
+    except superxbr.Cancelled:
+        for job in jobs:
+            job.restore()
+        raise
+
+    image.resize(image.get_width() * scale_factor, image.get_height() * scale_factor, 0, 0)
+
+# Scales every PNG file in a directory (and its subdirectories, if recursive) into an
+# output directory, on one pool of worker processes (0 for one per CPU), like
+# `python -m superxbr --batch`. Returns a line for every file that failed.
+def scale_folder(source_directory, output_directory, scale_factor, skip_transparent, recursive, workers,
+                 cancel_file):
+    jobs = []
+    failed = []
+    for source, destination in collect_jobs([source_directory], output_directory, scale_factor, recursive):
+        try:
+            jobs.append(FileJob(source, destination, scale_factor, True))
+        except Exception as e:
+            failed.append("%s: %s" % (source, error_text(e)))
+
+    Gimp.progress_init("Running Super-xBR on %d files..." % len(jobs))
+    cancel = superxbr.Cancel(cancel_file)
+    try:
+        with cancel_on_signals(cancel):
+            superxbr.scale_batch(jobs, scale_factor, workers=workers,
+                                 progress=superxbr.ThrottledProgress(Gimp.progress_update, cancel),
+                                 skip_transparent=skip_transparent, cache=RESULT_CACHE,
+                                 failed=lambda job, error: failed.append("%s: %s" % (job.source, error_text(error))))
+    except superxbr.Cancelled:
+        pass
+    return failed
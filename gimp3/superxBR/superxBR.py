@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+# GIMP 3 plugin for Hyllian's Super-xBR: the port of superxBR.py at the top of the
+# repository to GIMP 3 and Python 3, with the same menu entries. GIMP 3 only loads a
+# plugin from a folder of its own name, so this folder goes to GIMP's plug-ins
+# folder, with the superxbr package copied (or linked) into it.
+#
+# GIMP runs every plugin when it starts, to query its procedures. This file only
+# registers them; the scaling (scaling.py next to it), the superxbr package and
+# NumPy are imported once a procedure runs.
+
+import os
+import sys
+import tempfile
+
+import gi
+gi.require_version("Gimp", "3.0")
+gi.require_version("GimpUi", "3.0")
+from gi.repository import GLib, GObject, Gimp, GimpUi
+
+# The superxbr package sits next to this file once installed, and two folders up
+# in the repository.
+PLUGIN_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+for directory in (PLUGIN_DIRECTORY, os.path.dirname(os.path.dirname(PLUGIN_DIRECTORY))):
+    if os.path.isdir(os.path.join(directory, "superxbr")):
+        sys.path.insert(0, directory)
+        break
+
+# File whose creation cancels every running Super-xBR filter at its next progress
+# update, the same one the GIMP 2 plugin uses; the Super-xBR cancel menu entry
+# creates it.
+CANCEL_FILE = os.path.join(tempfile.gettempdir(), "superxbr-cancel")
+
+AUTHOR = "Abel Briggs"
+COPYRIGHT = "Hyllian"
+DATE = "2019"
+
+SCALE_FACTOR_BLURB = "Scale factor(2, 4, 8, 16, etc.)"
+FILTER_SCALE_FACTOR_BLURB = "Scale factor(2, 4, 8, 16, etc.; 3, 6, etc. are resampled)"
+SKIP_TRANSPARENT_BLURB = "Skip fully transparent areas (their edges may change slightly)"
+WORKERS_BLURB = "Worker processes (0 for one per CPU)"
+
+# Runs the dialog of a procedure when run interactively. Returns False if it was cancelled.
+def run_dialog(procedure, config, run_mode, title):
+    if run_mode != Gimp.RunMode.INTERACTIVE:
+        return True
+    GimpUi.init("superxBR")
+    dialog = GimpUi.ProcedureDialog.new(procedure, config, title)
+    dialog.fill(None)
+    confirmed = dialog.run()
+    dialog.destroy()
+    return confirmed
+
+def success(procedure):
+    return procedure.new_return_values(Gimp.PDBStatusType.SUCCESS, GLib.Error())
+
+def cancelled(procedure):
+    return procedure.new_return_values(Gimp.PDBStatusType.CANCEL, GLib.Error())
+
+def calling_error(procedure, message):
+    return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, GLib.Error(message))
+
+# Scale factor of a procedure's config, or None if it is not a power of 2.
+def config_scale_factor(config):
+    scale_factor = config.get_property("scale-factor")
+    return scale_factor if scale_factor > 1 and scale_factor & (scale_factor - 1) == 0 else None
+
+class SuperXBR(Gimp.PlugIn):
+
+    def do_query_procedures(self):
+        return ["python-fu-superxbr", "python-fu-superxbr-size", "python-fu-superxbr-layers",
+                "python-fu-superxbr-folder", "python-fu-superxbr-cancel"]
+
+    def do_set_i18n(self, name):
+        return False
+
+    def do_create_procedure(self, name):
+        if name == "python-fu-superxbr":
+            procedure = self.image_procedure(name, self.run_filter, "Super-xBR(py)...",
+                                             "Integer scales an image using Hyllian's Super-xBR",
+                                             "Integer scales an image using Hyllian's Super-xBR; factors that are "
+                                             "not a power of 2 are resampled from the next one up")
+            procedure.set_image_types("RGB*")
+            procedure.set_sensitivity_mask(Gimp.ProcedureSensitivityMask.DRAWABLE)
+            procedure.add_int_argument("scale-factor", "Scale factor", FILTER_SCALE_FACTOR_BLURB, 2, 256, 2,
+                                       GObject.ParamFlags.READWRITE)
+            procedure.add_boolean_argument("skip-transparent", "Skip transparent", SKIP_TRANSPARENT_BLURB, False,
+                                           GObject.ParamFlags.READWRITE)
+            procedure.add_boolean_argument("incremental", "Incremental",
+                                           "Only rescale what changed since the last run on this layer", False,
+                                           GObject.ParamFlags.READWRITE)
+            procedure.add_int_argument("workers", "Workers", WORKERS_BLURB, 0, 256, 0, GObject.ParamFlags.READWRITE)
+        elif name == "python-fu-superxbr-size":
+            procedure = self.image_procedure(name, self.run_size, "Super-xBR to size(py)...",
+                                             "Scales an image to an exact size using Hyllian's Super-xBR",
+                                             "Scales an image to an exact size using Hyllian's Super-xBR: by the "
+                                             "smallest power of 2 that covers the size, then resampled down to it")
+            procedure.set_image_types("RGB*")
+            procedure.set_sensitivity_mask(Gimp.ProcedureSensitivityMask.DRAWABLE)
+            procedure.add_int_argument("width", "Width", "Width", 1, 524288, 256, GObject.ParamFlags.READWRITE)
+            procedure.add_int_argument("height", "Height", "Height", 1, 524288, 256, GObject.ParamFlags.READWRITE)
+            procedure.add_boolean_argument("skip-transparent", "Skip transparent", SKIP_TRANSPARENT_BLURB, False,
+                                           GObject.ParamFlags.READWRITE)
+            procedure.add_int_argument("workers", "Workers", WORKERS_BLURB, 0, 256, 0, GObject.ParamFlags.READWRITE)
+        elif name == "python-fu-superxbr-layers":
+            procedure = self.image_procedure(name, self.run_layers, "Super-xBR all layers(py)...",
+                                             "Integer scales every layer of an image by a power of 2 using "
+                                             "Hyllian's Super-xBR",
+                                             "Integer scales every layer of an image by a power of 2 using "
+                                             "Hyllian's Super-xBR, keeping the layers separate")
+            procedure.set_image_types("RGB*")
+            self.add_scale_arguments(procedure)
+            procedure.add_int_argument("workers", "Workers", WORKERS_BLURB, 0, 256, 0, GObject.ParamFlags.READWRITE)
+        elif name == "python-fu-superxbr-folder":
+            procedure = self.image_procedure(name, self.run_folder, "Super-xBR folder(py)...",
+                                             "Integer scales every PNG file in a folder by a power of 2 using "
+                                             "Hyllian's Super-xBR",
+                                             "Integer scales every PNG file in a folder by a power of 2 using "
+                                             "Hyllian's Super-xBR, into another folder")
+            procedure.set_image_types("*")
+            procedure.set_sensitivity_mask(Gimp.ProcedureSensitivityMask.ALWAYS)
+            procedure.add_file_argument("source-directory", "Folder of PNG files", "Folder of PNG files",
+                                        Gimp.FileChooserAction.SELECT_FOLDER, False, None,
+                                        GObject.ParamFlags.READWRITE)
+            procedure.add_file_argument("output-directory", "Folder for the scaled files",
+                                        "Folder for the scaled files", Gimp.FileChooserAction.SELECT_FOLDER, False,
+                                        None, GObject.ParamFlags.READWRITE)
+            self.add_scale_arguments(procedure)
+            procedure.add_boolean_argument("recursive", "Recursive", "Also scale the files in subfolders", False,
+                                           GObject.ParamFlags.READWRITE)
+            procedure.add_int_argument("workers", "Workers", WORKERS_BLURB, 0, 256, 0, GObject.ParamFlags.READWRITE)
+        else:
+            procedure = self.image_procedure(name, self.run_cancel, "Super-xBR cancel(py)",
+                                             "Cancels every running Super-xBR filter",
+                                             "Cancels every running Super-xBR filter at its next progress update, "
+                                             "putting its image back as it was")
+            procedure.set_image_types("*")
+            procedure.set_sensitivity_mask(Gimp.ProcedureSensitivityMask.ALWAYS)
+        return procedure
+
+    def image_procedure(self, name, run, label, blurb, help_text):
+        procedure = Gimp.ImageProcedure.new(self, name, Gimp.PDBProcType.PLUGIN, run, None)
+        procedure.set_menu_label(label)
+        procedure.add_menu_path("<Image>/Filters/Enhance")
+        procedure.set_documentation(blurb, help_text, name)
+        procedure.set_attribution(AUTHOR, COPYRIGHT, DATE)
+        return procedure
+
+    def add_scale_arguments(self, procedure):
+        procedure.add_int_argument("scale-factor", "Scale factor", SCALE_FACTOR_BLURB, 2, 256, 2,
+                                   GObject.ParamFlags.READWRITE)
+        procedure.add_boolean_argument("skip-transparent", "Skip transparent", SKIP_TRANSPARENT_BLURB, False,
+                                       GObject.ParamFlags.READWRITE)
+
+    def run_filter(self, procedure, run_mode, image, drawables, config, data):
+        if len(drawables) != 1:
+            return calling_error(procedure, "Super-xBR scales one layer at a time")
+        if not run_dialog(procedure, config, run_mode, "Super-xBR"):
+            return cancelled(procedure)
+        # factors that are not a power of 2 are resampled from the next one up
+        scale_factor = config.get_property("scale-factor")
+
+        import scaling
+        drawable = drawables[0]
+        skip_transparent = config.get_property("skip-transparent")
+        incremental = config.get_property("incremental")
+        workers = config.get_property("workers")
+        scaling.cancellable(image, lambda cancel: scaling.scale_drawable(image, drawable,
+                                                                         drawable.get_width() * scale_factor,
+                                                                         drawable.get_height() * scale_factor,
+                                                                         skip_transparent, incremental, workers,
+                                                                         cancel),
+                            CANCEL_FILE)
+        Gimp.displays_flush()
+        return success(procedure)
+
+    def run_size(self, procedure, run_mode, image, drawables, config, data):
+        if len(drawables) != 1:
+            return calling_error(procedure, "Super-xBR scales one layer at a time")
+        if not run_dialog(procedure, config, run_mode, "Super-xBR to size"):
+            return cancelled(procedure)
+
+        import scaling
+        width = config.get_property("width")
+        height = config.get_property("height")
+        skip_transparent = config.get_property("skip-transparent")
+        workers = config.get_property("workers")
+        scaling.cancellable(image, lambda cancel: scaling.scale_drawable(image, drawables[0], width, height,
+                                                                         skip_transparent, False, workers, cancel),
+                            CANCEL_FILE)
+        Gimp.displays_flush()
+        return success(procedure)
+
+    def run_layers(self, procedure, run_mode, image, drawables, config, data):
+        if not run_dialog(procedure, config, run_mode, "Super-xBR all layers"):
+            return cancelled(procedure)
+        scale_factor = config_scale_factor(config)
+        if scale_factor is None:
+            return calling_error(procedure, "scale factor not a power of 2")
+
+        import scaling
+        skip_transparent = config.get_property("skip-transparent")
+        workers = config.get_property("workers")
+        scaling.cancellable(image, lambda cancel: scaling.scale_layers(image, scale_factor, skip_transparent,
+                                                                       workers, cancel),
+                            CANCEL_FILE)
+        Gimp.displays_flush()
+        return success(procedure)
+
+    def run_folder(self, procedure, run_mode, image, drawables, config, data):
+        if not run_dialog(procedure, config, run_mode, "Super-xBR folder"):
+            return cancelled(procedure)
+        scale_factor = config_scale_factor(config)
+        if scale_factor is None:
+            return calling_error(procedure, "scale factor not a power of 2")
+        source_directory = config.get_property("source-directory")
+        output_directory = config.get_property("output-directory")
+        if source_directory is None or output_directory is None:
+            return calling_error(procedure, "no source or output folder")
+
+        import scaling
+        failed = scaling.scale_folder(source_directory.get_path(), output_directory.get_path(), scale_factor,
+                                      config.get_property("skip-transparent"), config.get_property("recursive"),
+                                      config.get_property("workers"), CANCEL_FILE)
+        if failed:
+            Gimp.message("Super-xBR could not scale these files:\n" + "\n".join(failed))
+        return success(procedure)
+
+    # Writes the cancel file the running filters look for.
+    def run_cancel(self, procedure, run_mode, image, drawables, config, data):
+        from superxbr.progress import request_cancel
+        request_cancel(CANCEL_FILE)
+        return success(procedure)
+
+Gimp.main(SuperXBR.__gtype__, sys.argv)
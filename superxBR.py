@@ -1,489 +1,527 @@
 #!/usr/bin/env python
 
-from array import array
-import math
+# GIMP plugin for Hyllian's Super-xBR. The scaling itself lives in the superxbr
+# package next to this file (see superxbr/kernel.py for the algorithm and its
+# license), so it can also be used without GIMP.
+
 from gimpfu import *
 
-# The below code is an adaptation of Hyllian's C++ code
-# from https://pastebin.com/cbH8ZQQT.
-
-# ******* Super xBR Scaler *******
-# Copyright (c) 2016 Hyllian - sergiogdb@gmail.com
-#
-# Permission is hereby granted, free of charge, to any person obtaining a copy
-# of this software and associated documentation files (the "Software"), to deal
-# in the Software without restriction, including without limitation the rights
-# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-# copies of the Software, and to permit persons to whom the Software is
-# furnished to do so, subject to the following conditions:
-#
-# The above copyright notice and this permission notice shall be included in
-# all copies or substantial portions of the Software.
-#
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
-# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
-# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
-# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
-# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
-# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
-# THE SOFTWARE.
-
-# Absolute difference. Used for edge detection.
-def abs_diff(val1, val2):
-    return abs(val1 - val2)
-
-# Clamps x to a value between floor and ceiling.
-def clamp(x, floor, ceiling):
-    return max(min(x, ceiling), floor)
-
-# Easy way to return an empty 4D matrix list.
-def matrix_4D():
-    return [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
-
-# Transforms an array of RGB or RGBA values into an array of single integer RGBA values.
-# Since the input is RGB, alpha is assumed to be 255.
-# Inputs: integer width of the picture, integer height of the picture, an RGB or RGBA pic array,
-# and a flag for RGBA: true if the input is RGBA, false if RGB.
-# Returns: an integer array containing RGBA values for each pixel, of size width * height
-#
-# (note: the following values in these examples are arbitrary)
-#
-# pic_arr, if RGB, is formatted in the following way:
-# Indices: 0   1   2  |  3   4   5  |  6
-# Values:  235 127 0  |  221 67  95 |  ...
-# where the | indicates a split between pixels, and the size of the pic_arr is
-# width * height * 3.
-#
-# pic_arr, if RGBA, is formatted in the following way:
-# Indices: 0   1   2   3  |  4   5   6   7  |  8
-# Values:  235 127 0   94 |  221 67  95  255|  ...
-# where the | indicates a split between pixels, and the size of the pic_arr is
-# width * height * 4. Note that each pixel includes a alpha value now, in 
-# indices 3, 7, 11, ... etc.
-def rgba_to_int(width, height, pic_arr, rgba_flag):
-
-    int_arr_length = width * height
-    # 'L' denotes a unsigned 32bit integer (rather, a long in Python)
-    int_arr = array("L", [0] * int_arr_length)
-
-    for i in range(0, int_arr_length):
-
-        # i is where we're inserting in the new array, but we need to access
-        # the old array in different places.
-        if rgba_flag == True:
-            # equivalent to multiplying i by 4, but this is faster.
-            old_index = i << 2
-
-            # we need to take the alpha into account.
-            int_arr[i] = (pic_arr[old_index + 3] << 24) + (pic_arr[old_index + 2] << 16) + \
-            (pic_arr[old_index + 1] << 8) + pic_arr[old_index]
-        else:
-            old_index = i * 3
-
-            # it's RGB, so we can fudge the alpha to 255.
-            int_arr[i] = (255 << 24) + (pic_arr[old_index + 2] << 16) + (pic_arr[old_index + 1] << 8) + \
-            (pic_arr[old_index])
-    # we have our array of single 32 bit integers, so we can just return it now.
-    return int_arr
-
-# Does the opposite of rgba_to_int - transforms the integer into an RGBA array.
-# See above for the format of the RGBA array.
-# The integer format is clearly defined, so this one is pretty easy.
-def int_to_rgba(width, height, pic_arr):
-
-    int_arr_length = width * height
-    int_arr = array("B", "\x00" * (int_arr_length * 4))
-
-    for i in range(0, int_arr_length):
-        # we want an RGBA array, so just the bitshift this time.
-        old_index = i << 2
-        int_arr[old_index] = pic_arr[i] & 255
-        int_arr[old_index + 1] = (pic_arr[i] >> 8) & 255
-        int_arr[old_index + 2] = (pic_arr[i] >> 16) & 255
-        int_arr[old_index + 3] = (pic_arr[i] >> 24) & 255
-    
-    return int_arr
-
-# Pixel matrices for a given subpixel A.
-#                          P1
-# |P0|B |C |P1|         C     F4          |a0|b1|c2|d3|
-# |D |E |F |F4|      B     F     I4       |b0|c1|d2|e3|   |e1|i1|i2|e2|
-# |G |H |I |I4|   P0    E  A  I     P3    |c0|d1|e2|f3|   |e3|i3|i4|e4|
-# |P2|H5|I5|P3|      D     H     I5       |d0|e1|f2|g3|
-#                       G     H5
-#                          P2
-#
-# sx, sy  
-# -1  -1 | -2  0   (x+y) (x-y)    -3  1  (x+y-1)  (x-y+1)
-# -1   0 | -1 -1                  -2  0
-# -1   1 |  0 -2                  -1 -1
-# -1   2 |  1 -3                   0 -2
-#
-#  0  -1 | -1  1   (x+y) (x-y)      ...     ...     ...
-#  0   0 |  0  0
-#  0   1 |  1 -1
-#  0   2 |  2 -2
-#
-#  1  -1 |  0  2   ...
-#  1   0 |  1  1
-#  1   1 |  2  0
-#  1   2 |  3 -1
-#
-#  2  -1 |  1  3   ...
-#  2   0 |  2  2
-#  2   1 |  3  1
-#  2   2 |  4  0
-
-# Calculates diagonal edge value from pixel matrix (mat) and pixel weightings (wp)
-def diagonal_edge(mat, wp):
-    diagonal_weight1 = wp[0] * (abs_diff(mat[0][2], mat[1][1]) + abs_diff(mat[1][1], mat[2][0]) + \
-    abs_diff(mat[1][3], mat[2][2]) + abs_diff(mat[2][2], mat[3][1])) + \
-    wp[1] * (abs_diff(mat[0][3], mat[1][2]) + abs_diff(mat[2][1], mat[3][0])) + \
-    wp[2] * (abs_diff(mat[0][3], mat[2][1]) + abs_diff(mat[1][2], mat[3][0])) + \
-    wp[3] * (abs_diff(mat[1][2], mat[2][1])) + \
-    wp[4] * (abs_diff(mat[0][2], mat[2][0]) + abs_diff(mat[1][3], mat[3][1])) + \
-    wp[5] * (abs_diff(mat[0][1], mat[1][0]) + abs_diff(mat[2][3], mat[3][2]))
-
-    diagonal_weight2 = wp[0] * (abs_diff(mat[0][1], mat[1][2]) + abs_diff(mat[1][2], mat[2][3]) + \
-    abs_diff(mat[1][0], mat[2][1]) + abs_diff(mat[2][1], mat[3][2])) + \
-    wp[1] * (abs_diff(mat[0][0], mat[1][1]) + abs_diff(mat[2][2], mat[3][3])) + \
-    wp[2] * (abs_diff(mat[0][0], mat[2][2]) + abs_diff(mat[1][1], mat[3][3])) + \
-    wp[3] * (abs_diff(mat[1][1], mat[2][2])) + \
-    wp[4] * (abs_diff(mat[1][0], mat[3][2]) + abs_diff(mat[0][1], mat[2][3])) + \
-    wp[5] * (abs_diff(mat[0][2], mat[1][3]) + abs_diff(mat[2][0], mat[3][1]))
-
-    return (diagonal_weight1 - diagonal_weight2)
-
-def python_superxBR(timg, tdrawable, scale_factor = 2):
-
-    # don't bother if the scale factor isn't a power of 2.
-    if scale_factor == 0 or (scale_factor & (scale_factor - 1)) != 0:
-        gimp.progress_init("Error: scale factor not a power of 2. Exiting...")
+import os
+import tempfile
+
+import superxbr
+from superxbr.cli import FileJob, collect_jobs, error_text
+from superxbr.kernel import PASS_NAMES
+from superxbr.pixels import rgba_to_rgb
+from superxbr.profile import Profile, stage_end, stage_start, write_report
+from superxbr.progress import cancel_on_signals
+from superxbr.stream import BAND_ROWS
+
+# Progress callback for the scaling engines that drives GIMP's progress bar: one bar
+# over every pass of every step, updated a few times a second (see
+# superxbr/progress.py), and cancelled with cancel. Scale factors above 2 run in
+# several 2x steps; the message names the step, and the memory the scaler holds at
+# its peak.
+def gimp_progress(drawable_name, memory, cancel):
+    bar = superxbr.ThrottledProgress(gimp.progress_update, cancel)
+    current_pass = [None]
+    def update(step, steps, pass_number, fraction):
+        if (step, pass_number) != current_pass[0]:
+            step_text = " (step %d of %d)" % (step, steps) if steps > 1 else ""
+            message = "Running " + PASS_NAMES[pass_number] + " pass of Super-xBR" + step_text + \
+                      " on " + drawable_name + ", using " + superxbr.format_bytes(memory) + "..."
+            if current_pass[0] is None:
+                gimp.progress_init(message)
+            else:
+                pdb.gimp_progress_set_text(message)
+            current_pass[0] = (step, pass_number)
+        bar.scale(step, steps, pass_number, fraction)
+    return update
+
+# File whose creation cancels every running Super-xBR filter at its next progress
+# update; the Super-xBR cancel menu entry creates it. A run that is cancelled puts
+# the image back as it was, and ends its undo group.
+CANCEL_FILE = os.path.join(tempfile.gettempdir(), "superxbr-cancel")
+
+# Images whose whole-image scaling would need more memory than this (in bytes) are
+# streamed through the pixel regions in bands of rows, with memory proportional to
+# their width.
+STREAM_MEMORY = 256 << 20
+
+# If $SUPERXBR_SCRATCH names a directory, images above STREAM_MEMORY are scaled with
+# the buffers of the cascade in memory-mapped temporary files there instead of
+# streamed (see superxbr/mapped.py): a fast disk then stands in for the memory, and
+# every pass runs once over the whole image. The result is copied into the layer
+# band of rows by band of rows.
+SCRATCH_DIRECTORY = os.environ.get("SUPERXBR_SCRATCH") or None
+
+# Cache of scaled layers (see superxbr/cache.py), so that running the filter on the
+# same pixels again skips all the passes. Its directory and size cap come from
+# $SUPERXBR_CACHE and $SUPERXBR_CACHE_SIZE (in MB; 0 turns it off). Streamed images
+# are too large to be worth caching and always run the passes.
+RESULT_CACHE = superxbr.ResultCache()
+
+# If $SUPERXBR_PROFILE names a file, every run writes a report of how long each of
+# its stages took there as JSON (see superxbr/profile.py), replacing the last one.
+def run_profile(image, drawable, scale_factor):
+    if not os.environ.get("SUPERXBR_PROFILE"):
+        return None
+    return Profile(layer=layer_name(image, drawable), width=drawable.width, height=drawable.height,
+                   scale=scale_factor)
+
+# Name the incremental scaling state of a layer is kept under in the cache: its
+# image's file, or the image's ID in this session for images never saved, and the
+# layer's name.
+def layer_name(image, drawable):
+    return "%s|%s" % (image.filename or "image %d" % image.ID, drawable.name)
+
+# Row store (see superxbr/stream.py) reading and writing whole rows of a pixel region.
+# Rows written are scaled RGBA pixels; a region without alpha gets them as RGB.
+class RegionRows(object):
+
+    def __init__(self, region, width):
+        self.region = region
+        self.width = width
+
+    def read(self, y0, y1):
+        return self.region[0:self.width, y0:y1]
+
+    def write(self, y0, data):
+        rows = len(data) // (self.width * 4)
+        if self.region.bpp == 3:
+            data = bytes(rgba_to_rgb(data))
+        self.region[0:self.width, y0:y0 + rows] = data
+
+# Runs scale_image(cancel) in an undo group of image, cancelled by the cancel file or
+# a signal, and ends the group however it ends.
+def cancellable(image, scale_image):
+    cancel = superxbr.Cancel(CANCEL_FILE)
+    gimp.context_push()
+    image.undo_group_start()
+    try:
+        with cancel_on_signals(cancel):
+            scale_image(cancel)
+    except superxbr.Cancelled:
+        pass
+    finally:
+        image.undo_group_end()
+        gimp.context_pop()
+
+def python_superxBR(timg, tdrawable, scale_factor = 2, skip_transparent = False, incremental = False, workers = 0):
+
+    # factors that are not a power of 2 are resampled from the next one up.
+    if scale_factor < 2:
+        gimp.progress_init("Error: scale factor below 2. Exiting...")
         return
 
-    # constants for the algorithm
-    WEIGHT1 = 0.129633
-    WEIGHT2 = 0.175068
-    w1 = -WEIGHT1
-    w2 = WEIGHT1 + 0.500000
-    w3 = -WEIGHT2
-    w4 = WEIGHT2 + 0.500000
+    cancellable(timg, lambda cancel: scale_drawable(timg, tdrawable, tdrawable.width * scale_factor,
+                                                    tdrawable.height * scale_factor, skip_transparent, incremental,
+                                                    workers, cancel))
 
-    # Relative luminance coefficients: https://en.wikipedia.org/wiki/Luma_(video)
-    LUMA_R = 0.2126
-    LUMA_G = 0.7152
-    LUMA_B = 0.0722 
+# Scales the drawable to exactly width * height, resampled from the smallest power of 2
+# scale that covers it.
+def python_superxBR_size(timg, tdrawable, width = 256, height = 256, skip_transparent = False, workers = 0):
 
-    gimp.context_push()
-    timg.undo_group_start()
+    if width < 1 or height < 1:
+        gimp.progress_init("Error: size must be positive. Exiting...")
+        return
+
+    cancellable(timg, lambda cancel: scale_drawable(timg, tdrawable, width, height, skip_transparent, False, workers,
+                                                    cancel))
+
+# Scales a drawable to out_width * out_height into a new layer of its image and
+# flattens the image. Sizes that are not a power of 2 times the drawable's are
+# resampled from the smallest power of 2 scale that covers them (see
+# superxbr/resample.py), without the incremental state. The passes run on workers
+# processes (0 for one per CPU), except for the incremental state and streamed
+# images, which are scaled on one.
+def scale_drawable(timg, tdrawable, out_width, out_height, skip_transparent, incremental, workers, cancel):
 
     original_width = tdrawable.width
     original_height = tdrawable.height
 
-    out_width = original_width * scale_factor
-    out_height = original_height * scale_factor
+    scale_factor = out_width // original_width
+    resizing = not superxbr.valid_scale_factor(scale_factor) or \
+        (out_width, out_height) != (original_width * scale_factor, original_height * scale_factor)
 
     original_pixel_region = tdrawable.get_pixel_rgn(0, 0, original_width, original_height, False, False)
-    
-    original_pixel_data = array("B", original_pixel_region[0:original_width, 0:original_height])
 
     # True if the pixel data is RGBA, false if it's RGB and needs alpha to be fudged.
-    rgba_flag = (tdrawable.type == RGBA_IMAGE) 
-    
-    original_pixel_data = rgba_to_int(original_width, original_height, original_pixel_data, rgba_flag)
+    rgba_flag = (tdrawable.type == RGBA_IMAGE)
+
+    # Large images are streamed through the pixel regions band by band instead, or
+    # scaled through scratch files.
+    if resizing:
+        memory = superxbr.resize_memory(original_width, original_height, out_width, out_height, workers=workers)
+    elif incremental:
+        # the incremental state holds every step, see superxbr/incremental.py
+        memory = superxbr.incremental_memory(original_width, original_height, scale_factor)
+    else:
+        memory = superxbr.peak_memory(original_width, original_height, scale_factor, workers=workers)
+    large = memory > STREAM_MEMORY
+    mapped = large and SCRATCH_DIRECTORY is not None
+    streaming = large and not mapped
+    if resizing:
+        memory = superxbr.resize_memory(original_width, original_height, out_width, out_height, workers=workers,
+                                        stream=streaming, directory=SCRATCH_DIRECTORY if mapped else None)
+    elif streaming:
+        memory = superxbr.stream_memory(original_width, original_height, scale_factor)
+    elif mapped:
+        memory = superxbr.mapped_memory(original_width, original_height, scale_factor)
+    progress = gimp_progress(tdrawable.name, memory, cancel)
+    profile = run_profile(timg, tdrawable, scale_factor)
+    if profile is not None:
+        profile.info.update(streaming=streaming, mapped=mapped, size=(out_width, out_height),
+                            incremental=incremental and not (large or resizing))
+
+    if resizing or not streaming:
+        start = stage_start(profile)
+        original_pixel_data = original_pixel_region[0:original_width, 0:original_height]
+        stage_end(profile, start, "region read", original_width * original_height, len(original_pixel_data))
+    if not (large or resizing):
+        if incremental:
+            # the same pixels again are a cache hit; otherwise only the parts that
+            # changed since the last run on this layer are scaled again
+            start = stage_start(profile)
+            key = superxbr.cache_key(original_pixel_data, original_width, original_height, rgba_flag,
+                                     scale_factor, skip_transparent)
+            output_data = RESULT_CACHE.get(key)
+            stage_end(profile, start, "cache get", 0 if output_data is None else out_width * out_height,
+                      0 if output_data is None else len(output_data))
+            if output_data is None:
+                # the layer is a new one, so it takes every row, not just the changed ones
+                scaled_image, _ = superxbr.rescale(RESULT_CACHE, layer_name(timg, tdrawable), original_pixel_data,
+                                                   original_width, original_height, scale_factor, rgba=rgba_flag,
+                                                   progress=progress, skip_transparent=skip_transparent,
+                                                   profile=profile)
+                output_data = scaled_image.rows(profile=profile)
+                start = stage_start(profile)
+                RESULT_CACHE.put(key, output_data)
+                stage_end(profile, start, "cache put", out_width * out_height, len(output_data))
+        else:
+            output_data = superxbr.scale(original_pixel_data, original_width, original_height, scale_factor,
+                                         rgba=rgba_flag, progress=progress, workers=workers,
+                                         skip_transparent=skip_transparent, cache=RESULT_CACHE, profile=profile)
 
     dest_drawable = gimp.Layer(timg, "scaled", out_width, out_height, RGBA_IMAGE, 100, NORMAL_MODE)
     dest_region = dest_drawable.get_pixel_rgn(0, 0, out_width, out_height, True, True)
-    
-    output_data = array("L", [0L] * (out_width * out_height))
-
-    # - - - - - Super-xBR Scaling - - - - -
-    # First pass begins here
-    # Pixel weightings for pass 1.
-    gimp.progress_init("Running first pass of Super-xBR on " + tdrawable.name + "...")
-
-    weight_pixel = [2.0, 1.0, -1.0, 4.0, -1.0, 1.0]
-
-    red = matrix_4D()
-    green = matrix_4D()
-    blue = matrix_4D()
-    alpha = matrix_4D()
-    Y_luma = matrix_4D()
-
-    # "f" variables are floating point, while "i" variables are meant to be integers.
-    # r/g/b/a correspond to red, green, blue, and alpha values respectively.
-    rf, gf, bf, af, ri, gi, bi, ai = (None,) * 8
-    d_edge = None
-    min_r_sample, max_r_sample = None, None
-    min_g_sample, max_g_sample = None, None
-    min_b_sample, max_b_sample = None, None
-    min_a_sample, max_a_sample = None, None
-
-    for y in range(0, out_height, 2):
-        for x in range(0, out_width, 2):
-
-            # central pixels on original image: cx and cy
-            cx = x / scale_factor
-            cy = y / scale_factor
-
-            # sample supporting pixels on original image: sx and sy
-            for sx in range(-1, 3):
-                for sy in range(-1, 3):
-
-                    # clamp the pixel locations.
-                    csy = clamp(sy + cy, 0, original_height - 1)
-                    csx = clamp(sx + cx, 0, original_width - 1)
-
-                    # sample and add weighted components
-                    sample = original_pixel_data[csy * original_width + csx]
-                    red[sx + 1][sy + 1] = ((sample) >> 0) & 0xFF
-                    green[sx + 1][sy + 1] = ((sample) >> 8) & 0xFF
-                    blue[sx + 1][sy + 1] = ((sample) >> 16) & 0xFF
-                    alpha[sx + 1][sy + 1] = ((sample) >> 24) & 0xFF
-                    Y_luma[sx + 1][sy + 1] = (LUMA_R * red[sx + 1][sy + 1] + \
-                    LUMA_G * green[sx + 1][sy + 1] + LUMA_B * blue[sx + 1][sy + 1])
-            
-            min_r_sample = min(red[1][1], red[2][1], red[1][2], red[2][2])
-            min_g_sample = min(green[1][1], green[2][1], green[1][2], green[2][2])
-            min_b_sample = min(blue[1][1], blue[2][1], blue[1][2], blue[2][2])
-            min_a_sample = min(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2])
-
-            max_r_sample = max(red[1][1], red[2][1], red[1][2], red[2][2])
-            max_g_sample = max(green[1][1], green[2][1], green[1][2], green[2][2])
-            max_b_sample = max(blue[1][1], blue[2][1], blue[1][2], blue[2][2])
-            max_a_sample = max(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2])
-
-            d_edge = diagonal_edge(Y_luma, weight_pixel)
-            
-            if d_edge <= 0:
-                rf = w1 * (red[0][3] + red[3][0]) + w2 * (red[1][2] + red[2][1])
-                gf = w1 * (green[0][3] + green[3][0]) + w2 * (green[1][2] + green[2][1])
-                bf = w1 * (blue[0][3] + blue[3][0]) + w2 * (blue[1][2] + blue[2][1])
-                af = w1 * (alpha[0][3] + alpha[3][0]) + w2 * (alpha[1][2] + alpha[2][1])
-            else:
-                rf = w1 * (red[0][0] + red[3][3]) + w2 * (red[1][1] + red[2][2])
-                gf = w1 * (green[0][0] + green[3][3]) + w2 * (green[1][1] + green[2][2])
-                bf = w1 * (blue[0][0] + blue[3][3]) + w2 * (blue[1][1] + blue[2][2])
-                af = w1 * (alpha[0][0] + alpha[3][3]) + w2 * (alpha[1][1] + alpha[2][2])
-
-            # clamp to prevent ringing artifacts: https://en.wikipedia.org/wiki/Ringing_artifacts
-            rf = clamp(rf, min_r_sample, max_r_sample)
-            gf = clamp(gf, min_g_sample, max_g_sample)
-            bf = clamp(bf, min_b_sample, max_b_sample)
-            af = clamp(af, min_a_sample, max_a_sample)
-            # need to be integers so we can do bitwise operations on these variables later
-            ri = int(clamp(math.ceil(rf), 0, 255))
-            gi = int(clamp(math.ceil(gf), 0, 255))
-            bi = int(clamp(math.ceil(bf), 0, 255))
-            ai = int(clamp(math.ceil(af), 0, 255))
-
-            # write to data
-            output_data[y * out_width + x] = output_data[y * out_width + x + 1] = \
-            output_data[(y + 1) * out_width + x] = original_pixel_data[cy * original_width + cx]
-            output_data[(y + 1) * out_width + x + 1] = (ai << 24) | (bi << 16) | (gi << 8) | ri
-        gimp.progress_update(float(y)/out_height)
-    
-    # Second pass
-    gimp.progress_init("Running second pass of Super-xBR on " + tdrawable.name + "...")
-
-    weight_pixel[0] = 2.0
-    weight_pixel[1] = 0.0
-    weight_pixel[2] = 0.0
-    weight_pixel[3] = 0.0
-    weight_pixel[4] = 0.0
-    weight_pixel[5] = 0.0
-
-    for y in range(0, out_height, 2):
-        for x in range(0, out_width, 2):
-            # sample supporting pixels in original image
-            for sx in range(-1, 3):
-                for sy in range(-1, 3):
-
-                    # clamp pixel locations
-                    csy = clamp(sx - sy + y, 0, scale_factor * original_height - 1)
-                    csx = clamp(sx + sy + x, 0, scale_factor * original_width - 1)
-
-                    # sample and add weighted components
-                    sample = output_data[csy * out_width + csx]
-                    red[sx + 1][sy + 1] = ((sample) >> 0) & 0xFF
-                    green[sx + 1][sy + 1] = ((sample) >> 8) & 0xFF
-                    blue[sx + 1][sy + 1] = ((sample) >> 16) & 0xFF
-                    alpha[sx + 1][sy + 1] = ((sample) >> 24) & 0xFF
-                    Y_luma[sx + 1][sy + 1] = (LUMA_R * red[sx + 1][sy + 1] + \
-                    LUMA_G * green[sx + 1][sy + 1] + LUMA_B * blue[sx + 1][sy + 1])
-            
-            min_r_sample = min(red[1][1], red[2][1], red[1][2], red[2][2])
-            min_g_sample = min(green[1][1], green[2][1], green[1][2], green[2][2])
-            min_b_sample = min(blue[1][1], blue[2][1], blue[1][2], blue[2][2])
-            min_a_sample = min(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2])
-
-            max_r_sample = max(red[1][1], red[2][1], red[1][2], red[2][2])
-            max_g_sample = max(green[1][1], green[2][1], green[1][2], green[2][2])
-            max_b_sample = max(blue[1][1], blue[2][1], blue[1][2], blue[2][2])
-            max_a_sample = max(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2])
-
-            d_edge = diagonal_edge(Y_luma, weight_pixel)
-
-            if d_edge <= 0:
-                rf = w3 * (red[0][3] + red[3][0]) + w4 * (red[1][2] + red[2][1])
-                gf = w3 * (green[0][3] + green[3][0]) + w4 * (green[1][2] + green[2][1])
-                bf = w3 * (blue[0][3] + blue[3][0]) + w4 * (blue[1][2] + blue[2][1])
-                af = w3 * (alpha[0][3] + alpha[3][0]) + w4 * (alpha[1][2] + alpha[2][1])
-            else:
-                rf = w3 * (red[0][0] + red[3][3]) + w4 * (red[1][1] + red[2][2])
-                gf = w3 * (green[0][0] + green[3][3]) + w4 * (green[1][1] + green[2][2])
-                bf = w3 * (blue[0][0] + blue[3][3]) + w4 * (blue[1][1] + blue[2][2])
-                af = w3 * (alpha[0][0] + alpha[3][3]) + w4 * (alpha[1][1] + alpha[2][2])
-            
-            # clamp to prevent ringing artifacts: https://en.wikipedia.org/wiki/Ringing_artifacts
-            rf = clamp(rf, min_r_sample, max_r_sample)
-            gf = clamp(gf, min_g_sample, max_g_sample)
-            bf = clamp(bf, min_b_sample, max_b_sample)
-            af = clamp(af, min_a_sample, max_a_sample)
-            # need to be integers so we can do bitwise operations on these variables later
-            ri = int(clamp(math.ceil(rf), 0, 255))
-            gi = int(clamp(math.ceil(gf), 0, 255))
-            bi = int(clamp(math.ceil(bf), 0, 255))
-            ai = int(clamp(math.ceil(af), 0, 255))
-            output_data[y * out_width + x + 1] = (ai << 24) | (bi << 16) | (gi << 8) | ri
-
-            for sx in range(-1, 3):
-                for sy in range(-1, 3):
-
-                    # clamp pixel locations
-                    csy = clamp(sx - sy + 1 + y, 0, scale_factor * original_height - 1)
-                    csx = clamp(sx + sy - 1 + x, 0, scale_factor * original_width - 1)
-
-                    # sample and add weighted components
-                    sample = output_data[csy * out_width + csx]
-                    red[sx + 1][sy + 1] = ((sample) >> 0) & 0xFF
-                    green[sx + 1][sy + 1] = ((sample) >> 8) & 0xFF
-                    blue[sx + 1][sy + 1] = ((sample) >> 16) & 0xFF
-                    alpha[sx + 1][sy + 1] = ((sample) >> 24) & 0xFF
-                    Y_luma[sx + 1][sy + 1] = (LUMA_R * red[sx + 1][sy + 1] + \
-                    LUMA_G * green[sx + 1][sy + 1] + LUMA_B * blue[sx + 1][sy + 1])
-            
-            d_edge = diagonal_edge(Y_luma, weight_pixel)
-
-            if d_edge <= 0:
-                rf = w3 * (red[0][3] + red[3][0]) + w4 * (red[1][2] + red[2][1])
-                gf = w3 * (green[0][3] + green[3][0]) + w4 * (green[1][2] + green[2][1])
-                bf = w3 * (blue[0][3] + blue[3][0]) + w4 * (blue[1][2] + blue[2][1])
-                af = w3 * (alpha[0][3] + alpha[3][0]) + w4 * (alpha[1][2] + alpha[2][1])
-            else:
-                rf = w3 * (red[0][0] + red[3][3]) + w4 * (red[1][1] + red[2][2])
-                gf = w3 * (green[0][0] + green[3][3]) + w4 * (green[1][1] + green[2][2])
-                bf = w3 * (blue[0][0] + blue[3][3]) + w4 * (blue[1][1] + blue[2][2])
-                af = w3 * (alpha[0][0] + alpha[3][3]) + w4 * (alpha[1][1] + alpha[2][2])
-            
-            # clamp to prevent ringing artifacts: https://en.wikipedia.org/wiki/Ringing_artifacts
-            rf = clamp(rf, min_r_sample, max_r_sample)
-            gf = clamp(gf, min_g_sample, max_g_sample)
-            bf = clamp(bf, min_b_sample, max_b_sample)
-            af = clamp(af, min_a_sample, max_a_sample)
-            # need to be integers so we can do bitwise operations on these variables later
-            ri = int(clamp(math.ceil(rf), 0, 255))
-            gi = int(clamp(math.ceil(gf), 0, 255))
-            bi = int(clamp(math.ceil(bf), 0, 255))
-            ai = int(clamp(math.ceil(af), 0, 255))
-            output_data[(y + 1) * out_width + x] = (ai << 24) | (bi << 16) | (gi << 8) | ri
-        gimp.progress_update(float(y)/out_height)
-
-    
-    # Third pass
-    gimp.progress_init("Running third pass of Super-xBR on " + tdrawable.name + "...")
-
-    weight_pixel[0] = 2.0
-    weight_pixel[1] = 1.0
-    weight_pixel[2] = -1.0
-    weight_pixel[3] = 4.0
-    weight_pixel[4] = -1.0
-    weight_pixel[5] = 1.0
-
-    for y in range(out_height - 1, -1, -1):
-        for x in range(out_width - 1, -1, -1):
-            for sx in range(-2, 2):
-                for sy in range(-2, 2):
-                    
-                    # clamp pixel locations
-                    csy = clamp(sy + y, 0, scale_factor * original_height - 1)
-                    csx = clamp(sx + x, 0, scale_factor * original_width - 1)
-                    
-                    # sample and add weighted components
-                    sample = output_data[csy * out_width + csx]
-                    red[sx + 2][sy + 2] = ((sample) >> 0) & 0xFF
-                    green[sx + 2][sy + 2] = ((sample) >> 8) & 0xFF
-                    blue[sx + 2][sy + 2] = ((sample) >> 16) & 0xFF
-                    alpha[sx + 2][sy + 2] = ((sample) >> 24) & 0xFF
-                    Y_luma[sx + 2][sy + 2] = (LUMA_R * red[sx + 2][sy + 2] + \
-                    LUMA_G * green[sx + 2][sy + 2] + LUMA_B * blue[sx + 2][sy + 2])
-            
-            min_r_sample = min(red[1][1], red[2][1], red[1][2], red[2][2])
-            min_g_sample = min(green[1][1], green[2][1], green[1][2], green[2][2])
-            min_b_sample = min(blue[1][1], blue[2][1], blue[1][2], blue[2][2])
-            min_a_sample = min(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2])
-
-            max_r_sample = max(red[1][1], red[2][1], red[1][2], red[2][2])
-            max_g_sample = max(green[1][1], green[2][1], green[1][2], green[2][2])
-            max_b_sample = max(blue[1][1], blue[2][1], blue[1][2], blue[2][2])
-            max_a_sample = max(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2])
-
-            d_edge = diagonal_edge(Y_luma, weight_pixel)
-
-            if d_edge <= 0:
-                rf = w1 * (red[0][3] + red[3][0]) + w2 * (red[1][2] + red[2][1])
-                gf = w1 * (green[0][3] + green[3][0]) + w2 * (green[1][2] + green[2][1])
-                bf = w1 * (blue[0][3] + blue[3][0]) + w2 * (blue[1][2] + blue[2][1])
-                af = w1 * (alpha[0][3] + alpha[3][0]) + w2 * (alpha[1][2] + alpha[2][1])
-            else:
-                rf = w1 * (red[0][0] + red[3][3]) + w2 * (red[1][1] + red[2][2])
-                gf = w1 * (green[0][0] + green[3][3]) + w2 * (green[1][1] + green[2][2])
-                bf = w1 * (blue[0][0] + blue[3][3]) + w2 * (blue[1][1] + blue[2][2])
-                af = w1 * (alpha[0][0] + alpha[3][3]) + w2 * (alpha[1][1] + alpha[2][2])
-            
-            # clamp to prevent ringing artifacts: https://en.wikipedia.org/wiki/Ringing_artifacts
-            rf = clamp(rf, min_r_sample, max_r_sample)
-            gf = clamp(gf, min_g_sample, max_g_sample)
-            bf = clamp(bf, min_b_sample, max_b_sample)
-            af = clamp(af, min_a_sample, max_a_sample)
-            # need to be integers so we can do bitwise operations on these variables later
-            ri = int(clamp(math.ceil(rf), 0, 255))
-            gi = int(clamp(math.ceil(gf), 0, 255))
-            bi = int(clamp(math.ceil(bf), 0, 255))
-            ai = int(clamp(math.ceil(af), 0, 255))
-            output_data[y * out_width + x] = (ai << 24) | (bi << 16) | (gi << 8) | ri
-        gimp.progress_update(float((out_height - 1) - y)/out_height)
-
-    # --- end super-XBR code ---
-    output_data = int_to_rgba(out_width, out_height, output_data)
 
+    image_width = timg.width
+    image_height = timg.height
     pdb.gimp_image_resize(timg, out_width, out_height, 0, 0)
 
     timg.add_layer(dest_drawable, 0)
-    dest_region[0:out_width, 0:out_height] = output_data.tostring()
-
+    if large or resizing:
+        try:
+            if resizing:
+                superxbr.resize_rows(original_pixel_data, RegionRows(dest_region, out_width), original_width,
+                                     original_height, out_width, out_height, rgba=rgba_flag, progress=progress,
+                                     workers=workers, skip_transparent=skip_transparent, cache=RESULT_CACHE,
+                                     profile=profile, stream=streaming,
+                                     directory=SCRATCH_DIRECTORY if mapped else None)
+            elif streaming:
+                superxbr.scale_stream(RegionRows(original_pixel_region, original_width),
+                                      RegionRows(dest_region, out_width), original_width, original_height,
+                                      scale_factor, rgba=rgba_flag, progress=progress,
+                                      skip_transparent=skip_transparent, profile=profile)
+            else:
+                superxbr.scale_mapped(original_pixel_data, RegionRows(dest_region, out_width), original_width,
+                                      original_height, scale_factor, rgba=rgba_flag, progress=progress,
+                                      workers=workers, skip_transparent=skip_transparent, profile=profile,
+                                      directory=SCRATCH_DIRECTORY)
+        except superxbr.Cancelled:
+            timg.remove_layer(dest_drawable)
+            pdb.gimp_image_resize(timg, image_width, image_height, 0, 0)
+            raise
+    else:
+        start = stage_start(profile)
+        dest_region[0:out_width, 0:out_height] = output_data
+        stage_end(profile, start, "region write", out_width * out_height, len(output_data))
+
+    start = stage_start(profile)
     dest_drawable.flush()
     dest_drawable.merge_shadow(True)
     dest_drawable.update(0, 0, out_width, out_height)
+    stage_end(profile, start, "layer update", out_width * out_height)
 
+    start = stage_start(profile)
     timg.flatten()
+    stage_end(profile, start, "flatten", out_width * out_height)
+
+    if profile is not None:
+        profile.close()
+        write_report(os.environ["SUPERXBR_PROFILE"], profile.report())
+
+# Every layer of an image or layer group that is not a group itself, top to bottom.
+def leaf_layers(layers):
+    for layer in layers:
+        children = getattr(layer, "layers", None)
+        if children is None:
+            yield layer
+        else:
+            for child in leaf_layers(children):
+                yield child
+
+# Merges what was written to a drawable's shadow tiles into it, as one undo step.
+def finish_drawable(drawable, width, height):
+    drawable.flush()
+    drawable.merge_shadow(True)
+    drawable.update(0, 0, width, height)
+
+# A job of the batch scaler (see superxbr/batch.py): a layer, scaled in place. The
+# layer grows to the scaled size, keeping its place in the scaled image, and its
+# mask, if any, grows with GIMP's own scaling, without interpolation (see
+# scale_layers()). The job keeps the pixels of the layer and its mask it read until
+# the batch is over, to put the layer back if the batch is cancelled.
+class LayerJob(object):
+
+    def __init__(self, layer, scale_factor):
+        self.layer = layer
+        self.scale_factor = scale_factor
+        self.width = layer.width
+        self.height = layer.height
+        self.offsets = layer.offsets
+        self.rgba = layer.type == RGBA_IMAGE
+        self.pixels = None
+        self.mask_pixels = None
+        self.resized = False
+
+    def read(self):
+        region = self.layer.get_pixel_rgn(0, 0, self.width, self.height, False, False)
+        self.pixels = region[0:self.width, 0:self.height]
+        if self.layer.mask is not None:
+            region = self.layer.mask.get_pixel_rgn(0, 0, self.width, self.height, False, False)
+            self.mask_pixels = region[0:self.width, 0:self.height]
+        return self.pixels, self.rgba
+
+    # Scales the layer to its new size and place, ready for its scaled pixels. Returns
+    # a row store over all of it.
+    def resize(self):
+        out_width = self.width * self.scale_factor
+        out_height = self.height * self.scale_factor
+        x, y = self.offsets
+        self.resized = True
+        pdb.gimp_layer_scale(self.layer, out_width, out_height, False)
+        self.layer.set_offsets(x * self.scale_factor, y * self.scale_factor)
+        return RegionRows(self.layer.get_pixel_rgn(0, 0, out_width, out_height, True, True), out_width)
+
+    def write(self, scaled):
+        self.resize().write(0, scaled)
+        finish_drawable(self.layer, self.width * self.scale_factor, self.height * self.scale_factor)
+
+    # Puts the layer and its mask back to their size, place and pixels before
+    # resize(), if it was resized.
+    def restore(self):
+        if not self.resized:
+            return
+        pdb.gimp_layer_scale(self.layer, self.width, self.height, False)
+        self.layer.set_offsets(*self.offsets)
+        region = self.layer.get_pixel_rgn(0, 0, self.width, self.height, True, True)
+        region[0:self.width, 0:self.height] = self.pixels
+        finish_drawable(self.layer, self.width, self.height)
+        if self.mask_pixels is not None:
+            region = self.layer.mask.get_pixel_rgn(0, 0, self.width, self.height, True, True)
+            region[0:self.width, 0:self.height] = self.mask_pixels
+            finish_drawable(self.layer.mask, self.width, self.height)
+        self.resized = False
+
+    # Streams the layer's pixels through the scaler band by band instead of write(),
+    # for layers too large to scale in memory. Its pixels are read at once, as the
+    # layer is scaled before the first band is written, but they are a fraction of
+    # the scaled pixels the scaler never holds. The steps of a cascade read back the
+    # RGBA rows the last one wrote, so layers without alpha are scaled into a
+    # temporary file first and copied over band by band. With SCRATCH_DIRECTORY set,
+    # the layer is scaled through scratch files there and copied over band by band.
+    def stream(self, progress, skip_transparent):
+        pixels, rgba = self.read()
+        if SCRATCH_DIRECTORY is not None:
+            superxbr.scale_mapped(pixels, self.resize(), self.width, self.height, self.scale_factor, rgba=rgba,
+                                  progress=progress, skip_transparent=skip_transparent,
+                                  directory=SCRATCH_DIRECTORY)
+            finish_drawable(self.layer, self.width * self.scale_factor, self.height * self.scale_factor)
+            return
+        source = superxbr.BufferRows(pixels, self.width, 4 if rgba else 3)
+        if rgba:
+            superxbr.scale_stream(source, self.resize(), self.width, self.height, self.scale_factor,
+                                  progress=progress, skip_transparent=skip_transparent)
+        else:
+            out_height = self.height * self.scale_factor
+            scaled = superxbr.FileRows(self.width * self.scale_factor)
+            try:
+                superxbr.scale_stream(source, scaled, self.width, self.height, self.scale_factor, rgba=False,
+                                      progress=progress, skip_transparent=skip_transparent)
+                destination = self.resize()
+                for y in range(0, out_height, BAND_ROWS):
+                    destination.write(y, scaled.read(y, min(y + BAND_ROWS, out_height)))
+            finally:
+                scaled.close()
+        finish_drawable(self.layer, self.width * self.scale_factor, self.height * self.scale_factor)
+
+# Scales every layer of an image in place, keeping them separate, in one undo group.
+# The layers are scaled on one pool of worker processes (0 for one per CPU),
+# while the plugin reads and writes their pixels; layers needing more than
+# STREAM_MEMORY are streamed afterwards, one by one.
+def python_superxBR_layers(timg, tdrawable, scale_factor = 2, skip_transparent = False, workers = 0):
+
+    if not superxbr.valid_scale_factor(scale_factor):
+        gimp.progress_init("Error: scale factor not a power of 2. Exiting...")
+        return
+
+    jobs = [LayerJob(layer, scale_factor) for layer in leaf_layers(timg.layers)]
+    cancellable(timg, lambda cancel: scale_layers(timg, jobs, scale_factor, skip_transparent, workers, cancel))
+
+# Scales the layers of jobs and the image's canvas with them. If cancelled, the
+# layers scaled so far are put back.
+def scale_layers(timg, jobs, scale_factor, skip_transparent, workers, cancel):
+    # GIMP only has to make room for the scaled pixels, which overwrite the layers,
+    # and the masks come back from their pixels as they were if cancelled; the
+    # context this sets is popped with the undo group, see cancellable()
+    pdb.gimp_context_set_interpolation(INTERPOLATION_NONE)
+    streamed = [job for job in jobs if superxbr.peak_memory(job.width, job.height, scale_factor) > STREAM_MEMORY]
+    pooled = [job for job in jobs if job not in streamed]
+    total = float(sum(job.width * job.height for job in jobs)) or 1.0
+    done = sum(job.width * job.height for job in pooled) / total
+
+    gimp.progress_init("Running Super-xBR on %d layers..." % len(jobs))
+    bar = superxbr.ThrottledProgress(gimp.progress_update, cancel)
+    try:
+        superxbr.scale_batch(pooled, scale_factor, workers=workers, progress=bar.part(0.0, done),
+                             skip_transparent=skip_transparent, cache=RESULT_CACHE)
+        for job in streamed:
+            share = job.width * job.height / total
+            job.stream(bar.part(done, share).scale, skip_transparent)
+            done += share
+    except superxbr.Cancelled:
+        for job in jobs:
+            job.restore()
+        raise
+
+    pdb.gimp_image_resize(timg, timg.width * scale_factor, timg.height * scale_factor, 0, 0)
+
+# Scales every PNG file in a directory (and its subdirectories, if recursive) into an
+# output directory, on one pool of worker processes (0 for one per CPU), like
+# `python -m superxbr --batch`.
+def python_superxBR_folder(source_directory, output_directory, scale_factor = 2, skip_transparent = False,
+                           recursive = False, workers = 0):
+
+    if not superxbr.valid_scale_factor(scale_factor):
+        gimp.progress_init("Error: scale factor not a power of 2. Exiting...")
+        return
 
-    timg.undo_group_end()
-    gimp.context_pop()
+    jobs = []
+    failed = []
+    for source, destination in collect_jobs([source_directory], output_directory, scale_factor, recursive):
+        try:
+            jobs.append(FileJob(source, destination, scale_factor, True))
+        except Exception as e:
+            failed.append("%s: %s" % (source, error_text(e)))
+
+    gimp.progress_init("Running Super-xBR on %d files..." % len(jobs))
+    cancel = superxbr.Cancel(CANCEL_FILE)
+    try:
+        with cancel_on_signals(cancel):
+            superxbr.scale_batch(jobs, scale_factor, workers=workers,
+                                 progress=superxbr.ThrottledProgress(gimp.progress_update, cancel),
+                                 skip_transparent=skip_transparent, cache=RESULT_CACHE,
+                                 failed=lambda job, error: failed.append("%s: %s" % (job.source, error_text(error))))
+    except superxbr.Cancelled:
+        pass
+    if failed:
+        gimp.message("Super-xBR could not scale these files:\n" + "\n".join(failed))
+
+# Writes the cancel file the running filters look for.
+def python_superxBR_cancel():
+    superxbr.request_cancel(CANCEL_FILE)
 
 register(
     "python_superxBR",
-    "Integer scales an image by a power of 2 using Hyllian's Super-xBR",
-    "Integer scales an image by a power of 2 using Hyllian's Super-xBR",
+    "Integer scales an image using Hyllian's Super-xBR",
+    "Integer scales an image using Hyllian's Super-xBR; factors that are not a power of 2 are resampled from the "
+    "next one up",
     "Abel Briggs",
     "Hyllian",
     "2019",
     "<Image>/Filters/Enhance/Super-xBR(py)...",
     "RGB, RGBA",
     [
-        (PF_INT, "scale_factor", "Scale factor(2, 4, 8, 16, etc.)", 2)
+        (PF_INT, "scale_factor", "Scale factor(2, 4, 8, 16, etc.; 3, 6, etc. are resampled)", 2),
+        (PF_TOGGLE, "skip_transparent", "Skip fully transparent areas (their edges may change slightly)", False),
+        (PF_TOGGLE, "incremental", "Only rescale what changed since the last run on this layer", False),
+        (PF_INT, "workers", "Worker processes (0 for one per CPU)", 0)
     ],
     [],
     python_superxBR)
 
+register(
+    "python_superxBR_size",
+    "Scales an image to an exact size using Hyllian's Super-xBR",
+    "Scales an image to an exact size using Hyllian's Super-xBR: by the smallest power of 2 that covers the size, "
+    "then resampled down to it",
+    "Abel Briggs",
+    "Hyllian",
+    "2019",
+    "<Image>/Filters/Enhance/Super-xBR to size(py)...",
+    "RGB, RGBA",
+    [
+        (PF_INT, "width", "Width", 256),
+        (PF_INT, "height", "Height", 256),
+        (PF_TOGGLE, "skip_transparent", "Skip fully transparent areas (their edges may change slightly)", False),
+        (PF_INT, "workers", "Worker processes (0 for one per CPU)", 0)
+    ],
+    [],
+    python_superxBR_size)
+
+register(
+    "python_superxBR_layers",
+    "Integer scales every layer of an image by a power of 2 using Hyllian's Super-xBR",
+    "Integer scales every layer of an image by a power of 2 using Hyllian's Super-xBR, keeping the layers "
+    "separate",
+    "Abel Briggs",
+    "Hyllian",
+    "2019",
+    "<Image>/Filters/Enhance/Super-xBR all layers(py)...",
+    "RGB, RGBA",
+    [
+        (PF_INT, "scale_factor", "Scale factor(2, 4, 8, 16, etc.)", 2),
+        (PF_TOGGLE, "skip_transparent", "Skip fully transparent areas (their edges may change slightly)", False),
+        (PF_INT, "workers", "Worker processes (0 for one per CPU)", 0)
+    ],
+    [],
+    python_superxBR_layers)
+
+register(
+    "python_superxBR_folder",
+    "Integer scales every PNG file in a folder by a power of 2 using Hyllian's Super-xBR",
+    "Integer scales every PNG file in a folder by a power of 2 using Hyllian's Super-xBR, into another folder",
+    "Abel Briggs",
+    "Hyllian",
+    "2019",
+    "Super-xBR folder(py)...",
+    "",
+    [
+        (PF_DIRNAME, "source_directory", "Folder of PNG files", os.path.expanduser("~")),
+        (PF_DIRNAME, "output_directory", "Folder for the scaled files", os.path.expanduser("~")),
+        (PF_INT, "scale_factor", "Scale factor(2, 4, 8, 16, etc.)", 2),
+        (PF_TOGGLE, "skip_transparent", "Skip fully transparent areas (their edges may change slightly)", False),
+        (PF_TOGGLE, "recursive", "Also scale the files in subfolders", False),
+        (PF_INT, "workers", "Worker processes (0 for one per CPU)", 0)
+    ],
+    [],
+    python_superxBR_folder,
+    menu="<Image>/Filters/Enhance")
+
+register(
+    "python_superxBR_cancel",
+    "Cancels every running Super-xBR filter",
+    "Cancels every running Super-xBR filter at its next progress update, putting its image back as it was",
+    "Abel Briggs",
+    "Hyllian",
+    "2019",
+    "Super-xBR cancel(py)",
+    "",
+    [],
+    [],
+    python_superxBR_cancel,
+    menu="<Image>/Filters/Enhance")
+
 main()
@@ -0,0 +1,18 @@
+# Hyllian's Super-xBR pixel art scaler.
+#
+# The scaling core has no GIMP dependency; superxBR.py at the top of the
+# repository wraps it as a GIMP plugin, and `python -m superxbr` runs it from
+# the command line.
+
+from .batch import scale_batch
+from .cache import ResultCache, cache_key
+from .cascade import format_bytes
+from .core import ENGINES, get_engine, peak_memory, scale, valid_scale_factor
+from .incremental import IncrementalScale, incremental_memory, rescale
+from .kernel import saved_evaluations
+from .mapped import mapped_memory, scale_mapped, scratch_size
+from .png import PNGError
+from .profile import Profile
+from .progress import Cancel, Cancelled, ThrottledProgress, request_cancel
+from .resample import DownsampleRows, resize, resize_memory, resize_rows
+from .stream import BufferRows, FileRows, scale_stream, stream_memory
@@ -0,0 +1,7 @@
+import sys
+
+from .cli import main
+
+# guarded so that worker processes importing this module don't run the tool again
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# Batch scaling: many images (the layers of an image, the files of a directory)
+# through one pool of worker processes that lives for the whole batch.
+#
+# Every worker scales whole images with superxbr.scale(), so the pool's setup is
+# paid once, not once per image, and small images like the frames of an animation
+# keep every worker busy. Reading and writing the images stays in the calling
+# process (GIMP's pixel regions can only be used there): it reads the next images
+# and writes the finished ones while the workers compute, keeping a few images per
+# worker in flight so that neither side waits for the other for long.
+#
+# Jobs are objects with
+#
+#   width, height  the size of the image, known before it is read
+#   read()         returns (pixels, rgba): the image's RGBA bytes, or RGB bytes if
+#                  rgba is False
+#   write(scaled)  stores the scaled RGBA bytes
+#
+# and are read, scaled and written in order.
+
+from collections import deque
+import multiprocessing
+
+from .cache import cache_key
+from .core import engine_name, scale, valid_scale_factor
+from .parallel import worker_count
+from .profile import stage_end, stage_start
+from .progress import Cancelled, scale_fraction, worker_signals
+
+# Images per worker read ahead of the workers. Bounds the memory the batch holds to
+# that many images (and their results) per worker.
+JOBS_PER_WORKER = 2
+
+# Scales one image in a worker process, or with progress in this one: task is
+# (pixels, width, height, scale_factor, rgba, engine, skip_transparent) as taken by
+# scale().
+def scale_task(task, progress=None):
+    pixels, width, height, scale_factor, rgba, engine, skip_transparent = task
+    return scale(pixels, width, height, scale_factor, rgba, engine, progress, skip_transparent=skip_transparent)
+
+def no_progress(fraction):
+    pass
+
+# Output pixels of a job at a scale factor, the weight of its share of the progress.
+def job_pixels(job, scale_factor):
+    return job.width * job.height * scale_factor * scale_factor
+
+# Scales every job (see above) by scale_factor, on workers processes (0 for one per
+# CPU; 1 scales in this process, one job after the other).
+# progress, if given, is called as progress(fraction) whenever a job is done, with
+# the fraction of all output pixels done so far, and as the passes go when scaling
+# in this process; it may raise progress.Cancelled to stop the batch. engine, skip_transparent and cache
+# are as for scale(); cache lookups and stores happen in this process. profile, if
+# given, records reading and writing the jobs and waiting for the workers, see
+# profile.py.
+# failed, if given, is called as failed(job, error) for a job whose reading, scaling
+# or writing raised an exception, and the batch goes on with the next job; without
+# it, the exception ends the batch. Cancelled always ends it.
+# Returns the number of jobs scaled.
+def scale_batch(jobs, scale_factor=2, engine="auto", workers=0, progress=None, skip_transparent=False,
+                cache=None, profile=None, failed=None):
+    if not valid_scale_factor(scale_factor):
+        raise ValueError("scale factor not a power of 2: %r" % (scale_factor,))
+    jobs = list(jobs)
+    engine = engine_name(engine)
+    workers = worker_count(workers)
+    progress = progress or no_progress
+    total = sum(job_pixels(job, scale_factor) for job in jobs) or 1
+    # output pixels of the jobs done so far, and the number of jobs scaled
+    done = [0]
+    scaled_jobs = [0]
+
+    # Counts a job as done, failed or not.
+    def advance(job):
+        done[0] += job_pixels(job, scale_factor)
+        progress(float(done[0])/total)
+
+    # Progress of the passes of a job scaled in this process.
+    def job_progress(job):
+        def update(step, steps, pass_number, fraction):
+            progress((done[0] + job_pixels(job, scale_factor) * scale_fraction(step, steps, pass_number, fraction))
+                     / total)
+        return update
+
+    def fail(job, error):
+        if failed is None:
+            raise error
+        failed(job, error)
+        advance(job)
+
+    # Writes the result of a job, which result() returns, after a stage of the
+    # profile to record result() as, if any. key is the job's cache key to store the
+    # result under, if any.
+    def finish(job, result, stage, key):
+        try:
+            start = stage_start(profile)
+            scaled = result()
+            if stage is not None:
+                stage_end(profile, start, stage, job_pixels(job, scale_factor), len(scaled))
+            start = stage_start(profile)
+            job.write(scaled)
+            stage_end(profile, start, "write", job_pixels(job, scale_factor), len(scaled))
+        except Cancelled:
+            raise
+        except Exception as e:
+            fail(job, e)
+            return
+        if key is not None:
+            start = stage_start(profile)
+            cache.put(key, scaled)
+            stage_end(profile, start, "cache put", job_pixels(job, scale_factor), len(scaled))
+        scaled_jobs[0] += 1
+        advance(job)
+
+    pool = multiprocessing.Pool(workers, worker_signals) if workers > 1 else None
+    # jobs handed to the pool, oldest first, as (job, async result, cache key)
+    pending = deque()
+    try:
+        for job in jobs:
+            try:
+                start = stage_start(profile)
+                pixels, rgba = job.read()
+                stage_end(profile, start, "read", job.width * job.height, len(pixels))
+            except Exception as e:
+                fail(job, e)
+                continue
+
+            key = None
+            if cache is not None:
+                start = stage_start(profile)
+                key = cache_key(pixels, job.width, job.height, rgba, scale_factor, skip_transparent)
+                cached = cache.get(key)
+                stage_end(profile, start, "cache get", 0 if cached is None else job_pixels(job, scale_factor),
+                          0 if cached is None else len(cached))
+                if cached is not None:
+                    finish(job, lambda: cached, None, None)
+                    continue
+
+            task = (pixels, job.width, job.height, scale_factor, rgba, engine, skip_transparent)
+            if pool is None:
+                finish(job, lambda: scale_task(task, job_progress(job)), "scale", key)
+                continue
+
+            pending.append((job, pool.apply_async(scale_task, (task,)), key))
+            # finish what is done, and wait for the oldest job once enough are in flight
+            while pending and (len(pending) >= workers * JOBS_PER_WORKER or pending[0][1].ready()):
+                job, result, key = pending.popleft()
+                finish(job, result.get, "wait", key)
+
+        while pending:
+            job, result, key = pending.popleft()
+            finish(job, result.get, "wait", key)
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+            pool = None
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return scaled_jobs[0]
@@ -0,0 +1,140 @@
+# On-disk cache of scaled images, so that scaling the same pixels with the same
+# options again costs a lookup instead of all the passes.
+#
+# The cache is content-addressed: an entry's name is a hash of the source pixel
+# bytes together with the width, height, pixel format (RGB or RGBA), scale factor,
+# skip_transparent option and kernel.ALGORITHM_VERSION. Entries hold the scaled
+# RGBA bytes, zlib compressed, which pixel art shrinks a lot.
+#
+# The cache keeps to a size cap by evicting the least recently used entries. Every
+# hit touches the entry's modification time, so that time orders the entries by
+# last use. Entries are written to a temporary file and renamed into place, so that
+# several processes (GIMP and build scripts, say) can share a cache directory.
+
+import hashlib
+import os
+import tempfile
+import zlib
+
+from .kernel import ALGORITHM_VERSION
+from .pixels import as_bytes
+
+# Size cap of a cache, in bytes, unless configured otherwise.
+CACHE_SIZE = 512 << 20
+
+# File name extension of cache entries. Other files in the directory are left alone.
+ENTRY_SUFFIX = ".xbr"
+
+# zlib level of the entries: the fastest, which still gets most of the gain.
+COMPRESSION = 1
+
+# Default cache directory: $SUPERXBR_CACHE if set, else superxbr under the user's
+# cache directory ($XDG_CACHE_HOME, ~/.cache, or %LOCALAPPDATA% on Windows).
+def default_directory():
+    if os.environ.get("SUPERXBR_CACHE"):
+        return os.environ["SUPERXBR_CACHE"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA") or \
+           os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "superxbr")
+
+# Default size cap: $SUPERXBR_CACHE_SIZE megabytes if set (fractions too), else
+# CACHE_SIZE. The GIMP plugin makes its cache when GIMP loads it, so a value that is
+# not a number, or is negative, falls back to CACHE_SIZE rather than raising.
+def default_size():
+    value = os.environ.get("SUPERXBR_CACHE_SIZE")
+    if value:
+        try:
+            size = float(value)
+        except ValueError:
+            size = -1.0
+        if 0 <= size < float("inf"):
+            return int(size * (1 << 20))
+    return CACHE_SIZE
+
+# Cache key for scaling pixels (the raw RGBA, or RGB if rgba is False, bytes of a
+# width * height image) with the given options.
+def cache_key(pixels, width, height, rgba, scale_factor, skip_transparent=False):
+    digest = hashlib.sha256(as_bytes(pixels))
+    digest.update(("|%d|%dx%d|%s|%dx|%d" % (ALGORITHM_VERSION, width, height, "RGBA" if rgba else "RGB",
+                                            scale_factor, bool(skip_transparent))).encode("ascii"))
+    return digest.hexdigest()
+
+# A cache directory holding at most max_bytes of entries.
+class ResultCache(object):
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or default_directory()
+        self.max_bytes = default_size() if max_bytes is None else max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    # The scaled RGBA bytes stored under key, or None if there are none.
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, None)
+            return zlib.decompress(data)
+        except (IOError, OSError, zlib.error):
+            # missing, evicted by another process meanwhile, or damaged
+            return None
+
+    # Stores the scaled RGBA bytes under key, then evicts entries over the size cap.
+    # Results that would not fit at all are not stored. Returns False if the entry
+    # could not be written, which leaves the cache as it was: a cache is only ever a
+    # shortcut, so that is no reason to fail the scaling that produced the result.
+    def put(self, key, scaled):
+        data = zlib.compress(as_bytes(scaled), COMPRESSION)
+        temporary = None
+        try:
+            if len(data) > self.max_bytes:
+                # the cap may have shrunk since the entries there were stored
+                if os.path.isdir(self.directory):
+                    self.evict()
+                return False
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, temporary = tempfile.mkstemp(prefix="superxbr-", suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            if os.path.exists(self.path(key)):
+                # the same result, stored by another process meanwhile
+                os.remove(temporary)
+                os.utime(self.path(key), None)
+            else:
+                os.rename(temporary, self.path(key))
+            self.evict()
+        except (IOError, OSError):
+            if temporary is not None and os.path.exists(temporary):
+                os.remove(temporary)
+            return False
+        return True
+
+    # (modification time, size, path) of every entry.
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    # Removes the least recently used entries until the rest fit the size cap.
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
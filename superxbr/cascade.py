@@ -0,0 +1,86 @@
+# Scale factors above 2 run the 2x scaler repeatedly, like Hyllian's reference
+# implementation: 4x is two 2x steps, 8x three, and so on, each step scaling the
+# output of the one before.
+#
+# A step only needs its own input and output, so two buffers serve every step: a
+# large one the size of the final image and a small one a quarter of that. The
+# steps alternate between them, counting back from the last step, which always
+# writes the large one:
+#
+#   8x: original -> large (2x) -> small (4x) -> large (8x)
+#
+# Memory therefore stays at the original plus 1.25 times the final image, however
+# many steps there are.
+
+from .profile import stage_end, stage_start
+
+# Number of 2x steps for a scale factor (a power of 2).
+def cascade_steps(scale_factor):
+    steps = 0
+    while scale_factor > 1:
+        scale_factor >>= 1
+        steps += 1
+    return steps
+
+# Pixel counts of the large and the small buffer for a cascade ending in final pixels.
+def buffer_sizes(final, steps):
+    return final, final // 4 if steps > 1 else 0
+
+# Bytes of pixel buffers the cascade holds at its peak: the packed original image
+# and both step buffers, at pixel_bytes bytes per pixel.
+def cascade_memory(original_width, original_height, scale_factor, pixel_bytes=4):
+    original = original_width * original_height
+    large, small = buffer_sizes(original * scale_factor * scale_factor, cascade_steps(scale_factor))
+    return (original + large + small) * pixel_bytes
+
+# Human readable size, e.g. "96.0 MB".
+def format_bytes(size):
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024.0
+    if unit == "bytes":
+        return "%d bytes" % size
+    return "%.1f %s" % (size, unit)
+
+# Index (0 for the large buffer, 1 for the small one) of the buffer step writes to.
+# Steps count from 0.
+def step_buffer(step, steps):
+    return (steps - 1 - step) % 2
+
+# Adapts a cascade progress callback, progress(step, steps, pass_number, fraction),
+# to the progress(pass_number, fraction) callback of the 2x scalers. Steps count from 1.
+def step_progress(progress, step, steps):
+    def update(pass_number, fraction):
+        progress(step, steps, pass_number, fraction)
+    return update
+
+# Scales the packed original pixels, from the engine's pixels_from_bytes(), by
+# scale_factor with the 2x scaler of an engine module (kernel or numpy_engine).
+# evaluations and skip_transparent are passed on to every step, see
+# kernel.add_evaluations() and kernel.flat_samples(). profile, if given, records
+# the allocation of the buffers and every pass of every step, see profile.py.
+# buffers, if given, are the large and the small buffer of buffer_sizes() to use
+# instead of allocating them, e.g. views of memory-mapped files (see mapped.py).
+# Returns the engine's buffer holding the result.
+def run_cascade(module, original_pixel_data, original_width, original_height, scale_factor, progress,
+                evaluations=None, skip_transparent=False, profile=None, buffers=None):
+    steps = cascade_steps(scale_factor)
+    final = original_width * original_height * scale_factor * scale_factor
+    if buffers is None:
+        start = stage_start(profile)
+        sizes = buffer_sizes(final, steps)
+        buffers = [module.allocate(size) for size in sizes]
+        stage_end(profile, start, "allocate", sum(sizes), sum(sizes) * module.PIXEL_BYTES)
+
+    source = original_pixel_data
+    width = original_width
+    height = original_height
+    for step in range(steps):
+        output_data = buffers[step_buffer(step, steps)]
+        module.scale2x(source, width, height, output_data, step_progress(progress, step + 1, steps),
+                       evaluations, skip_transparent, profile)
+        source = output_data
+        width *= 2
+        height *= 2
+    return source
@@ -0,0 +1,407 @@
+# Command line front end: scales PNG files, or whole directories of them,
+# without starting GIMP.
+#
+#   python -m superxbr -s 4 sprite.png -o sprite_4x.png
+#   python -m superxbr -s 2 assets/ -o assets_2x/
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+from . import core
+from .batch import scale_batch
+from .cache import CACHE_SIZE, ResultCache, default_directory
+from .incremental import incremental_memory, rescale
+from .parallel import worker_count
+from .cascade import format_bytes
+from .kernel import DIFFERENCE_EVALUATIONS, LUMA_EVALUATIONS, PASS_NAMES, saved_evaluations
+from .mapped import mapped_memory, scale_mapped
+from .png import PNGError, PNGRows, png_size, read_png, write_png, write_png_rows
+from .profile import Profile, can_trace_memory, stage_end, stage_start, write_report
+from .resample import resize_memory, resize_rows
+from .stream import BufferRows, FileRows, scale_stream, stream_memory
+
+# Name of the scaled file written for input_path when no explicit output file is
+# given, for a scale factor or, if given, an exact (width, height).
+def output_name(input_path, scale_factor, size=None):
+    stem, _ = os.path.splitext(os.path.basename(input_path))
+    if size is not None:
+        return "%s_%dx%d.png" % (stem, size[0], size[1])
+    return "%s_%dx.png" % (stem, scale_factor)
+
+# Expands the command line inputs into (input file, output file) pairs. size is as
+# for output_name().
+def collect_jobs(inputs, output, scale_factor, recursive, size=None):
+    jobs = []
+    to_directory = output is not None and (len(inputs) > 1 or os.path.isdir(output) or
+                                           any(os.path.isdir(path) for path in inputs))
+    for path in inputs:
+        if os.path.isdir(path):
+            if output is None:
+                raise ValueError("scaling a directory needs an output directory (-o)")
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".png"):
+                        source = os.path.join(root, name)
+                        relative = os.path.relpath(root, path)
+                        jobs.append((source, os.path.normpath(os.path.join(output, relative, name))))
+                if not recursive:
+                    break
+        elif to_directory:
+            jobs.append((path, os.path.join(output, output_name(path, scale_factor, size))))
+        elif output is not None:
+            jobs.append((path, output))
+        else:
+            jobs.append((path, os.path.join(os.path.dirname(path), output_name(path, scale_factor, size))))
+    return jobs
+
+# Scales RGBA pixels with the streaming scaler into a temporary file, and compresses
+# the rows from there into the PNG file at destination.
+def scale_file_stream(pixels, width, height, scale_factor, engine, destination, evaluations=None,
+                      skip_transparent=False, profile=None):
+    out_width = width * scale_factor
+    out_height = height * scale_factor
+    scaled = FileRows(out_width)
+    try:
+        scale_stream(BufferRows(pixels, width), scaled, width, height, scale_factor, engine=engine,
+                     evaluations=evaluations, skip_transparent=skip_transparent, profile=profile)
+        start = stage_start(profile)
+        write_png_rows(destination, out_width, out_height,
+                       (scaled.read(y, y + 1) for y in range(out_height)))
+        stage_end(profile, start, "write png", out_width * out_height)
+    finally:
+        scaled.close()
+
+# Scales RGBA pixels with the step buffers in scratch files in directory (see
+# mapped.py), and compresses the rows into the PNG file at destination as they come
+# out of them.
+def scale_file_mapped(pixels, width, height, scale_factor, engine, destination, directory, workers=1,
+                      evaluations=None, skip_transparent=False, profile=None):
+    scaled = PNGRows(destination, width * scale_factor, height * scale_factor)
+    try:
+        scale_mapped(pixels, scaled, width, height, scale_factor, engine=engine, workers=workers,
+                     evaluations=evaluations, skip_transparent=skip_transparent, profile=profile,
+                     directory=directory)
+        scaled.finish()
+    finally:
+        scaled.close()
+
+# Resizes RGBA pixels to out_width * out_height (see resample.py) into the PNG file
+# at destination, through the streaming scaler if stream is True, or with the
+# buffers of the scale in scratch files in directory if given.
+def resize_file(pixels, width, height, out_width, out_height, engine, destination, workers=1, evaluations=None,
+                skip_transparent=False, cache=None, profile=None, stream=False, directory=None):
+    resized = PNGRows(destination, out_width, out_height)
+    try:
+        resize_rows(pixels, resized, width, height, out_width, out_height, engine=engine, workers=workers,
+                    evaluations=evaluations, skip_transparent=skip_transparent, cache=cache, profile=profile,
+                    stream=stream, directory=directory)
+        resized.finish()
+    finally:
+        resized.close()
+
+# True if path is a PNG file of width * height pixels, as the scaled file left by an
+# earlier run with --incremental is.
+def png_written(path, width, height):
+    try:
+        return png_size(path) == (width, height)
+    except (IOError, OSError, PNGError):
+        return False
+
+# Text reporting why a file could not be scaled: the message of the errors files
+# are expected to raise, and the type of any other error with its message.
+def error_text(error):
+    if isinstance(error, (IOError, OSError, PNGError)):
+        return str(error)
+    return "%s: %s" % (type(error).__name__, error)
+
+# A job of the batch scaler (see batch.py): a PNG file scaled into another one.
+class FileJob(object):
+
+    def __init__(self, source, destination, scale_factor, quiet):
+        self.source = source
+        self.destination = destination
+        self.scale_factor = scale_factor
+        self.quiet = quiet
+        self.width, self.height = png_size(source)
+
+    def read(self):
+        width, height, pixels = read_png(self.source)
+        if (width, height) != (self.width, self.height):
+            raise PNGError("image changed size while scaling")
+        return pixels, True
+
+    def write(self, scaled):
+        directory = os.path.dirname(self.destination)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        out_width = self.width * self.scale_factor
+        out_height = self.height * self.scale_factor
+        write_png(self.destination, out_width, out_height, scaled)
+        if not self.quiet:
+            print("%s -> %s (%dx%d -> %dx%d)" % (self.source, self.destination, self.width, self.height,
+                                                 out_width, out_height))
+
+# Scales the files of jobs, as (input file, output file) pairs, on one pool of
+# worker processes with batch.scale_batch(). A file that cannot be read, scaled or
+# written, whatever the error, is reported and counted, and the batch goes on with
+# the others. Returns the number of files that failed.
+def scale_files_batch(args, jobs, cache, profile):
+    failures = [0]
+
+    def failed(source, error):
+        print("superxbr: %s: %s" % (source, error_text(error)), file=sys.stderr)
+        failures[0] += 1
+
+    file_jobs = []
+    for source, destination in jobs:
+        try:
+            file_jobs.append(FileJob(source, destination, args.scale, args.quiet))
+        except Exception as e:
+            failed(source, e)
+
+    start = time.time()
+    scaled = scale_batch(file_jobs, args.scale, args.engine, args.jobs, skip_transparent=args.skip_transparent,
+                         cache=cache, profile=profile, failed=lambda job, error: failed(job.source, error))
+    if not args.quiet:
+        print("%d of %d files scaled in %.2fs on %d worker processes" % (scaled, len(jobs), time.time() - start,
+                                                                         worker_count(args.jobs)))
+    return failures[0]
+
+# Percentage of part in total, 0 for an empty total.
+def percent(part, total):
+    return 100.0 * part / total if total else 0.0
+
+# Lines reporting the evaluations scale() counted, and how many it saved, per pass.
+def evaluation_report(evaluations):
+    saved = saved_evaluations(evaluations)
+    lines = []
+    for pass_number in sorted(evaluations):
+        neighbourhoods = evaluations[pass_number][0]
+        luma_saved, differences_saved = saved[pass_number]
+        lines.append("  %s pass: %d neighbourhoods, saved %d of %d luma evaluations (%.1f%%) "
+                     "and %d of %d luma differences (%.1f%%)" % (
+                         PASS_NAMES[pass_number], neighbourhoods,
+                         luma_saved, neighbourhoods * LUMA_EVALUATIONS,
+                         percent(luma_saved, neighbourhoods * LUMA_EVALUATIONS),
+                         differences_saved, neighbourhoods * DIFFERENCE_EVALUATIONS,
+                         percent(differences_saved, neighbourhoods * DIFFERENCE_EVALUATIONS)))
+    return lines
+
+# Writes the reports of profiles to path. Returns 1 if that failed, else 0.
+def write_profile(path, profiles):
+    try:
+        write_report(path, [profile.report() for profile in profiles])
+    except (IOError, OSError) as e:
+        print("superxbr: %s: %s" % (path, e), file=sys.stderr)
+        return 1
+    return 0
+
+# Parses an exact output size, WIDTHxHEIGHT.
+def parse_size(text):
+    try:
+        width, height = [int(part) for part in text.lower().split("x")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("not a size like 320x240: %s" % text)
+    if width < 1 or height < 1:
+        raise argparse.ArgumentTypeError("size must be positive: %s" % text)
+    return width, height
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="superxbr",
+        description="Scale PNG pixel art using Hyllian's Super-xBR.")
+    parser.add_argument("inputs", nargs="+", metavar="INPUT",
+                        help="PNG file or directory of PNG files")
+    parser.add_argument("-s", "--scale", type=int, default=2,
+                        help="scale factor (2, 4, 8, 16, etc.), default 2; other factors scale by the next "
+                             "power of 2 and resample down to the exact size")
+    parser.add_argument("--size", type=parse_size, metavar="WIDTHxHEIGHT",
+                        help="scale to exactly this size instead of by a factor, the same way")
+    parser.add_argument("-o", "--output",
+                        help="output file, or output directory when scaling several files or a directory "
+                             "(default: <name>_<scale>x.png next to each input)")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="also scale PNG files in subdirectories of directory inputs")
+    parser.add_argument("--engine", default="auto", choices=["auto", "python", "numpy", "fixed"],
+                        help="scaling engine; fixed is the NumPy engine in integer arithmetic "
+                             "(default: numpy if installed, else python)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes per image, or for all images with --batch, 0 for one per CPU "
+                             "(default 1)")
+    parser.add_argument("--batch", action="store_true",
+                        help="scale several files at once, one per worker process of -j, on one pool for all "
+                             "of them, reading and writing files while the workers compute")
+    parser.add_argument("--stream", action="store_true",
+                        help="scale in bands of rows through a temporary file, with memory "
+                             "proportional to the image width (single process)")
+    parser.add_argument("--scratch", metavar="DIRECTORY",
+                        help="keep the buffers of the scale in memory-mapped temporary files in "
+                             "DIRECTORY, for outputs larger than the memory (a fast disk helps)")
+    parser.add_argument("--skip-transparent", action="store_true",
+                        help="treat fully transparent areas as uniform; faster, but the colour "
+                             "under them and the pixels along their edges may change")
+    parser.add_argument("--cache", nargs="?", const=default_directory(), metavar="DIRECTORY",
+                        help="reuse results of earlier runs on the same pixels and options, kept in "
+                             "DIRECTORY (default %s)" % default_directory())
+    parser.add_argument("--cache-size", type=int, metavar="MB",
+                        help="size cap of the cache, least recently used results go first "
+                             "(default $SUPERXBR_CACHE_SIZE, else %d)" % (CACHE_SIZE >> 20))
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep what each output was scaled from in the cache, and only rescale the "
+                             "parts of an input that changed since (single process, needs --cache)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write how long every stage of every scale took to FILE, as JSON")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="also trace the memory every stage allocates (slow, Python 3.9 or later)")
+    parser.add_argument("--evaluations", action="store_true",
+                        help="report the luma and luma difference evaluations the passes saved")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only report errors")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.scale < 2 and args.size is None:
+        print("superxbr: scale factor below 2: %d" % args.scale, file=sys.stderr)
+        return 2
+    resizing = args.size is not None or not core.valid_scale_factor(args.scale)
+    if resizing and (args.batch or args.incremental):
+        print("superxbr: --batch and --incremental only scale by powers of 2", file=sys.stderr)
+        return 2
+    if args.jobs < 0:
+        print("superxbr: number of jobs must not be negative: %d" % args.jobs, file=sys.stderr)
+        return 2
+    if args.stream and args.jobs != 1:
+        print("superxbr: --stream runs on a single process, drop -j", file=sys.stderr)
+        return 2
+    if args.stream and args.scratch:
+        print("superxbr: --stream and --scratch are two ways to bound memory, pick one", file=sys.stderr)
+        return 2
+    if args.scratch and not os.path.isdir(args.scratch):
+        print("superxbr: scratch directory does not exist: %s" % args.scratch, file=sys.stderr)
+        return 2
+    if args.scratch and (args.cache or args.incremental):
+        print("superxbr: --scratch does not use the cache, drop --cache", file=sys.stderr)
+        return 2
+    if args.stream and args.cache:
+        print("superxbr: --stream does not use the cache, drop --cache", file=sys.stderr)
+        return 2
+    if args.incremental and (not args.cache or args.stream or args.jobs != 1):
+        print("superxbr: --incremental needs --cache, and runs on a single process without --stream",
+              file=sys.stderr)
+        return 2
+    if args.batch and (args.stream or args.scratch or args.incremental or args.evaluations):
+        print("superxbr: --batch does not combine with --stream, --scratch, --incremental or --evaluations",
+              file=sys.stderr)
+        return 2
+    if args.profile_memory and not args.profile:
+        print("superxbr: --profile-memory needs --profile", file=sys.stderr)
+        return 2
+    if args.cache_size is not None and args.cache_size < 0:
+        print("superxbr: cache size must not be negative: %d" % args.cache_size, file=sys.stderr)
+        return 2
+    try:
+        core.get_engine(args.engine)
+        jobs = collect_jobs(args.inputs, args.output, args.scale, args.recursive, args.size)
+    except ValueError as e:
+        print("superxbr: %s" % e, file=sys.stderr)
+        return 2
+    cache = None
+    if args.cache:
+        cache = ResultCache(args.cache, None if args.cache_size is None else args.cache_size << 20)
+
+    if args.profile_memory and not can_trace_memory():
+        print("superxbr: --profile-memory needs Python 3.9 or later, profiling time only", file=sys.stderr)
+
+    if args.batch:
+        profile = None
+        if args.profile:
+            profile = Profile(args.profile_memory, batch=len(jobs), scale=args.scale,
+                              engine=core.engine_name(args.engine), jobs=worker_count(args.jobs))
+        failures = scale_files_batch(args, jobs, cache, profile)
+        if profile is not None:
+            profile.close()
+            failures += write_profile(args.profile, [profile])
+        return 1 if failures else 0
+
+    failures = 0
+    profiles = []
+    for source, destination in jobs:
+        start = time.time()
+        evaluations = {} if args.evaluations else None
+        profile = None
+        if args.profile:
+            profile = Profile(args.profile_memory, source=source, destination=destination, scale=args.scale,
+                              engine=core.engine_name(args.engine), jobs=args.jobs, stream=args.stream,
+                              scratch=args.scratch, incremental=args.incremental, size=args.size)
+            profiles.append(profile)
+        try:
+            stage = stage_start(profile)
+            width, height, pixels = read_png(source)
+            stage_end(profile, stage, "read png", width * height, len(pixels))
+            if profile is not None:
+                profile.info.update(width=width, height=height)
+            directory = os.path.dirname(destination)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            out_width, out_height = args.size or (width * args.scale, height * args.scale)
+            if resizing:
+                resize_file(pixels, width, height, out_width, out_height, args.engine, destination, args.jobs,
+                            evaluations, args.skip_transparent, cache, profile, args.stream, args.scratch)
+            elif args.stream:
+                scale_file_stream(pixels, width, height, args.scale, args.engine, destination, evaluations,
+                                  args.skip_transparent, profile)
+            elif args.scratch:
+                scale_file_mapped(pixels, width, height, args.scale, args.engine, destination, args.scratch,
+                                  args.jobs, evaluations, args.skip_transparent, profile)
+            else:
+                scaled = None
+                if args.incremental:
+                    image, changed = rescale(cache, os.path.abspath(destination), pixels, width, height,
+                                             args.scale, engine=args.engine, skip_transparent=args.skip_transparent,
+                                             profile=profile)
+                    # a PNG file is compressed as a whole, so it is written again unless
+                    # no pixel changed since it was
+                    if changed != [] or not png_written(destination, out_width, out_height):
+                        scaled = image.rows(profile=profile)
+                else:
+                    scaled = core.scale(pixels, width, height, args.scale, engine=args.engine, workers=args.jobs,
+                                        evaluations=evaluations, skip_transparent=args.skip_transparent,
+                                        cache=cache, profile=profile)
+                if scaled is not None:
+                    stage = stage_start(profile)
+                    write_png(destination, width * args.scale, height * args.scale, scaled)
+                    stage_end(profile, stage, "write png", width * height * args.scale * args.scale)
+        except Exception as e:
+            print("superxbr: %s: %s" % (source, error_text(e)), file=sys.stderr)
+            failures += 1
+            continue
+        finally:
+            if profile is not None:
+                profile.close()
+        if not args.quiet:
+            if resizing:
+                memory = resize_memory(width, height, out_width, out_height, args.engine, args.jobs, args.stream,
+                                       args.scratch)
+            elif args.stream:
+                memory = stream_memory(width, height, args.scale, args.engine)
+            elif args.scratch:
+                memory = mapped_memory(width, height, args.scale, args.engine)
+            elif args.incremental:
+                memory = incremental_memory(width, height, args.scale, args.engine)
+            else:
+                memory = core.peak_memory(width, height, args.scale, args.engine, args.jobs)
+            print("%s -> %s (%dx%d -> %dx%d, %.2fs, peak %s)" % (source, destination, width, height,
+                  out_width, out_height, time.time() - start, format_bytes(memory)))
+        if evaluations is not None:
+            for line in evaluation_report(evaluations):
+                print(line)
+
+    if args.profile:
+        failures += write_profile(args.profile, profiles)
+    return 1 if failures else 0
@@ -0,0 +1,105 @@
+# Headless entry point of the scaler: hands RGB(A) byte buffers to an engine, which
+# works on them as packed pixels (see pixels.py). Nothing in here depends on GIMP,
+# so it can be used from build scripts as well as from the plugin.
+
+from . import kernel
+from .cache import cache_key
+from .cascade import cascade_memory, run_cascade
+from .parallel import PIXEL_BYTES as SHARED_PIXEL_BYTES
+from .parallel import superxbr_parallel
+from .pixels import rgb_to_rgba
+from .profile import stage_end, stage_start
+
+# NumPy is optional: without it the scaler falls back to the plain Python loops.
+try:
+    from . import fixed_engine, numpy_engine
+except ImportError:
+    fixed_engine = numpy_engine = None
+
+# Available engine modules by name. "auto" picks the fastest one that is installed.
+ENGINES = {"python": kernel}
+if numpy_engine is not None:
+    ENGINES["numpy"] = numpy_engine
+    ENGINES["fixed"] = fixed_engine
+
+# True if scale_factor is a power of 2 the scaler can handle.
+def valid_scale_factor(scale_factor):
+    return scale_factor > 1 and (scale_factor & (scale_factor - 1)) == 0
+
+# Resolves an engine name ("auto", "python", "numpy" or "fixed") to the name of an installed engine.
+def engine_name(name="auto"):
+    if name in (None, "auto"):
+        return "numpy" if "numpy" in ENGINES else "python"
+    if name not in ENGINES:
+        raise ValueError("unknown or unavailable engine: %s (available: %s)" %
+                         (name, ", ".join(sorted(ENGINES))))
+    return name
+
+# Resolves an engine name ("auto", "python", "numpy" or "fixed") to its module.
+def get_engine(name="auto"):
+    return ENGINES[engine_name(name)]
+
+# Bytes of pixel buffers that scale() holds at its peak for the same arguments. See cascade.py.
+def peak_memory(width, height, scale_factor=2, engine="auto", workers=1):
+    pixel_bytes = get_engine(engine).PIXEL_BYTES if workers == 1 else SHARED_PIXEL_BYTES
+    return cascade_memory(width, height, scale_factor, pixel_bytes)
+
+def no_progress(step, steps, pass_number, fraction):
+    pass
+
+# Scales a flat RGBA (or RGB, if rgba is False) byte buffer of width * height pixels
+# by scale_factor, which must be a power of 2. Factors above 2 repeat the 2x scaler.
+# progress, if given, is called as progress(step, steps, pass_number, fraction) while
+# the passes run, where step counts the 2x steps from 1 to steps.
+# workers > 1 runs the passes on that many processes (0 means one per CPU); the
+# result is the same either way.
+# evaluations, if given, is a dict that receives how many neighbourhoods, luma and
+# luma difference evaluations each pass took, summed over the steps; see
+# kernel.add_evaluations() and saved_evaluations().
+# skip_transparent skips areas with an alpha of 0 like uniform ones, which changes
+# the invisible colour under them and may change the pixels along their edges
+# slightly (see kernel.py).
+# cache, if given, is a cache.ResultCache: a result found there is returned without
+# running any pass, and a new one is stored in it.
+# profile, if given, is a profile.Profile that records how long every stage of the
+# scale took: the cache lookup and store, the conversions to and from packed
+# pixels, the allocation of the buffers and every pass.
+# Returns the scaled image as RGBA bytes of size (width * scale_factor) * (height * scale_factor) * 4.
+def scale(pixels, width, height, scale_factor=2, rgba=True, engine="auto", progress=None, workers=1,
+          evaluations=None, skip_transparent=False, cache=None, profile=None):
+    if not valid_scale_factor(scale_factor):
+        raise ValueError("scale factor not a power of 2: %r" % (scale_factor,))
+    if len(pixels) != width * height * (4 if rgba else 3):
+        raise ValueError("pixel buffer does not match a %dx%d %s image" %
+                         (width, height, "RGBA" if rgba else "RGB"))
+
+    engine = engine_name(engine)
+    final = width * height * scale_factor * scale_factor
+    if cache is not None:
+        start = stage_start(profile)
+        key = cache_key(pixels, width, height, rgba, scale_factor, skip_transparent)
+        scaled = cache.get(key)
+        stage_end(profile, start, "cache get", 0 if scaled is None else final, 0 if scaled is None else len(scaled))
+        if scaled is not None:
+            return scaled
+
+    if workers != 1:
+        scaled = superxbr_parallel(pixels if rgba else rgb_to_rgba(pixels), width, height, scale_factor,
+                                   progress or no_progress, workers, engine, evaluations, skip_transparent,
+                                   profile)
+    else:
+        module = ENGINES[engine]
+        start = stage_start(profile)
+        original_pixel_data = module.pixels_from_bytes(pixels, rgba)
+        stage_end(profile, start, "to pixels", width * height, width * height * module.PIXEL_BYTES)
+        output_data = run_cascade(module, original_pixel_data, width, height, scale_factor,
+                                  progress or no_progress, evaluations, skip_transparent, profile)
+        start = stage_start(profile)
+        scaled = module.pixels_to_bytes(output_data, 0, final)
+        stage_end(profile, start, "to bytes", final, len(scaled))
+
+    if cache is not None:
+        start = stage_start(profile)
+        cache.put(key, scaled)
+        stage_end(profile, start, "cache put", final, len(scaled))
+    return scaled
@@ -0,0 +1,150 @@
+# Fixed point engine: the passes of the NumPy engine (numpy_engine.py) in integer
+# arithmetic. Importing this module raises ImportError without NumPy.
+#
+# The luma coefficients have four decimals and the blend weights six, so scaled by
+# LUMA_SCALE and WEIGHT_SCALE they are exact integers, and so is everything computed
+# from them: luma planes, their differences and the edge detection fit in int32,
+# and a channel blend is a weighted sum of two integer channel sums, rounded up by
+# integer division. The planes take half the memory of float64 ones and there is
+# no float rounding to reproduce, yet the output is bit for bit that of the loops:
+#
+# - The float edge detection differs from the exact value by far less than one unit
+#   of the integer one, so both have the same sign unless the integer edge is 0.
+#   Then the float one, rounding noise, may fall on either side of 0; where the two
+#   blends differ, the edge of these neighbourhoods is computed in float.
+# - A blend is an integer only when both channel sums are the same (see
+#   fixed_blend_weights()); the float blend is then off by a rounding error that
+#   ceil() may or may not round up. Which one it does for every such sum is looked
+#   up in a table computed with the float weights.
+# - The anti-ringing clamp bounds are integers, so clamping commutes with ceil().
+
+import math
+
+import numpy
+
+from .kernel import LUMA_R, LUMA_G, LUMA_B, w1, w2, w3, w4, run_passes
+from .numpy_engine import PIXEL_BYTES, PIXEL_TYPE, allocate, numpy_channels, numpy_pass1, numpy_pass2, \
+    numpy_pass3, pass2_border, pixel_view, pixels_from_bytes, pixels_to_bytes
+from .numpy_engine import pass1_rows as numpy_pass1_rows
+from .numpy_engine import pass2_interior as numpy_pass2_interior
+from .numpy_engine import pass3_tile as numpy_pass3_tile
+
+LUMA_SCALE = 10000
+WEIGHT_SCALE = 1000000
+
+# Luma coefficients scaled to integers.
+FIXED_LUMA = [int(round(coefficient * LUMA_SCALE)) for coefficient in (LUMA_R, LUMA_G, LUMA_B)]
+
+# Largest sum of two channels.
+MAX_SUM = 2 * 255
+
+# The blend of two channel sums, ends and centre, for the float weights (wa, wb) of
+# blend_pixel(), as (integer weight of ends, table of the rest by centre): the
+# integer weight of centre times it, plus what rounds the sum up in the division by
+# WEIGHT_SCALE. With the weights of the algorithm wa + wb is 0.5, so the scaled
+# blend is 500000 * centre + wa * (ends - centre); wa, scaled, is not a multiple of
+# 5, so this is a multiple of WEIGHT_SCALE only if 5 ** 6 divides ends - centre,
+# which for sums up to MAX_SUM means they are equal. Adding 1 to a blend only
+# changes its ceiling if it is such a multiple; the table adds it where the float
+# blend of two equal sums rounds up to the next integer.
+def fixed_blend_weights(wa, wb):
+    weight_a = int(round(wa * WEIGHT_SCALE))
+    weight_b = int(round(wb * WEIGHT_SCALE))
+    rest = [weight_b * s + WEIGHT_SCALE - 1 for s in range(MAX_SUM + 1)]
+    for s in range(MAX_SUM + 1):
+        blend = weight_a * s + weight_b * s
+        if blend % WEIGHT_SCALE == 0 and math.ceil(wa * s + wb * s) > blend // WEIGHT_SCALE:
+            rest[s] += 1
+    return weight_a, numpy.array(rest, dtype=numpy.int32)
+
+FIXED_WEIGHTS = dict(((wa, wb), fixed_blend_weights(wa, wb)) for wa, wb in ((w1, w2), (w3, w4)))
+
+# Luma of an array of packed pixels, scaled by LUMA_SCALE, as int32.
+def fixed_luma(pixels):
+    # the bytes of a packed pixel are its channels, see pixels.py
+    pixel_bytes = numpy.ascontiguousarray(pixels).view(numpy.uint8).reshape(pixels.shape + (4,))
+    # the products of the uint8 channels would not be int32 by themselves
+    luma = numpy.multiply(pixel_bytes[..., 0], FIXED_LUMA[0], dtype=numpy.int32)
+    luma += numpy.multiply(pixel_bytes[..., 1], FIXED_LUMA[1], dtype=numpy.int32)
+    luma += numpy.multiply(pixel_bytes[..., 2], FIXED_LUMA[2], dtype=numpy.int32)
+    return luma
+
+# ceil(wa * ends + wb * centre) of blend_pixel() for int32 arrays of channel sums,
+# given the fixed_blend_weights() of wa and wb.
+def fixed_ceil(ends, centre, weights):
+    weight_a, rest = weights
+    return (weight_a * ends + rest.take(centre)) // WEIGHT_SCALE
+
+# numpy_blend() for the integer edge detection of fixed_luma() planes: the same
+# arguments and results, with integer bounds.
+def fixed_blend(cells, d_edge, wa, wb, bounds=None, exact_edge=None):
+    weights = FIXED_WEIGHTS[(wa, wb)]
+    channels = numpy_channels(cells, numpy.int32)
+
+    if bounds is None:
+        # cells 5, 6, 9 and 10
+        centre = channels[:, 2:6]
+        bounds = (centre.min(axis=1), centre.max(axis=1))
+
+    # cells 3 and 12 plus 6 and 9, or 0 and 15 plus 5 and 10
+    first = fixed_ceil(channels[:, 1] + channels[:, 6], channels[:, 3] + channels[:, 4], weights)
+    first = numpy.maximum(numpy.minimum(first, bounds[1]), bounds[0])
+    second = fixed_ceil(channels[:, 0] + channels[:, 7], channels[:, 2] + channels[:, 5], weights)
+    second = numpy.maximum(numpy.minimum(second, bounds[1]), bounds[0])
+    blend = numpy.where(d_edge <= 0, first, second)
+
+    # where the edge is 0 and the blends differ, the float edge decides
+    undecided = (d_edge == 0) & (first != second).any(axis=0)
+    if undecided.any():
+        blend[:, undecided] = numpy.where(exact_edge(undecided) > 0, second[:, undecided], first[:, undecided])
+
+    packed = numpy.empty(d_edge.shape + (4,), dtype=numpy.uint8)
+    for c in range(4):
+        packed[..., c] = blend[c]
+    return packed.view(PIXEL_TYPE).reshape(d_edge.shape), bounds
+
+# The arithmetic of this engine, see numpy_engine.ARITHMETIC.
+FIXED_ARITHMETIC = (fixed_luma, fixed_blend)
+
+# The pass range functions of numpy_engine.py in fixed point, see there.
+def pass1_rows(original_pixel_data, original_width, original_height, output_data, y0, y1,
+               skip_transparent=False):
+    return numpy_pass1_rows(original_pixel_data, original_width, original_height, output_data, y0, y1,
+                            skip_transparent, FIXED_ARITHMETIC)
+
+def pass2_interior(output_data, out_width, out_height, y0, y1, skip_transparent=False):
+    return numpy_pass2_interior(output_data, out_width, out_height, y0, y1, skip_transparent, FIXED_ARITHMETIC)
+
+def pass3_tile(output_data, out_width, out_height, ry0, ry1, t0, t1, skip_transparent=False):
+    return numpy_pass3_tile(output_data, out_width, out_height, ry0, ry1, t0, t1, skip_transparent,
+                            FIXED_ARITHMETIC)
+
+# The passes of kernel.superxbr_loops() with the same arguments and results, see
+# kernel.PASSES. The blocks near the border of the second pass run through the
+# scalar float code, as in the NumPy engine.
+def fixed_pass1(original_pixel_data, original_width, original_height, output_data, progress,
+                evaluations=None, skip_transparent=False):
+    numpy_pass1(original_pixel_data, original_width, original_height, output_data, progress, evaluations,
+                skip_transparent, FIXED_ARITHMETIC)
+
+def fixed_pass2(original_pixel_data, original_width, original_height, output_data, progress,
+                evaluations=None, skip_transparent=False):
+    numpy_pass2(original_pixel_data, original_width, original_height, output_data, progress, evaluations,
+                skip_transparent, FIXED_ARITHMETIC)
+
+def fixed_pass3(original_pixel_data, original_width, original_height, output_data, progress,
+                evaluations=None, skip_transparent=False):
+    numpy_pass3(original_pixel_data, original_width, original_height, output_data, progress, evaluations,
+                skip_transparent, FIXED_ARITHMETIC)
+
+PASSES = (fixed_pass1, fixed_pass2, fixed_pass3)
+
+# Scales the packed original pixels by 2 into output_data, like
+# numpy_engine.superxbr_numpy(), with the same results.
+def superxbr_fixed(original_pixel_data, original_width, original_height, output_data, progress,
+                   evaluations=None, skip_transparent=False, profile=None):
+    return run_passes(PASSES, original_pixel_data, original_width, original_height, output_data, progress,
+                      evaluations, skip_transparent, profile)
+
+# The engine's 2x scaler, as called by the cascade in cascade.py.
+scale2x = superxbr_fixed
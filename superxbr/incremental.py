@@ -0,0 +1,533 @@
+# Incremental scaler: keeps what a scaled image was made from, so that after an edit
+# of a few pixels only the output pixels the edit can reach are computed again.
+#
+# An IncrementalScale holds the source pixels, the output of every 2x step of the
+# cascade, and the pixels the second pass wrote along the image border (see below).
+# update() finds rectangles around the source pixels that changed, and recomputes
+# every step for each of them:
+#
+# - first pass: a block samples one source pixel above and left of it and two below
+#   and right, so a changed pixel only reaches the blocks a couple of pixels around.
+# - second pass: blocks away from the border sample first pass pixels only, four
+#   pixels around them at most. Blocks near the border also sample pixels written by
+#   other border blocks before them (see kernel.pass2_is_border()), so a change can
+#   travel down the left and right edges and along the top and bottom rows. The
+#   rows are computed until the edge pixels are the ones held from before, and the
+#   changed columns grow by those that changed along the border.
+# - third pass: a pixel samples the rows two above it to one below, reading the
+#   final pixels of the row below and the pixels to its right, so a change can
+#   travel up and to the left. It is computed in bands of whole rows, from the
+#   wavefront before the changed columns until the wavefronts are as before, and
+#   band by band upwards until the top row of a band is.
+#
+# The second pass needs whole rows, but it is cheap; the third pass, which is not,
+# only computes the pixels around the changed columns. Each part stops where the
+# pixels are the same as in the full computation, so the result is identical to
+# superxbr.scale() for the new source. The output pixels a step changed are the
+# changed source pixels of the next one. Changed rows far enough apart are updated
+# as separate rectangles.
+
+import hashlib
+
+from .cascade import cascade_steps, step_progress
+from .core import get_engine, no_progress, valid_scale_factor
+from .kernel import ALGORITHM_VERSION, PASS2_BORDER, pass3_wavefronts
+from .profile import PASS_STAGES, stage_end, stage_start
+from .progress import report_passes
+from .stream import BAND_ROWS, store_rows
+
+# Pixels the second pass may write at each end of a row outside the blocks away from
+# the border: the edge pixels an IncrementalScale holds for every output row.
+EDGE_PIXELS = PASS2_BORDER
+
+# Changed source rows at most this many rows apart are updated as one group.
+GROUP_GAP = 16
+
+# Output rows the third pass climbs up at a time while its changes travel upwards.
+CLIMB_ROWS = 16
+
+# The first pass for output rows p0 to bottom of a 2x step from source, into a new
+# window buffer whose first row is output row top (even). The rows above p0 stay
+# empty; unless top is 0, p0 must leave 2 rows below top, since the first pass
+# samples one source row above a block.
+def pass1_window(module, source, width, height, top, p0, bottom, skip_transparent):
+    s0 = top // 2
+    s1 = min(height, bottom // 2 + 2)
+    original_pixel_data = module.allocate((s1 - s0) * width)
+    original_pixel_data[0:(s1 - s0) * width] = source[s0 * width:s1 * width]
+    window = module.allocate((s1 - s0) * width * 4)
+    module.pass1_rows(original_pixel_data, width, s1 - s0, window, p0 - top, bottom - top, skip_transparent)
+    return window
+
+# Copies the edge pixels of output rows y0 to y1 from a window whose first row is
+# output row top into edges, which holds 2 * EDGE_PIXELS pixels per row. Rows
+# narrower than that fill their part of edges from the start.
+def store_edges(window, out_width, top, edges, y0, y1):
+    count = min(EDGE_PIXELS, out_width)
+    for y in range(y0, y1):
+        row = (y - top) * out_width
+        edge = y * 2 * EDGE_PIXELS
+        edges[edge:edge + count] = window[row:row + count]
+        edges[edge + EDGE_PIXELS:edge + EDGE_PIXELS + count] = window[row + out_width - count:row + out_width]
+
+# The reverse of store_edges().
+def load_edges(window, out_width, top, edges, y0, y1):
+    count = min(EDGE_PIXELS, out_width)
+    for y in range(y0, y1):
+        row = (y - top) * out_width
+        edge = y * 2 * EDGE_PIXELS
+        window[row:row + count] = edges[edge:edge + count]
+        window[row + out_width - count:row + out_width] = edges[edge + EDGE_PIXELS:edge + EDGE_PIXELS + count]
+
+# True if count pixels of a from a_start on are the same as those of b from b_start on.
+def same_pixels(module, a, a_start, b, b_start, count):
+    return module.pixels_to_bytes(a, a_start, count) == module.pixels_to_bytes(b, b_start, count)
+
+# Index of the first of count pixels that differ between a and b from a_start and
+# b_start on, by bisection, or count if none do.
+def first_difference(module, a, a_start, b, b_start, count):
+    low = 0
+    high = count
+    while low < high:
+        middle = (low + high) // 2
+        if same_pixels(module, a, a_start + low, b, b_start + low, middle + 1 - low):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+# Columns [x0, x1) of the pixels that differ between a row of width pixels of a
+# and one of b, or None if none do.
+def changed_columns(module, a, a_start, b, b_start, width):
+    x0 = first_difference(module, a, a_start, b, b_start, width)
+    if x0 == width:
+        return None
+    x1 = width
+    while same_pixels(module, a, a_start + x1 - 1, b, b_start + x1 - 1, 1):
+        x1 -= 1
+    return x0, x1
+
+# Grows a rectangle (y0, y1, x0, x1), or None, to cover another one.
+def cover(rectangle, other):
+    if rectangle is None:
+        return other
+    return (min(rectangle[0], other[0]), max(rectangle[1], other[1]),
+            min(rectangle[2], other[2]), max(rectangle[3], other[3]))
+
+# Rectangles (y0, y1, x0, x1) covering the pixels that differ between two images
+# of the same size, one per group of changed rows less than GROUP_GAP rows apart.
+def changed_rectangles(module, old, new, width, height):
+    rectangles = []
+    for y in range(height):
+        columns = changed_columns(module, old, y * width, new, y * width, width)
+        if columns is None:
+            continue
+        if rectangles and y - rectangles[-1][1] < GROUP_GAP:
+            rectangles[-1] = cover(rectangles[-1], (y, y + 1) + columns)
+        else:
+            rectangles.append((y, y + 1) + columns)
+    return rectangles
+
+# One 2x step of an IncrementalScale: its output, and the edge pixels and border
+# rows of the output after the second pass.
+class ScaleStep(object):
+
+    def __init__(self, module, width, height):
+        self.module = module
+        self.width = width
+        self.height = height
+        self.output = module.allocate(width * height * 4)
+        self.edges = module.allocate(height * 2 * 2 * EDGE_PIXELS)
+        self.border_rows = module.allocate(2 * PASS2_BORDER * width * 2)
+
+    # Output rows along the top and bottom border, whose blocks sample each other
+    # along the rows.
+    def border_row_range(self):
+        out_height = self.height * 2
+        return [y for y in range(out_height) if y < PASS2_BORDER or y >= out_height - PASS2_BORDER]
+
+    # Compares the border rows of output rows y0 to y1 in a window whose first row is
+    # output row top with the ones held, and stores them. Returns the columns
+    # (x0, x1) that changed, or None.
+    def update_border_rows(self, window, top, y0, y1):
+        out_width = self.width * 2
+        changed = None
+        for i, y in enumerate(self.border_row_range()):
+            if y0 <= y < y1:
+                columns = changed_columns(self.module, window, (y - top) * out_width, self.border_rows,
+                                          i * out_width, out_width)
+                if columns is not None:
+                    changed = (min(changed[0], columns[0]), max(changed[1], columns[1])) if changed else columns
+                self.border_rows[i * out_width:(i + 1) * out_width] = \
+                    window[(y - top) * out_width:(y - top + 1) * out_width]
+        return changed
+
+    # The buffers of the step, in the order to_bytes() stores them.
+    def buffers(self):
+        return [self.output, self.edges, self.border_rows]
+
+    # Runs the whole step from source through the passes of the engine (see
+    # kernel.PASSES), which call progress(pass_number, fraction) after every band of
+    # rows, and keeps the edge pixels and border rows after the second pass. profile,
+    # if given, records every pass, see profile.py.
+    def run(self, source, skip_transparent, progress, profile=None):
+        out_width = self.width * 2
+        out_height = self.height * 2
+        for pass_number, run_pass in enumerate(self.module.PASSES, 1):
+            start = stage_start(profile)
+            run_pass(source, self.width, self.height, self.output, progress, None, skip_transparent)
+            if pass_number == 2:
+                store_edges(self.output, out_width, 0, self.edges, 0, out_height)
+                self.update_border_rows(self.output, 0, 0, out_height)
+            stage_end(profile, start, PASS_STAGES[pass_number], out_width * out_height)
+
+    # The output rows y0 to z (both even) after the second pass, computed from source,
+    # in a new window buffer. Returns (window, output row of its first row), where the
+    # window holds the rows from four above y0 on, as far as there are any.
+    # Rows above y0 get the edge pixels held from before, so they must not have
+    # changed. y0 is 0 or at least 12, so that the rows above it are all away from
+    # the top border.
+    def pass2_window(self, source, y0, z, skip_transparent):
+        module = self.module
+        out_width = self.width * 2
+        out_height = self.height * 2
+        top = y0 - 10 if y0 else 0
+        bottom = min(out_height, z + 6)
+        window = pass1_window(module, source, self.width, self.height, top, top + 2 if top else 0, bottom,
+                              skip_transparent)
+        rows = bottom - top
+        if y0:
+            module.pass2_interior(window, out_width, rows, y0 - 4 - top, y0 - top, skip_transparent)
+            load_edges(window, out_width, top, self.edges, y0 - 4, y0)
+        module.pass2_interior(window, out_width, rows, y0 - top, z - top, skip_transparent)
+        module.pass2_border(window, out_width, rows, y0 - top, z - top, skip_transparent)
+        return window, top
+
+    # Runs the third pass on output rows y0 to y1 from the second pass rows in window
+    # (first row top), and the final row below y1 in the output, for inputs that
+    # changed in columns x0 to x1 only. Writes the pixels it computed to the output.
+    # Returns the rectangle (y0, y1, x0, x1) of the pixels that changed and the
+    # columns (x0, x1) that changed in row y0, each None if there are none.
+    #
+    # Pixels two or more columns right of the changed ones, and more the further up
+    # the band they are, keep their value; since the third pass reaches two columns
+    # further right per row up and its wavefronts three, every wavefront before the
+    # first one holding a pixel less than two columns right of them does. Towards the
+    # left, a change can travel along the rows, so wavefronts are computed until the
+    # last four of them are as before and all that follow sample unchanged pixels only.
+    def pass3_band(self, window, top, y0, y1, x0, x1, skip_transparent):
+        module = self.module
+        out_width = self.width * 2
+        out_height = self.height * 2
+        band_top = max(0, y0 - 2)
+        band_bottom = min(out_height, y1 + 1)
+        rows = band_bottom - band_top
+        wavefronts = pass3_wavefronts(out_width, rows)
+        # reversed rows of the band, in the band
+        ry0 = band_bottom - y1
+        ry1 = band_bottom - y0
+        t0 = max(0, 3 * ry0 + out_width - 2 - x1)
+        t1 = min(wavefronts, 3 * (ry1 - 1) + out_width - x0 + 1)
+
+        band = module.allocate(rows * out_width)
+        band[0:(y1 - band_top) * out_width] = window[(band_top - top) * out_width:(y1 - top) * out_width]
+        band[(y1 - band_top) * out_width:rows * out_width] = self.output[y1 * out_width:band_bottom * out_width]
+
+        # columns [start, end) of the pixels of band row y on wavefronts t to u
+        def span(y, t, u):
+            reverse_y = band_bottom - 1 - y
+            return (max(0, out_width - (u - 3 * reverse_y)), min(out_width, out_width - (t - 3 * reverse_y)))
+
+        # the pixels on wavefronts before t0 have their final values
+        for y in range(y0, y1):
+            start, end = span(y, 0, t0)
+            band[(y - band_top) * out_width + start:(y - band_top) * out_width + end] = \
+                self.output[y * out_width + start:y * out_width + end]
+
+        t = t0
+        while True:
+            module.pass3_tile(band, out_width, rows, ry0, ry1, t, t1, skip_transparent)
+            if t1 == wavefronts:
+                break
+            converged = True
+            for y in range(y0, y1):
+                start, end = span(y, t1 - 4, t1)
+                if start < end and not same_pixels(module, band, (y - band_top) * out_width + start,
+                                                   self.output, y * out_width + start, end - start):
+                    converged = False
+                    break
+            if converged:
+                break
+            t = t1
+            t1 = min(wavefronts, t1 + max(CLIMB_ROWS, t1 - t0))
+
+        changed = None
+        top_columns = None
+        for y in range(y0, y1):
+            start, end = span(y, t0, t1)
+            if start >= end:
+                continue
+            band_row = (y - band_top) * out_width
+            columns = changed_columns(module, band, band_row + start, self.output, y * out_width + start,
+                                      end - start)
+            if columns is not None:
+                changed = cover(changed, (y, y + 1, start + columns[0], start + columns[1]))
+                if y == y0:
+                    top_columns = (start + columns[0], start + columns[1])
+            self.output[y * out_width + start:y * out_width + end] = band[band_row + start:band_row + end]
+        return changed, top_columns
+
+    # Updates the step for a source whose pixels changed within the rectangle
+    # (r0, r1, c0, c1) only. Returns the rectangle of the output pixels that changed,
+    # or None. progress is called as progress(pass_number, fraction) after every
+    # window of rows, with the fraction of the rows the pass has got to, as in the
+    # streaming scaler (see stream.py).
+    def update(self, source, changed, skip_transparent, progress):
+        r0, r1, c0, c1 = changed
+        out_width = self.width * 2
+        out_height = self.height * 2
+
+        # first pass blocks sampling the changed pixels, and the second pass blocks
+        # sampling those
+        y0 = max(0, 2 * (r0 - 2) - 4)
+        z = min(out_height, 2 * (r1 + 2) + 10)
+        if y0 < 12:
+            y0 = 0
+        x0 = max(0, 2 * (c0 - 2) - 4)
+        x1 = min(out_width, 2 * (c1 + 2) + 4)
+
+        # second pass, until the edges below z are as before
+        while True:
+            if z > out_height - 8:
+                z = out_height
+            window, top = self.pass2_window(source, y0, z, skip_transparent)
+            edges = self.module.allocate(out_height * 2 * EDGE_PIXELS)
+            store_edges(window, out_width, top, edges, y0, z)
+            report_passes(progress, (1, 2), float(z)/out_height)
+            start = max(y0, z - 6) * 2 * EDGE_PIXELS
+            if z == out_height or same_pixels(self.module, edges, start, self.edges, start,
+                                              z * 2 * EDGE_PIXELS - start):
+                break
+            z = min(out_height, z + max(CLIMB_ROWS, z - y0))
+
+        # changes to the edge pixels, and to the rows along the top and bottom border,
+        # which sample each other from left to right, widen the changed columns
+        for y in range(y0, z):
+            left = y * 2 * EDGE_PIXELS
+            if not same_pixels(self.module, edges, left, self.edges, left, EDGE_PIXELS):
+                x0 = 0
+            if not same_pixels(self.module, edges, left + EDGE_PIXELS, self.edges, left + EDGE_PIXELS, EDGE_PIXELS):
+                x1 = out_width
+        columns = self.update_border_rows(window, top, y0, z)
+        if columns is not None:
+            x0 = min(x0, columns[0])
+            x1 = max(x1, columns[1])
+        self.edges[y0 * 2 * EDGE_PIXELS:z * 2 * EDGE_PIXELS] = edges[y0 * 2 * EDGE_PIXELS:z * 2 * EDGE_PIXELS]
+
+        # third pass, until its top row is as before
+        changed, top_columns = self.pass3_band(window, top, y0, z, x0, x1, skip_transparent)
+        progress(3, float(out_height - y0)/out_height)
+        band_bottom = y0
+        while band_bottom > 0 and top_columns is not None:
+            band_top = band_bottom - CLIMB_ROWS
+            if band_top - 2 < 12:
+                band_top = 0
+            window, top = self.pass2_window(source, max(0, band_top - 2), band_bottom, skip_transparent)
+            # only the row below the band changed
+            band_changed, top_columns = self.pass3_band(window, top, band_top, band_bottom,
+                                                        top_columns[0], top_columns[1], skip_transparent)
+            if band_changed is not None:
+                changed = cover(changed, band_changed)
+            progress(3, float(out_height - band_top)/out_height)
+            band_bottom = band_top
+        return changed
+
+# Pixels of the buffers of a ScaleStep for a width * height source.
+def step_pixels(width, height):
+    return width * height * 4 + height * 2 * 2 * EDGE_PIXELS + 2 * PASS2_BORDER * width * 2
+
+# Bytes of pixel buffers rescale() holds at its peak for the same arguments, about
+# three times what superxbr.scale() holds (see core.peak_memory()): the source and
+# every step's buffers, the new source update() loads, and the state as bytes for
+# the cache, twice over while to_bytes() joins it. rows() holds the RGBA bytes of
+# the scaled image afterwards, which are fewer.
+def incremental_memory(width, height, scale_factor=2, engine="auto"):
+    state = width * height + sum(step_pixels(width << step, height << step)
+                                 for step in range(cascade_steps(scale_factor)))
+    return (state + width * height) * get_engine(engine).PIXEL_BYTES + 2 * 4 * state
+
+# Header of IncrementalScale.to_bytes() data: the algorithm version, width, height,
+# scale factor, RGBA flag and skip_transparent flag.
+HEADER = b"superxbr-incremental %d %d %d %d %d %d\n"
+
+# A scaled image that can be updated for changes to its source, see above. Takes
+# the same arguments as superxbr.scale() (one process only), and scales the image
+# right away, calling progress after every band of rows of every pass. The methods
+# taking a profile record their stages in it if it is given, see profile.py.
+class IncrementalScale(object):
+
+    def __init__(self, pixels, width, height, scale_factor=2, rgba=True, engine="auto", progress=None,
+                 skip_transparent=False, profile=None):
+        if not valid_scale_factor(scale_factor):
+            raise ValueError("scale factor not a power of 2: %r" % (scale_factor,))
+        self.setup(width, height, scale_factor, rgba, engine, skip_transparent)
+        self.source = self.load(pixels, profile)
+
+        progress = progress or no_progress
+        source = self.source
+        for step, scale_step in enumerate(self.steps):
+            scale_step.run(source, skip_transparent, step_progress(progress, step + 1, len(self.steps)), profile)
+            source = scale_step.output
+
+    def setup(self, width, height, scale_factor, rgba, engine, skip_transparent):
+        self.module = get_engine(engine)
+        self.width = width
+        self.height = height
+        self.scale_factor = scale_factor
+        self.rgba = rgba
+        self.skip_transparent = skip_transparent
+        self.steps = [ScaleStep(self.module, width << step, height << step)
+                      for step in range(cascade_steps(scale_factor))]
+
+    # The source pixels of the image for RGB(A) bytes, as a buffer of the engine.
+    def load(self, pixels, profile=None):
+        if len(pixels) != self.width * self.height * (4 if self.rgba else 3):
+            raise ValueError("pixel buffer does not match a %dx%d %s image" %
+                             (self.width, self.height, "RGBA" if self.rgba else "RGB"))
+        start = stage_start(profile)
+        count = self.width * self.height
+        source = self.module.allocate(count)
+        source[0:count] = self.module.pixels_from_bytes(pixels, self.rgba)
+        stage_end(profile, start, "to pixels", count, count * self.module.PIXEL_BYTES)
+        return source
+
+    # True if update() takes source pixels of this size and format and scales them
+    # this way.
+    def matches(self, width, height, scale_factor, rgba, skip_transparent):
+        return (self.width, self.height, self.scale_factor, self.rgba, self.skip_transparent) == \
+               (width, height, scale_factor, rgba, bool(skip_transparent))
+
+    # Rescales the image for new source pixels of the same size and format. Returns
+    # the rectangles (y0, y1, x0, x1) of the output pixels that changed, one for every
+    # group of changed source rows (they may overlap), or an empty list if none did;
+    # only those need to be written again (see write_rows()). progress, if given, is called as for superxbr.scale() while the steps
+    # are updated, starting over for every group of changed rows; raising from it
+    # (see progress.py) stops the update, and leaves the image to be discarded.
+    def update(self, pixels, progress=None, profile=None):
+        progress = progress or no_progress
+        new = self.load(pixels, profile)
+        start = stage_start(profile)
+        changed = []
+        for r0, r1, c0, c1 in changed_rectangles(self.module, self.source, new, self.width, self.height):
+            self.source[r0 * self.width:r1 * self.width] = new[r0 * self.width:r1 * self.width]
+            rectangle = (r0, r1, c0, c1)
+            source = self.source
+            for step, scale_step in enumerate(self.steps):
+                rectangle = scale_step.update(source, rectangle, self.skip_transparent,
+                                              step_progress(progress, step + 1, len(self.steps)))
+                if rectangle is None:
+                    break
+                source = scale_step.output
+            if rectangle is not None:
+                changed.append(rectangle)
+        # the pixels the update covers are the ones that changed in the end
+        stage_end(profile, start, "incremental update",
+                  sum((y1 - y0) * (x1 - x0) for y0, y1, x0, x1 in changed))
+        return changed
+
+    # RGBA bytes of output rows y0 to y1, or of the whole scaled image.
+    def rows(self, y0=0, y1=None, profile=None):
+        out_width = self.width * self.scale_factor
+        if y1 is None:
+            y1 = self.height * self.scale_factor
+        start = stage_start(profile)
+        data = self.module.pixels_to_bytes(self.steps[-1].output, y0 * out_width, (y1 - y0) * out_width)
+        stage_end(profile, start, "to bytes", (y1 - y0) * out_width, len(data))
+        return data
+
+    # Writes the output rows the rectangles (y0, y1, x0, x1) cover, as update() returns
+    # them, or every row without rectangles, to a row store (see stream.py) that
+    # holds the image from before the update, band_rows rows at a time.
+    def write_rows(self, destination, rectangles=None, band_rows=BAND_ROWS, profile=None):
+        out_width = self.width * self.scale_factor
+        if rectangles is None:
+            rectangles = [(0, self.height * self.scale_factor, 0, out_width)]
+        # the rows the rectangles cover, overlapping ones merged
+        spans = []
+        for y0, y1, _, _ in sorted(rectangles):
+            if spans and y0 <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], y1)
+            else:
+                spans.append([y0, y1])
+        for y0, y1 in spans:
+            for band_top in range(y0, y1, band_rows):
+                store_rows(self.module, destination, band_top, self.steps[-1].output, band_top * out_width,
+                           (min(y1, band_top + band_rows) - band_top) * out_width, profile)
+
+    # Everything the image holds, as bytes for from_bytes().
+    def to_bytes(self):
+        header = HEADER % (ALGORITHM_VERSION, self.width, self.height, self.scale_factor, self.rgba,
+                           self.skip_transparent)
+        buffers = [self.source] + [buffer for scale_step in self.steps for buffer in scale_step.buffers()]
+        return header + b"".join(self.module.pixels_to_bytes(buffer, 0, len(buffer)) for buffer in buffers)
+
+    # An IncrementalScale from to_bytes() data, with the given engine. Raises
+    # ValueError for data that is damaged or from another version of the algorithm.
+    @classmethod
+    def from_bytes(cls, data, engine="auto"):
+        end = data.find(b"\n") + 1
+        fields = data[:end].split()
+        if len(fields) != 7 or fields[0] != HEADER.split()[0] or int(fields[1]) != ALGORITHM_VERSION:
+            raise ValueError("not incremental scaling data of this version")
+        width, height, scale_factor, rgba, skip_transparent = [int(field) for field in fields[2:]]
+        image = cls.__new__(cls)
+        image.setup(width, height, scale_factor, bool(rgba), engine, bool(skip_transparent))
+        image.source = image.module.allocate(width * height)
+
+        buffers = [image.source] + [buffer for scale_step in image.steps for buffer in scale_step.buffers()]
+        if len(data) - end != 4 * sum(len(buffer) for buffer in buffers):
+            raise ValueError("incremental scaling data of the wrong size")
+        for buffer in buffers:
+            buffer[0:len(buffer)] = image.module.pixels_from_bytes(data[end:end + 4 * len(buffer)], True)
+            end += 4 * len(buffer)
+        return image
+
+# Cache key of the incremental scaling state kept for an image called name (a file
+# name, say) at a scale factor.
+def incremental_key(name, scale_factor, rgba, skip_transparent):
+    return hashlib.sha256(("incremental|%d|%s|%dx|%s|%d" % (ALGORITHM_VERSION, name, scale_factor,
+                                                            "RGBA" if rgba else "RGB",
+                                                            bool(skip_transparent))).encode("utf-8")).hexdigest()
+
+# Scales the image called name with the incremental scaling state a cache.ResultCache
+# keeps for it: updated for the new pixels if there is one for the same size and
+# options, else made from scratch. Stores the new state in the cache, and returns
+# (image, changed): the IncrementalScale, and the rectangles of the output pixels the
+# update changed (see IncrementalScale.update()), or None if the image was made from
+# scratch. profile, if given, records every stage, with loading and
+# storing the state as "state get" and "state put".
+def rescale(cache, name, pixels, width, height, scale_factor=2, rgba=True, engine="auto", progress=None,
+            skip_transparent=False, profile=None):
+    key = incremental_key(name, scale_factor, rgba, skip_transparent)
+    image = None
+    start = stage_start(profile)
+    data = cache.get(key)
+    if data is not None:
+        try:
+            image = IncrementalScale.from_bytes(data, engine)
+        except ValueError:
+            pass
+    stage_end(profile, start, "state get", 0, 0 if data is None else len(data))
+    # not to be held while the new state is made, see incremental_memory()
+    data = None
+    changed = None
+    if image is not None and image.matches(width, height, scale_factor, rgba, skip_transparent):
+        changed = image.update(pixels, progress, profile)
+    else:
+        image = IncrementalScale(pixels, width, height, scale_factor, rgba, engine, progress, skip_transparent,
+                                 profile)
+    start = stage_start(profile)
+    data = image.to_bytes()
+    cache.put(key, data)
+    stage_end(profile, start, "state put", 0, len(data))
+    return image, changed
@@ -0,0 +1,685 @@
+# Super-xBR kernel: the three passes of the algorithm as plain Python loops.
+# This is the reference implementation every other engine must match exactly.
+
+from array import array
+import ctypes
+import math
+
+from .pixels import packed_array, packed_array_bytes, rgb_to_rgba
+from .profile import PASS_STAGES, stage_end, stage_start
+
+# The below code is an adaptation of Hyllian's C++ code
+# from https://pastebin.com/cbH8ZQQT.
+
+# ******* Super xBR Scaler *******
+# Copyright (c) 2016 Hyllian - sergiogdb@gmail.com
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+# Absolute difference. Used for edge detection.
+def abs_diff(val1, val2):
+    return abs(val1 - val2)
+
+# Clamps x to a value between floor and ceiling.
+def clamp(x, floor, ceiling):
+    return max(min(x, ceiling), floor)
+
+# Easy way to return an empty 4D matrix list.
+def matrix_4D():
+    return [[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]]
+
+# Pixel matrices for a given subpixel A.
+#                          P1
+# |P0|B |C |P1|         C     F4          |a0|b1|c2|d3|
+# |D |E |F |F4|      B     F     I4       |b0|c1|d2|e3|   |e1|i1|i2|e2|
+# |G |H |I |I4|   P0    E  A  I     P3    |c0|d1|e2|f3|   |e3|i3|i4|e4|
+# |P2|H5|I5|P3|      D     H     I5       |d0|e1|f2|g3|
+#                       G     H5
+#                          P2
+#
+# sx, sy  
+# -1  -1 | -2  0   (x+y) (x-y)    -3  1  (x+y-1)  (x-y+1)
+# -1   0 | -1 -1                  -2  0
+# -1   1 |  0 -2                  -1 -1
+# -1   2 |  1 -3                   0 -2
+#
+#  0  -1 | -1  1   (x+y) (x-y)      ...     ...     ...
+#  0   0 |  0  0
+#  0   1 |  1 -1
+#  0   2 |  2 -2
+#
+#  1  -1 |  0  2   ...
+#  1   0 |  1  1
+#  1   1 |  2  0
+#  1   2 |  3 -1
+#
+#  2  -1 |  1  3   ...
+#  2   0 |  2  2
+#  2   1 |  3  1
+#  2   2 |  4  0
+
+# Calculates diagonal edge value from pixel matrix (mat) and pixel weightings (wp)
+def diagonal_edge(mat, wp):
+    diagonal_weight1 = wp[0] * (abs_diff(mat[0][2], mat[1][1]) + abs_diff(mat[1][1], mat[2][0]) + \
+    abs_diff(mat[1][3], mat[2][2]) + abs_diff(mat[2][2], mat[3][1])) + \
+    wp[1] * (abs_diff(mat[0][3], mat[1][2]) + abs_diff(mat[2][1], mat[3][0])) + \
+    wp[2] * (abs_diff(mat[0][3], mat[2][1]) + abs_diff(mat[1][2], mat[3][0])) + \
+    wp[3] * (abs_diff(mat[1][2], mat[2][1])) + \
+    wp[4] * (abs_diff(mat[0][2], mat[2][0]) + abs_diff(mat[1][3], mat[3][1])) + \
+    wp[5] * (abs_diff(mat[0][1], mat[1][0]) + abs_diff(mat[2][3], mat[3][2]))
+
+    diagonal_weight2 = wp[0] * (abs_diff(mat[0][1], mat[1][2]) + abs_diff(mat[1][2], mat[2][3]) + \
+    abs_diff(mat[1][0], mat[2][1]) + abs_diff(mat[2][1], mat[3][2])) + \
+    wp[1] * (abs_diff(mat[0][0], mat[1][1]) + abs_diff(mat[2][2], mat[3][3])) + \
+    wp[2] * (abs_diff(mat[0][0], mat[2][2]) + abs_diff(mat[1][1], mat[3][3])) + \
+    wp[3] * (abs_diff(mat[1][1], mat[2][2])) + \
+    wp[4] * (abs_diff(mat[1][0], mat[3][2]) + abs_diff(mat[0][1], mat[2][3])) + \
+    wp[5] * (abs_diff(mat[0][2], mat[1][3]) + abs_diff(mat[2][0], mat[3][1]))
+
+    return (diagonal_weight1 - diagonal_weight2)
+
+# Constants for the algorithm.
+WEIGHT1 = 0.129633
+WEIGHT2 = 0.175068
+w1 = -WEIGHT1
+w2 = WEIGHT1 + 0.500000
+w3 = -WEIGHT2
+w4 = WEIGHT2 + 0.500000
+
+# Relative luminance coefficients: https://en.wikipedia.org/wiki/Luma_(video)
+LUMA_R = 0.2126
+LUMA_G = 0.7152
+LUMA_B = 0.0722
+
+# Pixel weightings for each pass, in the order diagonal_edge() expects them.
+PASS1_WEIGHTS = [2.0, 1.0, -1.0, 4.0, -1.0, 1.0]
+PASS2_WEIGHTS = [2.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+PASS3_WEIGHTS = [2.0, 1.0, -1.0, 4.0, -1.0, 1.0]
+
+PASS_NAMES = {1: "first", 2: "second", 3: "third"}
+
+# Version of the algorithm's output. Anything that changes a single output byte for
+# the same input and options must increase it, so that cached results (see
+# cache.py) made with the old output are no longer used.
+ALGORITHM_VERSION = 1
+
+# Channel and luma planes of the pixels in rows y0 to y1 and columns x0 to x1 of a
+# buffer, for the planes argument of the per-pixel functions below: (red, green,
+# blue, alpha, luma, y0, x0, plane width), the channels as arrays of bytes. The
+# per-pixel functions take their samples from these instead of unpacking packed
+# pixels, and keep them up to date where they write.
+def pixel_planes(data, width, y0, y1, x0, x1):
+    rgba = b"".join(packed_array_bytes(array("I", data[y * width + x0:y * width + x1]), 0, x1 - x0)
+                    for y in range(y0, y1))
+    red, green, blue, alpha = [array("B", rgba[c::4]) for c in range(4)]
+    luma = array("d", [LUMA_R * r + LUMA_G * g + LUMA_B * b for r, g, b in zip(red, green, blue)])
+    return red, green, blue, alpha, luma, y0, x0, x1 - x0
+
+# Stores the channels of a new pixel at (x, y) in planes from pixel_planes(), and
+# returns the pixel packed.
+def store_channels(planes, x, y, channels):
+    red_plane, green_plane, blue_plane, alpha_plane, luma, plane_y, plane_x, plane_width = planes
+    ri, gi, bi, ai = channels
+    k = (y - plane_y) * plane_width + x - plane_x
+    red_plane[k] = ri
+    green_plane[k] = gi
+    blue_plane[k] = bi
+    alpha_plane[k] = ai
+    luma[k] = LUMA_R * ri + LUMA_G * gi + LUMA_B * bi
+    return (ai << 24) | (bi << 16) | (gi << 8) | ri
+
+# Scratch matrices for the per-pixel kernel: red, green, blue, alpha and luma.
+# Allocated once per run and refilled for every sampled neighbourhood.
+def kernel_matrices():
+    return (matrix_4D(), matrix_4D(), matrix_4D(), matrix_4D(), matrix_4D())
+
+# Min/max of the four centre samples, per channel. Used by the anti-ringing clamp.
+def sample_bounds(mats):
+    red, green, blue, alpha = mats[0], mats[1], mats[2], mats[3]
+    return (min(red[1][1], red[2][1], red[1][2], red[2][2]),
+            max(red[1][1], red[2][1], red[1][2], red[2][2]),
+            min(green[1][1], green[2][1], green[1][2], green[2][2]),
+            max(green[1][1], green[2][1], green[1][2], green[2][2]),
+            min(blue[1][1], blue[2][1], blue[1][2], blue[2][2]),
+            max(blue[1][1], blue[2][1], blue[1][2], blue[2][2]),
+            min(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2]),
+            max(alpha[1][1], alpha[2][1], alpha[1][2], alpha[2][2]))
+
+# Interpolates a new pixel from a filled set of kernel matrices.
+# wp are the pixel weightings for diagonal_edge(), wa and wb the outer and inner
+# blend weights (w1/w2 or w3/w4), and bounds the result of sample_bounds().
+# Returns the new pixel's channels as (red, green, blue, alpha).
+def blend_channels(mats, wp, wa, wb, bounds):
+    red, green, blue, alpha, Y_luma = mats
+    min_r_sample, max_r_sample, min_g_sample, max_g_sample, \
+    min_b_sample, max_b_sample, min_a_sample, max_a_sample = bounds
+
+    d_edge = diagonal_edge(Y_luma, wp)
+
+    if d_edge <= 0:
+        rf = wa * (red[0][3] + red[3][0]) + wb * (red[1][2] + red[2][1])
+        gf = wa * (green[0][3] + green[3][0]) + wb * (green[1][2] + green[2][1])
+        bf = wa * (blue[0][3] + blue[3][0]) + wb * (blue[1][2] + blue[2][1])
+        af = wa * (alpha[0][3] + alpha[3][0]) + wb * (alpha[1][2] + alpha[2][1])
+    else:
+        rf = wa * (red[0][0] + red[3][3]) + wb * (red[1][1] + red[2][2])
+        gf = wa * (green[0][0] + green[3][3]) + wb * (green[1][1] + green[2][2])
+        bf = wa * (blue[0][0] + blue[3][3]) + wb * (blue[1][1] + blue[2][2])
+        af = wa * (alpha[0][0] + alpha[3][3]) + wb * (alpha[1][1] + alpha[2][2])
+
+    # clamp to prevent ringing artifacts: https://en.wikipedia.org/wiki/Ringing_artifacts
+    rf = clamp(rf, min_r_sample, max_r_sample)
+    gf = clamp(gf, min_g_sample, max_g_sample)
+    bf = clamp(bf, min_b_sample, max_b_sample)
+    af = clamp(af, min_a_sample, max_a_sample)
+    # need to be integers so we can do bitwise operations on these variables later
+    ri = int(clamp(math.ceil(rf), 0, 255))
+    gi = int(clamp(math.ceil(gf), 0, 255))
+    bi = int(clamp(math.ceil(bf), 0, 255))
+    ai = int(clamp(math.ceil(af), 0, 255))
+    return ri, gi, bi, ai
+
+# blend_channels() as a packed RGBA integer.
+def blend_pixel(mats, wp, wa, wb, bounds):
+    ri, gi, bi, ai = blend_channels(mats, wp, wa, wb, bounds)
+    return (ai << 24) | (bi << 16) | (gi << 8) | ri
+
+# First pass for the 2x2 output block whose top left corner is (x, y).
+# Copies the original pixel into three corners and interpolates the bottom right one.
+# planes, if given, are planes of the original image from pixel_planes() to take the
+# samples from; otherwise every sample is unpacked and its luma computed.
+def pass1_block(original_pixel_data, original_width, original_height, output_data, out_width,
+                x, y, mats, planes=None):
+    red, green, blue, alpha, Y_luma = mats
+    if planes is not None:
+        red_plane, green_plane, blue_plane, alpha_plane, luma, plane_y, plane_x, plane_width = planes
+
+    # central pixels on original image: cx and cy
+    cx = x >> 1
+    cy = y >> 1
+
+    # sample supporting pixels on original image: sx and sy
+    for sx in range(-1, 3):
+        for sy in range(-1, 3):
+
+            # clamp the pixel locations.
+            csy = clamp(sy + cy, 0, original_height - 1)
+            csx = clamp(sx + cx, 0, original_width - 1)
+
+            # sample and add weighted components
+            if planes is None:
+                sample = original_pixel_data[csy * original_width + csx]
+                red[sx + 1][sy + 1] = ((sample) >> 0) & 0xFF
+                green[sx + 1][sy + 1] = ((sample) >> 8) & 0xFF
+                blue[sx + 1][sy + 1] = ((sample) >> 16) & 0xFF
+                alpha[sx + 1][sy + 1] = ((sample) >> 24) & 0xFF
+                Y_luma[sx + 1][sy + 1] = (LUMA_R * red[sx + 1][sy + 1] + \
+                LUMA_G * green[sx + 1][sy + 1] + LUMA_B * blue[sx + 1][sy + 1])
+            else:
+                k = (csy - plane_y) * plane_width + csx - plane_x
+                red[sx + 1][sy + 1] = red_plane[k]
+                green[sx + 1][sy + 1] = green_plane[k]
+                blue[sx + 1][sy + 1] = blue_plane[k]
+                alpha[sx + 1][sy + 1] = alpha_plane[k]
+                Y_luma[sx + 1][sy + 1] = luma[k]
+
+    new_pixel = blend_pixel(mats, PASS1_WEIGHTS, w1, w2, sample_bounds(mats))
+
+    # write to data
+    output_data[y * out_width + x] = output_data[y * out_width + x + 1] = \
+    output_data[(y + 1) * out_width + x] = original_pixel_data[cy * original_width + cx]
+    output_data[(y + 1) * out_width + x + 1] = new_pixel
+
+# Second pass for the 2x2 output block whose top left corner is (x, y).
+# Fills in the top right and bottom left pixels of the block, in place.
+# planes, if given, are planes of output_data to read from and keep up to date.
+def pass2_block(output_data, out_width, out_height, x, y, mats, planes=None):
+    red, green, blue, alpha, Y_luma = mats
+    if planes is not None:
+        red_plane, green_plane, blue_plane, alpha_plane, luma, plane_y, plane_x, plane_width = planes
+
+    # sample supporting pixels in original image
+    for sx in range(-1, 3):
+        for sy in range(-1, 3):
+
+            # clamp pixel locations
+            csy = clamp(sx - sy + y, 0, out_height - 1)
+            csx = clamp(sx + sy + x, 0, out_width - 1)
+
+            # sample and add weighted components
+            if planes is None:
+                sample = output_data[csy * out_width + csx]
+                red[sx + 1][sy + 1] = ((sample) >> 0) & 0xFF
+                green[sx + 1][sy + 1] = ((sample) >> 8) & 0xFF
+                blue[sx + 1][sy + 1] = ((sample) >> 16) & 0xFF
+                alpha[sx + 1][sy + 1] = ((sample) >> 24) & 0xFF
+                Y_luma[sx + 1][sy + 1] = (LUMA_R * red[sx + 1][sy + 1] + \
+                LUMA_G * green[sx + 1][sy + 1] + LUMA_B * blue[sx + 1][sy + 1])
+            else:
+                k = (csy - plane_y) * plane_width + csx - plane_x
+                red[sx + 1][sy + 1] = red_plane[k]
+                green[sx + 1][sy + 1] = green_plane[k]
+                blue[sx + 1][sy + 1] = blue_plane[k]
+                alpha[sx + 1][sy + 1] = alpha_plane[k]
+                Y_luma[sx + 1][sy + 1] = luma[k]
+
+    # the second write is clamped against the first neighbourhood as well
+    bounds = sample_bounds(mats)
+    if planes is None:
+        output_data[y * out_width + x + 1] = blend_pixel(mats, PASS2_WEIGHTS, w3, w4, bounds)
+    else:
+        output_data[y * out_width + x + 1] = store_channels(planes, x + 1, y,
+                                                            blend_channels(mats, PASS2_WEIGHTS, w3, w4, bounds))
+
+    for sx in range(-1, 3):
+        for sy in range(-1, 3):
+
+            # clamp pixel locations
+            csy = clamp(sx - sy + 1 + y, 0, out_height - 1)
+            csx = clamp(sx + sy - 1 + x, 0, out_width - 1)
+
+            # sample and add weighted components
+            if planes is None:
+                sample = output_data[csy * out_width + csx]
+                red[sx + 1][sy + 1] = ((sample) >> 0) & 0xFF
+                green[sx + 1][sy + 1] = ((sample) >> 8) & 0xFF
+                blue[sx + 1][sy + 1] = ((sample) >> 16) & 0xFF
+                alpha[sx + 1][sy + 1] = ((sample) >> 24) & 0xFF
+                Y_luma[sx + 1][sy + 1] = (LUMA_R * red[sx + 1][sy + 1] + \
+                LUMA_G * green[sx + 1][sy + 1] + LUMA_B * blue[sx + 1][sy + 1])
+            else:
+                k = (csy - plane_y) * plane_width + csx - plane_x
+                red[sx + 1][sy + 1] = red_plane[k]
+                green[sx + 1][sy + 1] = green_plane[k]
+                blue[sx + 1][sy + 1] = blue_plane[k]
+                alpha[sx + 1][sy + 1] = alpha_plane[k]
+                Y_luma[sx + 1][sy + 1] = luma[k]
+
+    if planes is None:
+        output_data[(y + 1) * out_width + x] = blend_pixel(mats, PASS2_WEIGHTS, w3, w4, bounds)
+    else:
+        output_data[(y + 1) * out_width + x] = store_channels(planes, x, y + 1,
+                                                              blend_channels(mats, PASS2_WEIGHTS, w3, w4, bounds))
+
+# Third pass for the single output pixel (x, y), in place.
+# planes, if given, are planes of output_data to read from and keep up to date.
+def pass3_pixel(output_data, out_width, out_height, x, y, mats, planes=None):
+    red, green, blue, alpha, Y_luma = mats
+    if planes is not None:
+        red_plane, green_plane, blue_plane, alpha_plane, luma, plane_y, plane_x, plane_width = planes
+
+    for sx in range(-2, 2):
+        for sy in range(-2, 2):
+
+            # clamp pixel locations
+            csy = clamp(sy + y, 0, out_height - 1)
+            csx = clamp(sx + x, 0, out_width - 1)
+
+            # sample and add weighted components
+            if planes is None:
+                sample = output_data[csy * out_width + csx]
+                red[sx + 2][sy + 2] = ((sample) >> 0) & 0xFF
+                green[sx + 2][sy + 2] = ((sample) >> 8) & 0xFF
+                blue[sx + 2][sy + 2] = ((sample) >> 16) & 0xFF
+                alpha[sx + 2][sy + 2] = ((sample) >> 24) & 0xFF
+                Y_luma[sx + 2][sy + 2] = (LUMA_R * red[sx + 2][sy + 2] + \
+                LUMA_G * green[sx + 2][sy + 2] + LUMA_B * blue[sx + 2][sy + 2])
+            else:
+                k = (csy - plane_y) * plane_width + csx - plane_x
+                red[sx + 2][sy + 2] = red_plane[k]
+                green[sx + 2][sy + 2] = green_plane[k]
+                blue[sx + 2][sy + 2] = blue_plane[k]
+                alpha[sx + 2][sy + 2] = alpha_plane[k]
+                Y_luma[sx + 2][sy + 2] = luma[k]
+
+    if planes is None:
+        output_data[y * out_width + x] = blend_pixel(mats, PASS3_WEIGHTS, w1, w2, sample_bounds(mats))
+    else:
+        output_data[y * out_width + x] = store_channels(planes, x, y, blend_channels(mats, PASS3_WEIGHTS, w1, w2,
+                                                                                     sample_bounds(mats)))
+
+# Blocks of the second pass within PASS2_BORDER pixels of the image edge sample
+# clamped positions, which may land on pixels the second pass itself writes.
+# Everywhere else a block only reads pixels written by the first pass.
+PASS2_BORDER = 4
+
+def pass2_is_border(x, y, out_width, out_height):
+    return y < PASS2_BORDER or y > out_height - PASS2_BORDER - 2 or \
+           x < PASS2_BORDER or x > out_width - PASS2_BORDER - 2
+
+# The third pass runs backwards and reads its own writes: the pixel to the right and
+# the row below. Pixel (x, y) only depends on pixels of earlier wavefronts, where its
+# wavefront is 3 * (out_height - 1 - y) + (out_width - 1 - x), so the pixels of one
+# wavefront can be computed together, and any group of pixels can be computed as
+# soon as every earlier wavefront it touches is done.
+def pass3_wavefronts(out_width, out_height):
+    return 3 * (out_height - 1) + out_width
+
+# - - - - - Flat regions - - - - -
+# blend_pixel() clamps every channel between the lowest and highest value of the
+# four centre samples. Where those are one and the same packed pixel, that leaves
+# only this pixel as the result, whatever diagonal_edge() says, so the rest of the
+# neighbourhood need not be sampled at all. The uniform areas pixel art is mostly
+# made of are flat in this sense, and so are the blocks along their edges.
+#
+# With skip_transparent, centre samples that all have an alpha of 0 count as flat
+# as well, and the result is the pixel the block or pixel itself sits on. Its alpha
+# is 0 exactly as in the full computation, but its colour channels, invisible under
+# that alpha, may differ from it. The later passes sample that colour, so pixels
+# along the edges of transparent areas may come out slightly different too; this
+# is why it is an option and not the default.
+
+# True if four centre samples, a being the one a flat result takes, are flat.
+def flat_samples(a, b, c, d, skip_transparent):
+    if a == b == c == d:
+        return True
+    return skip_transparent and (a | b | c | d) >> 24 == 0
+
+# The original pixel of first pass block (x, y) if the block is flat, else None.
+# Its centre samples are that pixel and the ones right of and below it.
+def pass1_flat(original_pixel_data, original_width, original_height, x, y, skip_transparent):
+    cx = x >> 1
+    cy = y >> 1
+    row = cy * original_width
+    below = min(cy + 1, original_height - 1) * original_width
+    right = min(cx + 1, original_width - 1)
+    sample = original_pixel_data[row + cx]
+    if flat_samples(sample, original_pixel_data[row + right], original_pixel_data[below + cx],
+                    original_pixel_data[below + right], skip_transparent):
+        return sample
+    return None
+
+# The top left pixel of second pass block (x, y) if the block is flat, else None.
+# The second neighbourhood of a block is clamped to the bounds of the first, so
+# that one decides for both.
+def pass2_flat(output_data, out_width, out_height, x, y, skip_transparent):
+    above = max(y - 1, 0) * out_width
+    below = min(y + 1, out_height - 1) * out_width
+    right = min(x + 1, out_width - 1)
+    sample = output_data[y * out_width + x]
+    if flat_samples(sample, output_data[above + right], output_data[below + right],
+                    output_data[y * out_width + min(x + 2, out_width - 1)], skip_transparent):
+        return sample
+    return None
+
+# True if third pass pixel (x, y) is flat, which leaves it as it is. Its centre
+# samples are the pixel and the ones left of and above it.
+def pass3_flat(output_data, out_width, out_height, x, y, skip_transparent):
+    row = y * out_width
+    above = max(y - 1, 0) * out_width
+    left = max(x - 1, 0)
+    return flat_samples(output_data[row + x], output_data[row + left], output_data[above + x],
+                        output_data[above + left], skip_transparent)
+
+# Size in bytes of one packed pixel in the buffers of this engine.
+PIXEL_BYTES = 4
+
+# Allocates a zeroed buffer of count packed pixels.
+def allocate(count):
+    return array("I", [0]) * count
+
+# Packed pixels for RGBA bytes, or RGB bytes if rgba is False. See pixels.py.
+def pixels_from_bytes(data, rgba):
+    return packed_array(data if rgba else rgb_to_rgba(data))
+
+# RGBA bytes of count packed pixels of a buffer, starting at pixel start.
+def pixels_to_bytes(pixels, start, count):
+    return packed_array_bytes(pixels, start, count)
+
+# Reference implementation of the three passes: plain Python loops over every output pixel.
+# Each of loops_pass1(), loops_pass2() and loops_pass3() runs one pass over the whole
+# image; superxbr_loops() runs all three. They take the packed original pixels (see
+# pixels.py) and the output buffer, which must hold at least (2 * original_width) *
+# (2 * original_height) pixels; the first pass scales the original into it and the
+# other two work on it in place.
+# progress is called as progress(pass_number, fraction) once per output row.
+def loops_pass1(original_pixel_data, original_width, original_height, output_data, progress):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    mats = kernel_matrices()
+    for y in range(0, out_height, 2):
+        for x in range(0, out_width, 2):
+            pass1_block(original_pixel_data, original_width, original_height, output_data, out_width,
+                        x, y, mats)
+        progress(1, float(y + 2)/out_height)
+
+def loops_pass2(original_pixel_data, original_width, original_height, output_data, progress):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    mats = kernel_matrices()
+    for y in range(0, out_height, 2):
+        for x in range(0, out_width, 2):
+            pass2_block(output_data, out_width, out_height, x, y, mats)
+        progress(2, float(y + 2)/out_height)
+
+def loops_pass3(original_pixel_data, original_width, original_height, output_data, progress):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    mats = kernel_matrices()
+    for y in range(out_height - 1, -1, -1):
+        for x in range(out_width - 1, -1, -1):
+            pass3_pixel(output_data, out_width, out_height, x, y, mats)
+        progress(3, float(out_height - y)/out_height)
+
+LOOP_PASSES = (loops_pass1, loops_pass2, loops_pass3)
+
+def superxbr_loops(original_pixel_data, original_width, original_height, output_data, progress):
+    for run_pass in LOOP_PASSES:
+        run_pass(original_pixel_data, original_width, original_height, output_data, progress)
+    return output_data
+
+# Output rows per call of the pass range functions in the passes below, each
+# followed by a progress update.
+KERNEL_BAND_ROWS = 16
+
+# Bands of KERNEL_BAND_ROWS output rows, as (y0, y1), covering out_height rows.
+def kernel_bands(out_height):
+    return [(y0, min(out_height, y0 + KERNEL_BAND_ROWS)) for y0 in range(0, out_height, KERNEL_BAND_ROWS)]
+
+# The passes of superxbr_loops() run through the pass range functions below, band of
+# rows by band of rows, so that they sample luma planes and skip flat blocks. Same
+# arguments and results; evaluations, if given, receives the evaluation counts as
+# add_evaluations() keeps them. skip_transparent is described under "Flat regions" above.
+def kernel_pass1(original_pixel_data, original_width, original_height, output_data, progress,
+                 evaluations=None, skip_transparent=False):
+    out_height = original_height * 2
+    for y0, y1 in kernel_bands(out_height):
+        add_evaluations(evaluations, 1,
+                        pass1_rows(original_pixel_data, original_width, original_height, output_data, y0, y1,
+                                   skip_transparent))
+        progress(1, float(y1)/out_height)
+
+# The interior and border blocks never read each other's writes, so only the order
+# among the border blocks matters.
+def kernel_pass2(original_pixel_data, original_width, original_height, output_data, progress,
+                 evaluations=None, skip_transparent=False):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    for y0, y1 in kernel_bands(out_height):
+        add_evaluations(evaluations, 2, pass2_interior(output_data, out_width, out_height, y0, y1,
+                                                       skip_transparent))
+        add_evaluations(evaluations, 2, pass2_border(output_data, out_width, out_height, y0, y1,
+                                                     skip_transparent))
+        progress(2, float(y1)/out_height)
+
+# Bands from the bottom up: all wavefronts of a band only need the rows below it to
+# be final.
+def kernel_pass3(original_pixel_data, original_width, original_height, output_data, progress,
+                 evaluations=None, skip_transparent=False):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    wavefronts = pass3_wavefronts(out_width, out_height)
+    for ry0, ry1 in kernel_bands(out_height):
+        add_evaluations(evaluations, 3, pass3_tile(output_data, out_width, out_height, ry0, ry1, 0, wavefronts,
+                                                   skip_transparent))
+        progress(3, float(ry1)/out_height)
+
+# The engine's passes in order, each called as run_pass(original_pixel_data,
+# original_width, original_height, output_data, progress, evaluations,
+# skip_transparent). Running them one after the other is the engine's 2x scaler;
+# benchmarks/ runs them one by one to time them and check their output.
+PASSES = (kernel_pass1, kernel_pass2, kernel_pass3)
+
+# Runs the PASSES of an engine module (kernel or numpy_engine) one after the other.
+# profile, if given, records every pass as a stage, see profile.py.
+def run_passes(passes, original_pixel_data, original_width, original_height, output_data, progress,
+               evaluations=None, skip_transparent=False, profile=None):
+    for pass_number, run_pass in enumerate(passes, 1):
+        start = stage_start(profile)
+        run_pass(original_pixel_data, original_width, original_height, output_data, progress, evaluations,
+                 skip_transparent)
+        stage_end(profile, start, PASS_STAGES[pass_number], 4 * original_width * original_height)
+    return output_data
+
+# superxbr_loops() through PASSES, with evaluations, skip_transparent and profile as above.
+def superxbr_kernel(original_pixel_data, original_width, original_height, output_data, progress,
+                    evaluations=None, skip_transparent=False, profile=None):
+    return run_passes(PASSES, original_pixel_data, original_width, original_height, output_data, progress,
+                      evaluations, skip_transparent, profile)
+
+# The engine's 2x scaler, as called by the cascade in cascade.py.
+scale2x = superxbr_kernel
+
+# - - - - - Pass ranges - - - - -
+# The passes split into pieces that can run independently of each other. parallel.py
+# hands these to worker processes; numpy_engine.py and fixed_engine.py provide the
+# same functions.
+#
+# Instead of unpacking every sample of every neighbourhood and computing its luma,
+# 16 times per pixel and pass (32 in the second pass), each piece splits the pixels
+# it samples into channel planes and computes their luma once, into a plane (see
+# pixel_planes()), and updates the planes where it writes. Flat blocks
+# and pixels (see "Flat regions" above) are filled in without sampling anything.
+# Each piece returns what it cost as (neighbourhoods, luma evaluations, difference
+# evaluations), the last being the absolute luma differences diagonal_edge() takes.
+# Evaluating every neighbourhood from scratch takes LUMA_EVALUATIONS and
+# DIFFERENCE_EVALUATIONS each.
+#
+# All of them take skip_transparent, see "Flat regions".
+LUMA_EVALUATIONS = 16
+DIFFERENCE_EVALUATIONS = 26
+
+# Adds the counts a pass range function returned to evaluations, a dict from pass
+# number to [neighbourhoods, luma evaluations, difference evaluations]. Does nothing
+# if evaluations is None.
+def add_evaluations(evaluations, pass_number, counts):
+    if evaluations is not None:
+        totals = evaluations.setdefault(pass_number, [0, 0, 0])
+        for i in range(3):
+            totals[i] += counts[i]
+
+# Evaluations saved per pass against evaluating every neighbourhood from scratch,
+# as {pass number: (luma evaluations saved, difference evaluations saved)}.
+def saved_evaluations(evaluations):
+    return dict((pass_number, (neighbourhoods * LUMA_EVALUATIONS - luma,
+                               neighbourhoods * DIFFERENCE_EVALUATIONS - differences))
+                for pass_number, (neighbourhoods, luma, differences) in evaluations.items())
+
+# Wraps a shared memory buffer as an array of packed pixels.
+def pixel_view(buffer, count):
+    return (ctypes.c_uint32.__ctype_le__ * count).from_buffer(buffer)
+
+# First pass over the blocks of output rows y0 to y1 (both even).
+def pass1_rows(original_pixel_data, original_width, original_height, output_data, y0, y1,
+               skip_transparent=False):
+    out_width = original_width * 2
+    mats = kernel_matrices()
+    # a block samples one original row above its own and two below
+    planes = pixel_planes(original_pixel_data, original_width,
+                          max(0, y0 // 2 - 1), min(original_height, y1 // 2 + 2), 0, original_width)
+    blocks = computed = 0
+    for y in range(y0, y1, 2):
+        for x in range(0, out_width, 2):
+            blocks += 1
+            sample = pass1_flat(original_pixel_data, original_width, original_height, x, y, skip_transparent)
+            if sample is None:
+                pass1_block(original_pixel_data, original_width, original_height, output_data,
+                            out_width, x, y, mats, planes)
+                computed += 1
+            else:
+                output_data[y * out_width + x] = output_data[y * out_width + x + 1] = \
+                output_data[(y + 1) * out_width + x] = output_data[(y + 1) * out_width + x + 1] = sample
+    return blocks, len(planes[4]), computed * DIFFERENCE_EVALUATIONS
+
+# Fills in flat second pass block (x, y) with sample.
+def pass2_fill(output_data, out_width, x, y, sample):
+    output_data[y * out_width + x + 1] = output_data[(y + 1) * out_width + x] = sample
+
+# Second pass over the blocks of output rows y0 to y1 that are not near the border.
+# These only read first pass pixels, so they can run in any order. For the same
+# reason, filling in a flat block can leave the planes as they are.
+def pass2_interior(output_data, out_width, out_height, y0, y1, skip_transparent=False):
+    rows = range(max(y0, PASS2_BORDER), min(y1, out_height - PASS2_BORDER - 1), 2)
+    if not rows:
+        return 0, 0, 0
+    mats = kernel_matrices()
+    # a block samples 3 rows above its own and 4 below
+    planes = pixel_planes(output_data, out_width, rows[0] - 3, rows[-1] + 5, 0, out_width)
+    blocks = computed = 0
+    for y in rows:
+        for x in range(PASS2_BORDER, out_width - PASS2_BORDER - 1, 2):
+            blocks += 1
+            sample = pass2_flat(output_data, out_width, out_height, x, y, skip_transparent)
+            if sample is None:
+                pass2_block(output_data, out_width, out_height, x, y, mats, planes)
+                computed += 1
+            else:
+                pass2_fill(output_data, out_width, x, y, sample)
+    return 2 * blocks, len(planes[4]) + 2 * computed, 2 * computed * DIFFERENCE_EVALUATIONS
+
+# Second pass over the blocks near the border, in the original order. Runs after
+# pass2_interior() has covered the rest of the image, or the rest of rows y0 to y1.
+# These are few and spread along the edges, so they unpack their samples as they go.
+def pass2_border(output_data, out_width, out_height, y0=0, y1=None, skip_transparent=False):
+    mats = kernel_matrices()
+    blocks = computed = 0
+    for y in range(y0, out_height if y1 is None else y1, 2):
+        for x in range(0, out_width, 2):
+            if pass2_is_border(x, y, out_width, out_height):
+                blocks += 1
+                sample = pass2_flat(output_data, out_width, out_height, x, y, skip_transparent)
+                if sample is None:
+                    pass2_block(output_data, out_width, out_height, x, y, mats)
+                    computed += 1
+                else:
+                    pass2_fill(output_data, out_width, x, y, sample)
+    return 2 * blocks, 2 * computed * LUMA_EVALUATIONS, 2 * computed * DIFFERENCE_EVALUATIONS
+
+# Third pass over the pixels whose reversed row (out_height - 1 - y) lies in
+# [ry0, ry1) and whose wavefront lies in [t0, t1), in the original order.
+def pass3_tile(output_data, out_width, out_height, ry0, ry1, t0, t1, skip_transparent=False):
+    # reversed columns of the tile's pixels
+    rx0 = max(0, t0 - 3 * (ry1 - 1))
+    rx1 = min(out_width, t1 - 3 * ry0)
+    if rx0 >= rx1:
+        return 0, 0, 0
+    mats = kernel_matrices()
+    # a pixel samples 2 rows and columns before its own and 1 after
+    planes = pixel_planes(output_data, out_width, max(0, out_height - ry1 - 2),
+                          min(out_height, out_height - ry0 + 1),
+                          max(0, out_width - rx1 - 2), min(out_width, out_width - rx0 + 1))
+    pixels = computed = 0
+    for ry in range(ry0, ry1):
+        y = out_height - 1 - ry
+        for rx in range(max(0, t0 - 3 * ry), min(out_width, t1 - 3 * ry)):
+            pixels += 1
+            if not pass3_flat(output_data, out_width, out_height, out_width - 1 - rx, y, skip_transparent):
+                pass3_pixel(output_data, out_width, out_height, out_width - 1 - rx, y, mats, planes)
+                computed += 1
+    return pixels, len(planes[4]) + computed, computed * DIFFERENCE_EVALUATIONS
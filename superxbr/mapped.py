@@ -0,0 +1,97 @@
+# Scaling through memory-mapped scratch files: the two step buffers of the cascade
+# (see cascade.py) are temporary files mapped into memory rather than heap memory,
+# for outputs too large for RAM on machines with fast disks. The passes read and
+# write the mapped files in place, through the same views of them the worker
+# processes use (see parallel.py), so the operating system pages the buffers in and
+# out as the passes move down the image, and only the original image and one band of
+# output rows at a time are ever held in the heap.
+#
+# The result goes to a row store (see stream.py), band of rows by band of rows,
+# straight from the mapped large buffer. It is identical to superxbr.scale(); unlike
+# the streaming scaler, which also bounds memory but recomputes the rows around
+# every band, every pass runs once over the whole image, on any engine and on
+# worker processes too.
+
+import tempfile
+
+from .cascade import buffer_sizes, cascade_steps, run_cascade
+from .core import ENGINES, engine_name, no_progress, valid_scale_factor
+from .parallel import PIXEL_BYTES, SharedPixels, parallel_cascade, worker_count
+from .pixels import as_bytes, rgb_to_rgba
+from .profile import stage_end, stage_start
+from .stream import BAND_ROWS
+
+# Bytes of heap scale_mapped() holds at its peak for the same arguments: the packed
+# original image and a band of output rows.
+def mapped_memory(width, height, scale_factor=2, engine="auto", band_rows=BAND_ROWS):
+    pixel_bytes = ENGINES[engine_name(engine)].PIXEL_BYTES
+    band = width * scale_factor * min(band_rows, height * scale_factor)
+    return width * height * pixel_bytes + band * PIXEL_BYTES
+
+# Bytes of scratch files scale_mapped() creates: both step buffers, plus a copy of
+# the original image for worker processes.
+def scratch_size(width, height, scale_factor=2, workers=1):
+    sizes = buffer_sizes(width * height * scale_factor * scale_factor, cascade_steps(scale_factor))
+    return (sum(sizes) + (width * height if workers != 1 else 0)) * PIXEL_BYTES
+
+# Scales like superxbr.scale() with the step buffers in scratch files in directory
+# (the system's temporary directory if None), and writes the scaled RGBA rows to the
+# row store destination, band_rows at a time. The other arguments are as for
+# superxbr.scale(); profile also records writing the bands. The scratch files are
+# removed when the scale ends, cancelled or not.
+def scale_mapped(pixels, destination, width, height, scale_factor=2, rgba=True, engine="auto", progress=None,
+                 workers=1, evaluations=None, skip_transparent=False, profile=None, directory=None,
+                 band_rows=BAND_ROWS):
+    if not valid_scale_factor(scale_factor):
+        raise ValueError("scale factor not a power of 2: %r" % (scale_factor,))
+    if len(pixels) != width * height * (4 if rgba else 3):
+        raise ValueError("pixel buffer does not match a %dx%d %s image" %
+                         (width, height, "RGBA" if rgba else "RGB"))
+
+    engine = engine_name(engine)
+    module = ENGINES[engine]
+    progress = progress or no_progress
+    out_width = width * scale_factor
+    out_height = height * scale_factor
+    final = out_width * out_height
+    # SharedPixels would put the files in /dev/shm, which is memory
+    directory = directory or tempfile.gettempdir()
+
+    scratch = []
+    try:
+        start = stage_start(profile)
+        sizes = buffer_sizes(final, cascade_steps(scale_factor))
+        for size in sizes:
+            scratch.append(SharedPixels(size, directory))
+        buffers = list(scratch)
+        stage_end(profile, start, "allocate", sum(sizes), sum(sizes) * PIXEL_BYTES)
+
+        if workers != 1:
+            source = SharedPixels(width * height, directory)
+            scratch.append(source)
+            # RGBA bytes are the packed pixels already, see pixels.py
+            start = stage_start(profile)
+            source.map[:width * height * PIXEL_BYTES] = as_bytes(pixels if rgba else rgb_to_rgba(pixels))
+            stage_end(profile, start, "to pixels", width * height, width * height * PIXEL_BYTES)
+            parallel_cascade(source, buffers, width, height, scale_factor, progress, worker_count(workers),
+                             engine, evaluations, skip_transparent, profile)
+        else:
+            start = stage_start(profile)
+            original_pixel_data = module.pixels_from_bytes(pixels, rgba)
+            stage_end(profile, start, "to pixels", width * height, width * height * module.PIXEL_BYTES)
+            views = [module.pixel_view(shared.map, shared.count) for shared in buffers]
+            run_cascade(module, original_pixel_data, width, height, scale_factor, progress, evaluations,
+                        skip_transparent, profile, views)
+            # the views must go before the maps can be closed
+            del views, original_pixel_data
+
+        # the mapped bytes are RGBA rows already
+        row_bytes = out_width * PIXEL_BYTES
+        for y0 in range(0, out_height, band_rows):
+            y1 = min(out_height, y0 + band_rows)
+            start = stage_start(profile)
+            destination.write(y0, buffers[0].map[y0 * row_bytes:y1 * row_bytes])
+            stage_end(profile, start, "write rows", (y1 - y0) * out_width, (y1 - y0) * row_bytes)
+    finally:
+        for shared in scratch:
+            shared.close()
@@ -0,0 +1,505 @@
+# NumPy engine: computes the same three passes as kernel.superxbr_loops() as
+# whole-array arithmetic. Importing this module raises ImportError without NumPy.
+
+import ctypes
+
+import numpy
+
+from .kernel import LUMA_R, LUMA_G, LUMA_B, PASS1_WEIGHTS, PASS2_WEIGHTS, PASS3_WEIGHTS, PASS2_BORDER, \
+    DIFFERENCE_EVALUATIONS, w1, w2, w3, w4, add_evaluations, pass3_wavefronts, run_passes
+from .kernel import pass2_border as kernel_pass2_border
+
+# Every float operation is performed in the same order as in blend_pixel() and
+# diagonal_edge(), on float64 planes, so the output is bit-identical to the loops.
+
+# Packed pixels are little-endian, so that their bytes are the RGBA bytes. See pixels.py.
+PIXEL_TYPE = numpy.dtype("<u4")
+
+# Number of blocks/pixels handed to the vectorized kernel at once. Bounds the size
+# of the temporary float planes (about 1KB per block).
+NUMPY_CHUNK = 1 << 15
+
+# Pairs of matrix cells whose luma differences make up each weighted term of
+# diagonal_edge(), for the first and second diagonal respectively.
+DIAGONAL1_TERMS = [
+    [((0, 2), (1, 1)), ((1, 1), (2, 0)), ((1, 3), (2, 2)), ((2, 2), (3, 1))],
+    [((0, 3), (1, 2)), ((2, 1), (3, 0))],
+    [((0, 3), (2, 1)), ((1, 2), (3, 0))],
+    [((1, 2), (2, 1))],
+    [((0, 2), (2, 0)), ((1, 3), (3, 1))],
+    [((0, 1), (1, 0)), ((2, 3), (3, 2))]]
+DIAGONAL2_TERMS = [
+    [((0, 1), (1, 2)), ((1, 2), (2, 3)), ((1, 0), (2, 1)), ((2, 1), (3, 2))],
+    [((0, 0), (1, 1)), ((2, 2), (3, 3))],
+    [((0, 0), (2, 2)), ((1, 1), (3, 3))],
+    [((1, 1), (2, 2))],
+    [((1, 0), (3, 2)), ((0, 1), (2, 3))],
+    [((0, 2), (1, 3)), ((2, 0), (3, 1))]]
+
+# Every pair of cells in the terms, with the rows of its two cells in a (16, n) array.
+DIAGONAL_PAIRS = sorted(set(pair for terms in (DIAGONAL1_TERMS, DIAGONAL2_TERMS) for term in terms for pair in term))
+PAIR_ROWS = dict((pair, k) for k, pair in enumerate(DIAGONAL_PAIRS))
+PAIR_FIRST = [a[0] * 4 + a[1] for a, b in DIAGONAL_PAIRS]
+PAIR_SECOND = [b[0] * 4 + b[1] for a, b in DIAGONAL_PAIRS]
+
+# Matrix cells blend_pixel() reads (cell (i, j) being i * 4 + j): the ends of both
+# diagonals and the four centre samples.
+BLEND_CELLS = [0, 3, 5, 6, 9, 10, 12, 15]
+
+# Channels of an array of packed pixels, as an array of dtype (float64 by default)
+# with one more leading axis of 4 (red, green, blue and alpha).
+def numpy_channels(pixels, dtype=float):
+    # the bytes of a packed pixel are its channels, see pixels.py
+    pixel_bytes = numpy.ascontiguousarray(pixels).view(numpy.uint8).reshape(pixels.shape + (4,))
+    channels = numpy.empty((4,) + pixels.shape, dtype)
+    for c in range(4):
+        channels[c] = pixel_bytes[..., c]
+    return channels
+
+# Luma of an array of packed pixels, as float64.
+def numpy_luma(pixels):
+    channels = numpy_channels(pixels)
+    return LUMA_R * channels[0] + LUMA_G * channels[1] + LUMA_B * channels[2]
+
+# Vectorized diagonal_edge() weight. difference(pair) returns the absolute luma
+# differences of a pair of cells of DIAGONAL1_TERMS or DIAGONAL2_TERMS. Terms with a
+# weight of 0 are left out, which leaves the sum as it is.
+def numpy_diagonal_weight(difference, wp, terms):
+    weight = None
+    for k in range(6):
+        if wp[k] == 0:
+            continue
+        total = None
+        for pair in terms[k]:
+            diff = difference(pair)
+            total = diff if total is None else total + diff
+        total = wp[k] * total
+        weight = total if weight is None else weight + total
+    return weight
+
+# diagonal_edge() of neighbourhoods given by the luma of their 16 samples, in kernel
+# matrix order, along the first axis of sample_luma.
+def numpy_sample_edge(sample_luma, wp):
+    differences = numpy.abs(sample_luma[PAIR_FIRST] - sample_luma[PAIR_SECOND])
+
+    def difference(pair):
+        return differences[PAIR_ROWS[pair]]
+
+    return numpy_diagonal_weight(difference, wp, DIAGONAL1_TERMS) - \
+           numpy_diagonal_weight(difference, wp, DIAGONAL2_TERMS)
+
+# diagonal_edge() exactly as the loops compute it, for neighbourhoods given by the
+# packed pixels of their 16 samples along the first axis of samples.
+def numpy_exact_edge(samples, wp):
+    return numpy_sample_edge(numpy_luma(samples), wp)
+
+# Vectorized blend_pixel() for neighbourhoods whose diagonal_edge() is known. cells
+# holds the packed pixels of the BLEND_CELLS, in that order, along its first axis;
+# the rest is d_edge's shape. Returns the packed pixels and the lower and upper
+# bounds of the anti-ringing clamp.
+# exact_edge(mask) returns numpy_exact_edge() for the neighbourhoods in a mask of
+# d_edge's shape. d_edge is exact here, so it is not needed; blends of other
+# arithmetic (see ARITHMETIC below) may call it.
+def numpy_blend(cells, d_edge, wa, wb, bounds=None, exact_edge=None):
+    channels = numpy_channels(cells)
+
+    if bounds is None:
+        # cells 5, 6, 9 and 10
+        centre = channels[:, 2:6]
+        bounds = (centre.min(axis=1), centre.max(axis=1))
+
+    # cells 3 and 12 plus 6 and 9, or 0 and 15 plus 5 and 10
+    blend = numpy.where(d_edge <= 0,
+                        wa * (channels[:, 1] + channels[:, 6]) + wb * (channels[:, 3] + channels[:, 4]),
+                        wa * (channels[:, 0] + channels[:, 7]) + wb * (channels[:, 2] + channels[:, 5]))
+    blend = numpy.maximum(numpy.minimum(blend, bounds[1]), bounds[0])
+    blend = numpy.clip(numpy.ceil(blend), 0, 255)
+
+    packed = numpy.empty(d_edge.shape + (4,), dtype=numpy.uint8)
+    for c in range(4):
+        packed[..., c] = blend[c]
+    return packed.view(PIXEL_TYPE).reshape(d_edge.shape), bounds
+
+# The arithmetic of the passes: the function computing the luma planes the edge
+# detection works on, and the blend. These use float64 like the loops; the fixed
+# point engine (fixed_engine.py) swaps in integer ones with the same results.
+ARITHMETIC = (numpy_luma, numpy_blend)
+
+# Offsets (row, column) of the 16 samples of each neighbourhood, in kernel matrix order.
+PASS1_OFFSETS = [(sy, sx) for sx in range(-1, 3) for sy in range(-1, 3)]
+PASS2_OFFSETS = [(sx - sy, sx + sy) for sx in range(-1, 3) for sy in range(-1, 3)]
+PASS2_SECOND_OFFSETS = [(sx - sy + 1, sx + sy - 1) for sx in range(-1, 3) for sy in range(-1, 3)]
+PASS3_STEPS = numpy.arange(-2, 2)[:, None]
+
+# - - - - - Grids of neighbourhoods - - - - -
+# The first and second pass sample their neighbourhoods on a regular grid: the
+# samples of one cell, over all neighbourhoods of a chunk, are a strided slice of
+# the pixels around the chunk. The luma of those pixels is computed once per chunk,
+# and so is every absolute luma difference diagonal_edge() needs: neighbourhoods
+# overlap, and the pairs of cells it compares repeat across them, so the differences
+# between all pixels at the same offset form a plane that every pair with that
+# offset takes a slice of.
+
+# The values of a plane for a grid of shape neighbourhoods, step apart in both
+# directions, the first of which is at (y, x).
+def grid_slice(plane, y, x, step, shape):
+    return plane[y:y + step * (shape[0] - 1) + 1:step, x:x + step * (shape[1] - 1) + 1:step]
+
+# Absolute differences between the luma at every position p of a plane and at
+# p + offset, where both lie on the plane. Returns them with the position of p for
+# their first value.
+def luma_differences(luma, offset):
+    dy, dx = offset
+    height, width = luma.shape
+    y0, y1 = max(0, -dy), height - max(0, dy)
+    x0, x1 = max(0, -dx), width - max(0, dx)
+    return numpy.abs(luma[y0:y1, x0:x1] - luma[y0 + dy:y1 + dy, x0 + dx:x1 + dx]), (y0, x0)
+
+# diagonal_edge() for a grid of neighbourhoods as in grid_slice(), over a luma plane.
+# origins[c] is the position of cell c of the first neighbourhood. differences holds
+# the planes of luma_differences() by offset; it is filled in as needed and can be
+# shared between grids over the same luma plane.
+def numpy_grid_edge(luma, origins, step, shape, wp, differences):
+    def difference(pair):
+        a, b = sorted(origins[i * 4 + j] for i, j in pair)
+        offset = (b[0] - a[0], b[1] - a[1])
+        if offset not in differences:
+            differences[offset] = luma_differences(luma, offset)
+        plane, (y0, x0) = differences[offset]
+        return grid_slice(plane, a[0] - y0, a[1] - x0, step, shape)
+
+    return numpy_diagonal_weight(difference, wp, DIAGONAL1_TERMS) - \
+           numpy_diagonal_weight(difference, wp, DIAGONAL2_TERMS)
+
+# The BLEND_CELLS of a grid of neighbourhoods over a plane of packed pixels.
+def grid_cells(pixels, origins, step, shape):
+    return numpy.array([grid_slice(pixels, origins[c][0], origins[c][1], step, shape) for c in BLEND_CELLS])
+
+# numpy_luma() of a plane of packed pixels, computed on the first call of the
+# returned function only.
+def lazy_luma(pixels):
+    plane = []
+
+    def luma():
+        if not plane:
+            plane.append(numpy_luma(pixels))
+        return plane[0]
+    return luma
+
+# exact_edge() for numpy_blend(): numpy_exact_edge() for the neighbourhoods of a grid
+# in a mask of its shape, over the plane of a lazy_luma().
+def grid_exact_edge(luma, origins, step, wp):
+    def exact_edge(mask):
+        ys, xs = numpy.nonzero(mask)
+        plane = luma()
+        return numpy_sample_edge(numpy.array([plane[y + step * ys, x + step * xs] for y, x in origins]), wp)
+    return exact_edge
+
+# Number of absolute differences computed into a differences dict.
+def difference_count(differences):
+    return sum(plane.size for plane, position in differences.values())
+
+# Vectorized kernel.flat_samples() for arrays of the four centre samples.
+def numpy_flat(a, b, c, d, skip_transparent):
+    flat = (a == b) & (a == c) & (a == d)
+    if skip_transparent:
+        flat |= ((a | b | c | d) >> 24) == 0
+    return flat
+
+# First and last + 1 row of a mask of flat blocks that holds a block that is not
+# flat, or None if all of them are.
+def unflat_rows(flat):
+    rows = numpy.flatnonzero(~flat.all(axis=1))
+    if len(rows) == 0:
+        return None
+    return rows[0], rows[-1] + 1
+
+# First pass over the blocks of output rows y0 to y1 (both even). Every block
+# only reads the original image. Flat blocks (see kernel.py) are filled in with
+# their original pixel, and so are whole rows of them without computing anything.
+# arithmetic is one of ARITHMETIC, see above.
+def pass1_rows(original_pixel_data, original_width, original_height, output_data, y0, y1,
+               skip_transparent=False, arithmetic=ARITHMETIC):
+    luma_plane, blend = arithmetic
+    out_width = original_width * 2
+    out_height = original_height * 2
+    output_2d = output_data[:out_width * out_height].reshape(out_height, out_width)
+    rows_per_chunk = max(1, NUMPY_CHUNK // original_width)
+    # a block samples one original row and column before its own and two after,
+    # clamped to the image
+    cols = numpy.clip(numpy.arange(-1, original_width + 2), 0, original_width - 1)
+    origins = [(dy + 1, dx + 1) for dy, dx in PASS1_OFFSETS]
+    counts = [0, 0, 0]
+
+    for c0 in range(y0 // 2, y1 // 2, rows_per_chunk):
+        c1 = min(y1 // 2, c0 + rows_per_chunk)
+        rows = numpy.clip(numpy.arange(c0 - 1, c1 + 2), 0, original_height - 1)
+        pixels = original_pixel_data[(rows * original_width)[:, None] + cols]
+        # cells 5, 6, 9 and 10
+        centre = grid_cells(pixels, origins, 1, (c1 - c0, original_width))[2:6]
+        original = centre[0]
+        flat = numpy_flat(centre[0], centre[1], centre[2], centre[3], skip_transparent)
+        new_pixels = original.copy()
+
+        unflat = unflat_rows(flat)
+        if unflat is not None:
+            first, end = unflat
+            pixels = pixels[first:end + 3]
+            luma = luma_plane(pixels)
+            shape = (end - first, original_width)
+
+            differences = {}
+            d_edge = numpy_grid_edge(luma, origins, 1, shape, PASS1_WEIGHTS, differences)
+            blended, bounds = blend(grid_cells(pixels, origins, 1, shape), d_edge, w1, w2, None,
+                                    grid_exact_edge(lazy_luma(pixels), origins, 1, PASS1_WEIGHTS))
+            new_pixels[first:end] = numpy.where(flat[first:end], original[first:end], blended)
+
+            counts[1] += luma.size
+            counts[2] += difference_count(differences)
+
+        output_2d[2 * c0:2 * c1:2, 0::2] = original
+        output_2d[2 * c0:2 * c1:2, 1::2] = original
+        output_2d[2 * c0 + 1:2 * c1:2, 0::2] = original
+        output_2d[2 * c0 + 1:2 * c1:2, 1::2] = new_pixels
+        counts[0] += new_pixels.size
+    return tuple(counts)
+
+# Second pass over the blocks of output rows y0 to y1 away from the border. These only
+# sample pixels written by the first pass, so they are independent of each other.
+# Flat blocks are filled in as in pass1_rows().
+def pass2_interior(output_data, out_width, out_height, y0, y1, skip_transparent=False, arithmetic=ARITHMETIC):
+    luma_plane, blend = arithmetic
+    interior_x = range(PASS2_BORDER, out_width - PASS2_BORDER - 1, 2)
+    interior_rows = range(max(y0, PASS2_BORDER), min(y1, out_height - PASS2_BORDER - 1), 2)
+    if not interior_x or not interior_rows:
+        return 0, 0, 0
+    output_2d = output_data[:out_width * out_height].reshape(out_height, out_width)
+    rows_per_chunk = max(1, NUMPY_CHUNK // len(interior_x))
+    x0 = interior_x[0]
+    x1 = interior_x[-1] + 2
+    # both neighbourhoods of a block lie within 3 rows and columns before it and 4 after
+    first = [(dy + 3, dx + 3) for dy, dx in PASS2_OFFSETS]
+    second = [(dy + 3, dx + 3) for dy, dx in PASS2_SECOND_OFFSETS]
+    counts = [0, 0, 0]
+
+    for i in range(0, len(interior_rows), rows_per_chunk):
+        c0 = interior_rows[i]
+        c1 = interior_rows[min(len(interior_rows), i + rows_per_chunk) - 1] + 2
+        # the centre samples of the first neighbourhood: the block's top left pixel,
+        # the ones above and below the pixel right of it, and the second pixel right of it
+        original = output_2d[c0:c1:2, x0:x1:2]
+        flat = numpy_flat(original, output_2d[c0 - 1:c1 - 1:2, x0 + 1:x1 + 1:2],
+                          output_2d[c0 + 1:c1 + 1:2, x0 + 1:x1 + 1:2], output_2d[c0:c1:2, x0 + 2:x1 + 2:2],
+                          skip_transparent)
+        top_right = original.copy()
+        bottom_left = original.copy()
+
+        unflat = unflat_rows(flat)
+        if unflat is not None:
+            u0 = c0 + 2 * unflat[0]
+            u1 = c0 + 2 * unflat[1]
+            pixels = numpy.ascontiguousarray(output_2d[u0 - 3:u1 + 3, x0 - 3:x1 + 3])
+            luma = luma_plane(pixels)
+            shape = ((u1 - u0) // 2, len(interior_x))
+
+            differences = {}
+            exact_luma = lazy_luma(pixels)
+            d_edge = numpy_grid_edge(luma, first, 2, shape, PASS2_WEIGHTS, differences)
+            blended, bounds = blend(grid_cells(pixels, first, 2, shape), d_edge, w3, w4, None,
+                                    grid_exact_edge(exact_luma, first, 2, PASS2_WEIGHTS))
+            rows = slice(*unflat)
+            top_right[rows] = numpy.where(flat[rows], original[rows], blended)
+            d_edge = numpy_grid_edge(luma, second, 2, shape, PASS2_WEIGHTS, differences)
+            blended, bounds = blend(grid_cells(pixels, second, 2, shape), d_edge, w3, w4, bounds,
+                                    grid_exact_edge(exact_luma, second, 2, PASS2_WEIGHTS))
+            bottom_left[rows] = numpy.where(flat[rows], original[rows], blended)
+
+            counts[1] += luma.size
+            counts[2] += difference_count(differences)
+
+        output_2d[c0:c1:2, x0 + 1:x1:2] = top_right
+        output_2d[c0 + 1:c1:2, x0:x1:2] = bottom_left
+        counts[0] += 2 * top_right.size
+    return tuple(counts)
+
+# Second pass over the blocks near the border. Their clamped sample positions land on
+# pixels this pass writes, which makes the result depend on the loop order, so they
+# run one by one through the scalar code.
+def pass2_border(output_data, out_width, out_height, y0=0, y1=None, skip_transparent=False):
+    return kernel_pass2_border(pixel_buffer(output_data), out_width, out_height, y0, y1, skip_transparent)
+
+# Wavefronts per luma plane of the third pass. A plane covers every pixel a run of
+# this many wavefronts samples, in all rows of a tile.
+PASS3_RUN = 256
+
+# Third pass over the pixels whose reversed row lies in [ry0, ry1) and whose
+# wavefront (see kernel.pass3_wavefronts()) lies in [t0, t1), one wavefront at a time.
+def pass3_tile(output_data, out_width, out_height, ry0, ry1, t0, t1, skip_transparent=False,
+               arithmetic=ARITHMETIC):
+    counts = [0, 0, 0]
+    for run in range(t0, t1, PASS3_RUN):
+        pass3_run(output_data, out_width, out_height, ry0, ry1, run, min(t1, run + PASS3_RUN), counts,
+                  skip_transparent, arithmetic)
+    return tuple(counts)
+
+# Mask of the flat pixels (see kernel.pass3_flat()) on reversed rows ry0 to ry1 and
+# wavefronts t0 to t1, by reversed row and wavefront; positions outside the image
+# count as flat. The pixels a flat pixel samples are only computed after it, so the
+# mask holds for the whole run. Returns (mask, number of pixels in the image).
+def pass3_flat_plane(output_data, out_width, out_height, ry0, ry1, t0, t1, skip_transparent):
+    reverse_rows = numpy.arange(ry0, ry1)[:, None]
+    reverse_cols = numpy.arange(t0, t1)[None, :] - 3 * reverse_rows
+    inside = (reverse_cols >= 0) & (reverse_cols < out_width)
+    ys = (out_height - 1 - reverse_rows + 0 * reverse_cols)[inside]
+    xs = (out_width - 1 - reverse_cols)[inside]
+    index = ys * out_width + xs
+    # the pixel, the one left of it, the one above it and the one above and left, clamped
+    left = index - (xs > 0)
+    up = out_width * (ys > 0)
+    flat = numpy.ones(inside.shape, dtype=bool)
+    flat[inside] = numpy_flat(output_data[index], output_data[left], output_data[index - up],
+                              output_data[left - up], skip_transparent)
+    return flat, len(index)
+
+# pass3_tile() for a run of wavefronts t0 to t1. Adds the evaluations to counts.
+#
+# The samples of a pixel on wavefront t lie on wavefronts t - 4 to t + 8, and on the
+# reversed rows from the one before the pixel's to two after it. The luma plane
+# holds these by reversed row and wavefront, so that a wavefront's samples are
+# found at fixed offsets from it, and is updated with every wavefront computed.
+# Flat pixels keep their value and are left out of the wavefronts; a run with
+# nothing else needs no luma plane at all.
+def pass3_run(output_data, out_width, out_height, ry0, ry1, t0, t1, counts, skip_transparent=False,
+              arithmetic=ARITHMETIC):
+    luma_plane, blend = arithmetic
+    flat, pixels = pass3_flat_plane(output_data, out_width, out_height, ry0, ry1, t0, t1, skip_transparent)
+    counts[0] += pixels
+    if flat.all():
+        return
+
+    plane_row = max(0, ry0 - 1)
+    plane_t = t0 - 4
+    reverse_rows = numpy.arange(plane_row, min(out_height, ry1 + 2))[:, None]
+    reverse_cols = numpy.arange(plane_t, t1 + 8)[None, :] - 3 * reverse_rows
+    inside = (reverse_cols >= 0) & (reverse_cols < out_width)
+    index = (out_height - 1 - reverse_rows) * out_width + (out_width - 1 - reverse_cols)
+    inside_luma = luma_plane(output_data[index[inside]])
+    luma = numpy.zeros(inside.shape, inside_luma.dtype)
+    luma[inside] = inside_luma
+    counts[1] += int(numpy.count_nonzero(inside))
+
+    for t in range(t0, t1):
+        first = max(ry0, -(-(t - (out_width - 1)) // 3))
+        last = min(ry1 - 1, t // 3)
+        if first > last:
+            continue
+        reverse_y = numpy.arange(first, last + 1)
+        reverse_y = reverse_y[~flat[reverse_y - ry0, t - t0]]
+        if len(reverse_y) == 0:
+            continue
+        ys = out_height - 1 - reverse_y
+        xs = out_width - 1 - (t - 3 * reverse_y)
+
+        # cell (i, j) samples column x + i - 2 and row y + j - 2, clamped
+        sample_rows = numpy.clip(ys + PASS3_STEPS, 0, out_height - 1)
+        sample_cols = numpy.clip(xs + PASS3_STEPS, 0, out_width - 1)
+        index = (sample_cols[:, None] + (sample_rows * out_width)[None, :]).reshape(16, -1)
+        reverse_rows = out_height - 1 - sample_rows
+        plane_index = ((out_width - 1 - sample_cols) - plane_t)[:, None] + \
+                      ((reverse_rows - plane_row) * luma.shape[1] + 3 * reverse_rows)[None, :]
+        d_edge = numpy_sample_edge(luma.take(plane_index.reshape(16, -1)), PASS3_WEIGHTS)
+        samples = output_data[index]
+        new_pixels, bounds = blend(samples[BLEND_CELLS], d_edge, w1, w2, None,
+                                   lambda mask: numpy_exact_edge(samples[:, mask], PASS3_WEIGHTS))
+        output_data[ys * out_width + xs] = new_pixels
+        luma[reverse_y - plane_row, t - plane_t] = luma_plane(new_pixels)
+
+        counts[1] += len(new_pixels)
+        counts[2] += len(new_pixels) * DIFFERENCE_EVALUATIONS
+
+# Size in bytes of one packed pixel in the buffers of this engine.
+PIXEL_BYTES = 4
+
+# Allocates a zeroed buffer of count packed pixels.
+def allocate(count):
+    return numpy.zeros(count, dtype=PIXEL_TYPE)
+
+# Packed pixels for RGBA bytes, or RGB bytes if rgba is False. RGBA bytes are used
+# as they are, without a copy; the result is then read-only. See pixels.py.
+def pixels_from_bytes(data, rgba):
+    if rgba:
+        return numpy.frombuffer(data, dtype=PIXEL_TYPE)
+    rgb = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, 3)
+    pixels = numpy.empty((len(rgb), 4), dtype=numpy.uint8)
+    pixels[:, :3] = rgb
+    pixels[:, 3] = 255
+    return pixels.view(PIXEL_TYPE).ravel()
+
+# RGBA bytes of count packed pixels of a buffer, starting at pixel start.
+def pixels_to_bytes(pixels, start, count):
+    return pixels[start:start + count].tobytes()
+
+# Output rows per call of pass1_rows() and pass2_interior() in the passes below, each
+# followed by a progress update: about NUMPY_CHUNK blocks.
+def numpy_bands(original_width, original_height):
+    out_height = original_height * 2
+    rows_per_step = 2 * max(1, NUMPY_CHUNK // max(1, original_width))
+    return [(y0, min(out_height, y0 + rows_per_step)) for y0 in range(0, out_height, rows_per_step)]
+
+# The passes of kernel.superxbr_loops() with the same arguments and results, see
+# kernel.PASSES. evaluations, if given, receives the evaluation counts as
+# kernel.add_evaluations() keeps them. arithmetic is one of ARITHMETIC, see above.
+def numpy_pass1(original_pixel_data, original_width, original_height, output_data, progress,
+                evaluations=None, skip_transparent=False, arithmetic=ARITHMETIC):
+    out_height = original_height * 2
+    for y0, y1 in numpy_bands(original_width, original_height):
+        add_evaluations(evaluations, 1,
+                        pass1_rows(original_pixel_data, original_width, original_height, output_data, y0, y1,
+                                   skip_transparent, arithmetic))
+        progress(1, float(y1)/out_height)
+
+# Blocks away from the border are independent of each other; the ones near it depend
+# on the loop order and run afterwards.
+def numpy_pass2(original_pixel_data, original_width, original_height, output_data, progress,
+                evaluations=None, skip_transparent=False, arithmetic=ARITHMETIC):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    for y0, y1 in numpy_bands(original_width, original_height):
+        add_evaluations(evaluations, 2, pass2_interior(output_data, out_width, out_height, y0, y1,
+                                                       skip_transparent, arithmetic))
+        progress(2, float(y1)/out_height)
+    add_evaluations(evaluations, 2, pass2_border(output_data, out_width, out_height, 0, out_height,
+                                                 skip_transparent))
+
+def numpy_pass3(original_pixel_data, original_width, original_height, output_data, progress,
+                evaluations=None, skip_transparent=False, arithmetic=ARITHMETIC):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    wavefronts = pass3_wavefronts(out_width, out_height)
+    for t0 in range(0, wavefronts, out_width):
+        t1 = min(wavefronts, t0 + out_width)
+        add_evaluations(evaluations, 3, pass3_tile(output_data, out_width, out_height, 0, out_height,
+                                                   t0, t1, skip_transparent, arithmetic))
+        progress(3, float(t1)/wavefronts)
+
+PASSES = (numpy_pass1, numpy_pass2, numpy_pass3)
+
+# Scales the packed original pixels by 2 into output_data, which must hold at least
+# (2 * original_width) * (2 * original_height) pixels. Same results as kernel.superxbr_loops().
+# profile, if given, records every pass, see kernel.run_passes().
+def superxbr_numpy(original_pixel_data, original_width, original_height, output_data, progress,
+                   evaluations=None, skip_transparent=False, profile=None):
+    return run_passes(PASSES, original_pixel_data, original_width, original_height, output_data, progress,
+                      evaluations, skip_transparent, profile)
+
+# The engine's 2x scaler, as called by the cascade in cascade.py.
+scale2x = superxbr_numpy
+
+# Wraps a packed pixel NumPy array so that single elements read back as plain Python ints,
+# which keeps the scalar per-pixel functions fast when they run on NumPy data.
+def pixel_buffer(data):
+    return (ctypes.c_uint32.__ctype_le__ * len(data)).from_buffer(data)
+
+# Wraps a shared memory buffer as a NumPy array of packed pixels.
+def pixel_view(buffer, count):
+    return numpy.frombuffer(buffer, dtype=PIXEL_TYPE, count=count)
@@ -0,0 +1,265 @@
+# Multi-core execution of the three passes.
+#
+# The original and output pixels live in shared memory, mapped by the parent and
+# by every worker, so only band coordinates travel between processes. Each pass is
+# split along the dependencies described in kernel.py:
+#
+# - first pass: horizontal bands of blocks, in any order, since every block only
+#   reads the original image.
+# - second pass: the blocks away from the border only read first pass pixels, so
+#   their bands run in any order too. The blocks near the border depend on the
+#   loop order and run afterwards in the parent, one by one.
+# - third pass: the image is cut into horizontal bands, and every band into runs of
+#   wavefronts, which gives tiles slanted like the wavefronts themselves. Tile
+#   (band, run) only reads pixels of its neighbouring bands and runs, so all tiles
+#   with the same band + run can be computed at the same time once every tile with
+#   a smaller band + run is done.
+#
+# Scale factors above 2 repeat all of this for every 2x step of the cascade (see
+# cascade.py), on the same pool and the same two shared step buffers.
+#
+# The result is identical to the serial engines.
+
+import mmap
+import multiprocessing
+import os
+import tempfile
+
+from . import kernel
+from .cascade import buffer_sizes, cascade_steps, step_buffer, step_progress
+from .kernel import add_evaluations, pass3_wavefronts
+from .pixels import as_bytes
+from .profile import PASS_STAGES, stage_end, stage_start
+from .progress import worker_signals
+
+try:
+    from . import fixed_engine, numpy_engine
+except ImportError:
+    fixed_engine = numpy_engine = None
+
+# Tiles per worker and pass. More tiles balance the load better, but each one is
+# a round trip to a worker.
+TILES_PER_WORKER = 2
+
+# Smallest third pass tile: a band must cover the two rows above a pixel, and a run
+# of wavefronts every wavefront a pixel's neighbourhood touches.
+MIN_BAND_ROWS = 2
+MIN_RUN_WAVEFRONTS = 8
+
+# Size in bytes of one packed pixel in the shared buffers.
+PIXEL_BYTES = 4
+
+# Engine module providing the pass range functions for an engine name.
+def engine_module(name):
+    if name == "numpy":
+        return numpy_engine
+    if name == "fixed":
+        return fixed_engine
+    return kernel
+
+# Directory for shared buffers: /dev/shm keeps them in memory where it exists.
+def shared_directory():
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+# A buffer of packed pixels shared between processes: a temporary file that the
+# parent and the workers map into memory. The file goes to directory, or to
+# shared_directory() if that is None.
+class SharedPixels(object):
+
+    def __init__(self, count, directory=None):
+        self.count = count
+        self.size = max(PIXEL_BYTES, count * PIXEL_BYTES)
+        fd, self.path = tempfile.mkstemp(prefix="superxbr-", suffix=".pixels",
+                                         dir=shared_directory() if directory is None else directory)
+        self.file = os.fdopen(fd, "r+b")
+        self.file.truncate(self.size)
+        self.map = mmap.mmap(self.file.fileno(), self.size)
+
+    # What a worker needs to map the buffer itself.
+    def handle(self):
+        return (self.path, self.size, self.count)
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # views of the map are still around, like in the traceback of an exception
+            # that ends a scale; it goes away with them
+            pass
+        self.file.close()
+        os.remove(self.path)
+
+# Maps a shared buffer from its handle. Returns (file, map).
+def open_shared(handle):
+    path, size, count = handle
+    f = open(path, "r+b")
+    return f, mmap.mmap(f.fileno(), size)
+
+# Runs one piece of a pass of a 2x step in a worker process.
+# task is (engine name, pass number, source handle, output handle, step input size, range,
+# skip_transparent). Returns the pass number and the evaluation counts of the piece.
+def run_task(task):
+    engine_name, pass_number, source, output, dimensions, bounds, skip_transparent = task
+    original_width, original_height = dimensions
+    out_width = original_width * 2
+    out_height = original_height * 2
+    module = engine_module(engine_name)
+
+    opened = [open_shared(output)]
+    if pass_number == 1:
+        opened.append(open_shared(source))
+    try:
+        output_data = module.pixel_view(opened[0][1], output[2])
+        if pass_number == 1:
+            original_pixel_data = module.pixel_view(opened[1][1], source[2])
+            counts = module.pass1_rows(original_pixel_data, original_width, original_height, output_data,
+                                       *bounds, skip_transparent=skip_transparent)
+            del original_pixel_data
+        elif pass_number == 2:
+            counts = module.pass2_interior(output_data, out_width, out_height, *bounds,
+                                           skip_transparent=skip_transparent)
+        else:
+            counts = module.pass3_tile(output_data, out_width, out_height, *bounds,
+                                       skip_transparent=skip_transparent)
+        # the views must go before the maps can be closed
+        del output_data
+    finally:
+        for f, shared_map in opened:
+            shared_map.close()
+            f.close()
+    return pass_number, counts
+
+# Splits the output rows into bands of whole blocks, about count bands in total.
+def block_bands(out_height, count):
+    rows = max(2, -(-out_height // count))
+    rows += rows % 2
+    return [(y0, min(out_height, y0 + rows)) for y0 in range(0, out_height, rows)]
+
+# Third pass tiles grouped by band + run, in the order the groups must run.
+# Every tile is (ry0, ry1, t0, t1) as taken by pass3_tile(). Empty tiles are dropped.
+def pass3_tile_groups(out_width, out_height, count):
+    wavefronts = pass3_wavefronts(out_width, out_height)
+    band_rows = max(MIN_BAND_ROWS, -(-out_height // count))
+    run_length = max(MIN_RUN_WAVEFRONTS, -(-wavefronts // count))
+    bands = [(ry0, min(out_height, ry0 + band_rows)) for ry0 in range(0, out_height, band_rows)]
+    runs = [(t0, min(wavefronts, t0 + run_length)) for t0 in range(0, wavefronts, run_length)]
+
+    groups = [[] for _ in range(len(bands) + len(runs) - 1)]
+    for j, (ry0, ry1) in enumerate(bands):
+        for c, (t0, t1) in enumerate(runs):
+            # the band's pixels span wavefronts 3 * ry0 to 3 * (ry1 - 1) + out_width - 1
+            if t0 <= 3 * (ry1 - 1) + out_width - 1 and t1 > 3 * ry0:
+                groups[j + c].append((ry0, ry1, t0, t1))
+    return [group for group in groups if group]
+
+# Number of worker processes to use for a requested count; 0 or None means one per CPU.
+def worker_count(workers):
+    if not workers:
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+    return workers
+
+# Runs one 2x step on the pool: source holds original_width * original_height pixels,
+# output receives the scaled ones. progress is called as progress(pass_number, fraction).
+# evaluations, if given, receives the evaluation counts, see kernel.add_evaluations().
+# skip_transparent is described in kernel.py. profile, if given, records every
+# pass, see profile.py.
+def parallel_step(pool, engine_name, source, output, original_width, original_height, workers, progress,
+                  evaluations=None, skip_transparent=False, profile=None):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    module = engine_module(engine_name)
+    dimensions = (original_width, original_height)
+
+    def tasks(pass_number, ranges):
+        return [(engine_name, pass_number, source.handle(), output.handle(), dimensions, bounds,
+                 skip_transparent) for bounds in ranges]
+
+    bands = block_bands(out_height, workers * TILES_PER_WORKER)
+    for pass_number in (1, 2):
+        start = stage_start(profile)
+        done = 0
+        for result in pool.imap_unordered(run_task, tasks(pass_number, bands)):
+            add_evaluations(evaluations, *result)
+            done += 1
+            progress(pass_number, float(done)/len(bands))
+        if pass_number == 2:
+            output_data = module.pixel_view(output.map, output.count)
+            add_evaluations(evaluations, 2, module.pass2_border(output_data, out_width, out_height, 0,
+                                                                out_height, skip_transparent))
+            del output_data
+        stage_end(profile, start, PASS_STAGES[pass_number], out_width * out_height)
+
+    start = stage_start(profile)
+    groups = pass3_tile_groups(out_width, out_height, workers * TILES_PER_WORKER)
+    for i, group in enumerate(groups):
+        for result in pool.map(run_task, tasks(3, group)):
+            add_evaluations(evaluations, *result)
+        progress(3, float(i + 1)/len(groups))
+    stage_end(profile, start, PASS_STAGES[3], out_width * out_height)
+
+# Runs the cascade of 2x steps on a pool of worker processes, from the packed pixels
+# in the SharedPixels source into the large and the small step buffer, buffers (see
+# cascade.py); the result ends up in the large one. The other arguments are as for
+# superxbr_parallel().
+def parallel_cascade(source, buffers, original_width, original_height, scale_factor, progress, workers,
+                     engine_name, evaluations=None, skip_transparent=False, profile=None):
+    steps = cascade_steps(scale_factor)
+    pool = multiprocessing.Pool(workers, worker_signals)
+    try:
+        step_source = source
+        width = original_width
+        height = original_height
+        for step in range(steps):
+            output = buffers[step_buffer(step, steps)]
+            parallel_step(pool, engine_name, step_source, output, width, height, workers,
+                          step_progress(progress, step + 1, steps), evaluations, skip_transparent, profile)
+            step_source = output
+            width *= 2
+            height *= 2
+
+        pool.close()
+        pool.join()
+        pool = None
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+# Runs the cascade of 2x steps on a pool of worker processes. Takes RGBA bytes and
+# returns the scaled RGBA bytes; engine_name picks the engine the workers run.
+# progress is called as progress(step, steps, pass_number, fraction). profile, if
+# given, records the stages as core.scale() does; the passes' stages take the wall
+# time of all workers together.
+def superxbr_parallel(pixels, original_width, original_height, scale_factor, progress,
+                      workers=None, engine_name="python", evaluations=None, skip_transparent=False,
+                      profile=None):
+    workers = worker_count(workers)
+    final = original_width * original_height * scale_factor * scale_factor
+
+    start = stage_start(profile)
+    sizes = buffer_sizes(final, cascade_steps(scale_factor))
+    source = SharedPixels(original_width * original_height)
+    buffers = [SharedPixels(size) for size in sizes]
+    stage_end(profile, start, "allocate", sum(sizes), sum(sizes) * PIXEL_BYTES)
+    try:
+        # RGBA bytes are the packed pixels already, see pixels.py
+        start = stage_start(profile)
+        source.map[:len(pixels)] = as_bytes(pixels)
+        stage_end(profile, start, "to pixels", original_width * original_height, len(pixels))
+
+        parallel_cascade(source, buffers, original_width, original_height, scale_factor, progress, workers,
+                         engine_name, evaluations, skip_transparent, profile)
+
+        start = stage_start(profile)
+        result = buffers[0].map[:final * PIXEL_BYTES]
+        stage_end(profile, start, "to bytes", final, len(result))
+    finally:
+        source.close()
+        for shared in buffers:
+            shared.close()
+    return result
@@ -0,0 +1,71 @@
+# Conversions between the RGB(A) bytes of GIMP pixel regions and PNG files and the
+# packed pixels the engines work on, without a Python loop over the pixels.
+#
+# A packed pixel is an unsigned 32 bit integer holding one RGBA pixel:
+#
+#   (alpha << 24) + (blue << 16) + (green << 8) + red
+#
+# Stored little-endian, that is byte for byte the RGBA pixel itself, so RGBA bytes
+# become packed pixels by reinterpreting the buffer, and packed pixels become RGBA
+# bytes by taking their memory as it is. RGB bytes, formatted like
+#
+# Indices: 0   1   2  |  3   4   5  |  6
+# Values:  235 127 0  |  221 67  95 |  ...
+#
+# first get an alpha of 255 for every pixel, in one pass over the whole buffer.
+
+from array import array
+import sys
+
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+# RGBA bytes for a buffer of RGB bytes, with every alpha set to 255.
+def rgb_to_rgba(data):
+    count = len(data) // 3
+    rgba = bytearray(b"\xff") * (count * 4)
+    for c in range(3):
+        rgba[c::4] = data[c::3]
+    return rgba
+
+# RGB bytes for a buffer of RGBA bytes, dropping the alpha.
+def rgba_to_rgb(data):
+    rgb = bytearray(len(data) // 4 * 3)
+    for c in range(3):
+        rgb[c::3] = data[c::4]
+    return rgb
+
+# Raw bytes of a bytes object, bytearray or array.array, on both Python 2 and 3.
+def as_bytes(data):
+    if isinstance(data, bytes):
+        return data
+    if hasattr(data, "tobytes"):
+        return data.tobytes()
+    if hasattr(data, "tostring"):
+        return data.tostring()
+    return bytes(data)
+
+# Packed pixels, as an array of unsigned 32 bit integers, for RGBA bytes.
+def packed_array(data):
+    pixels = array("I")
+    if hasattr(pixels, "frombytes"):
+        pixels.frombytes(data)
+    else:
+        # Python 2 only reads strings and read-only buffers
+        pixels.fromstring(data if isinstance(data, (str, array)) else buffer(data))
+    if not LITTLE_ENDIAN:
+        pixels.byteswap()
+    return pixels
+
+# RGBA bytes of count packed pixels of an array, starting at pixel start.
+def packed_array_bytes(pixels, start, count):
+    if not LITTLE_ENDIAN:
+        pixels = pixels[start:start + count]
+        pixels.byteswap()
+        return as_bytes(pixels)
+    if start == 0 and count == len(pixels):
+        return as_bytes(pixels)
+    try:
+        return memoryview(pixels)[start:start + count].tobytes()
+    except TypeError:
+        # arrays of Python 2 have no memoryview
+        return as_bytes(pixels[start:start + count])
@@ -0,0 +1,255 @@
+# Minimal PNG reader and writer for the command line tool, built on zlib only so
+# that batch scaling needs nothing beyond the Python standard library.
+#
+# Reads non-interlaced greyscale, RGB, palette, greyscale+alpha and RGBA images
+# at any bit depth, and always hands back 8-bit RGBA. Writes 8-bit RGBA.
+
+from array import array
+import struct
+import zlib
+
+from .pixels import as_bytes
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Channels per pixel for each PNG colour type.
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Bit depths the PNG specification allows for each colour type.
+BIT_DEPTHS = {0: (1, 2, 4, 8, 16), 2: (8, 16), 3: (1, 2, 4, 8), 4: (8, 16), 6: (8, 16)}
+
+class PNGError(Exception):
+    pass
+
+# Splits a PNG file into (chunk type, chunk data) pairs.
+def read_chunks(data):
+    if data[:8] != PNG_SIGNATURE:
+        raise PNGError("not a PNG file")
+    position = 8
+    while position + 8 <= len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        chunk_data = data[position + 8:position + 8 + length]
+        if len(chunk_data) != length:
+            raise PNGError("truncated %s chunk" % chunk_type.decode("latin-1"))
+        yield chunk_type, chunk_data
+        position += 12 + length
+
+# Paeth predictor from the PNG specification.
+def paeth(a, b, c):
+    p = a + b - c
+    pa = abs(p - a)
+    pb = abs(p - b)
+    pc = abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+# Undoes the per-row filters. Returns the raw scanlines as one array of bytes.
+def unfilter(raw, row_bytes, height, bpp):
+    out = array("B", [0]) * (row_bytes * height)
+    previous = array("B", [0]) * row_bytes
+    position = 0
+    for y in range(height):
+        filter_type = raw[position]
+        row = array("B", raw[position + 1:position + 1 + row_bytes])
+        position += 1 + row_bytes
+        if filter_type == 1:
+            for i in range(bpp, row_bytes):
+                row[i] = (row[i] + row[i - bpp]) & 0xFF
+        elif filter_type == 2:
+            for i in range(row_bytes):
+                row[i] = (row[i] + previous[i]) & 0xFF
+        elif filter_type == 3:
+            for i in range(row_bytes):
+                left = row[i - bpp] if i >= bpp else 0
+                row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xFF
+        elif filter_type == 4:
+            for i in range(row_bytes):
+                if i >= bpp:
+                    row[i] = (row[i] + paeth(row[i - bpp], previous[i], previous[i - bpp])) & 0xFF
+                else:
+                    row[i] = (row[i] + previous[i]) & 0xFF
+        elif filter_type != 0:
+            raise PNGError("unknown filter type %d" % filter_type)
+        out[y * row_bytes:(y + 1) * row_bytes] = row
+        previous = row
+    return out
+
+# Expands one scanline into a list of sample values, one per channel per pixel, at
+# the image's bit depth.
+def row_samples(row, width, channels, bit_depth):
+    count = width * channels
+    if bit_depth == 8:
+        return list(row[:count])
+    if bit_depth == 16:
+        return [(high << 8) | low for high, low in zip(row[0:count * 2:2], row[1:count * 2:2])]
+    per_byte = 8 // bit_depth
+    mask = (1 << bit_depth) - 1
+    samples = []
+    for i in range(count):
+        byte = row[i // per_byte]
+        shift = 8 - bit_depth * (i % per_byte + 1)
+        samples.append((byte >> shift) & mask)
+    return samples
+
+# The fields of an IHDR chunk: width, height, bit depth, colour type, compression
+# method, filter method and interlace method.
+def parse_header(chunk_data):
+    if len(chunk_data) != 13:
+        raise PNGError("IHDR chunk of %d bytes instead of 13" % len(chunk_data))
+    return struct.unpack(">IIBBBBB", chunk_data)
+
+# (width, height) of a PNG file, from its header alone: the signature and the IHDR
+# chunk, which comes first.
+def png_size(path):
+    with open(path, "rb") as f:
+        data = f.read(len(PNG_SIGNATURE) + 25)
+    for chunk_type, chunk_data in read_chunks(data):
+        if chunk_type == b"IHDR":
+            return parse_header(chunk_data)[:2]
+        break
+    raise PNGError("missing IHDR chunk")
+
+# Reads a PNG file. Returns (width, height, pixels) where pixels is an RGBA byte array.
+# Raises PNGError for files it cannot read, damaged ones included.
+def read_png(path):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    header = None
+    palette = None
+    transparency = None
+    compressed = []
+    for chunk_type, chunk_data in read_chunks(data):
+        if chunk_type == b"IHDR":
+            header = parse_header(chunk_data)
+        elif chunk_type == b"PLTE":
+            palette = array("B", chunk_data)
+        elif chunk_type == b"tRNS":
+            transparency = array("B", chunk_data)
+        elif chunk_type == b"IDAT":
+            compressed.append(chunk_data)
+        elif chunk_type == b"IEND":
+            break
+    if header is None:
+        raise PNGError("missing IHDR chunk")
+
+    width, height, bit_depth, colour_type, _, _, interlace = header
+    if width == 0 or height == 0:
+        raise PNGError("empty %dx%d image" % (width, height))
+    if colour_type not in CHANNELS:
+        raise PNGError("unsupported colour type %d" % colour_type)
+    if bit_depth not in BIT_DEPTHS[colour_type]:
+        raise PNGError("bit depth %d not allowed for colour type %d" % (bit_depth, colour_type))
+    if interlace != 0:
+        raise PNGError("interlaced PNGs are not supported")
+    if colour_type == 3 and palette is None:
+        raise PNGError("palette image without PLTE chunk")
+
+    channels = CHANNELS[colour_type]
+    bpp = max(1, channels * bit_depth // 8)
+    row_bytes = (width * channels * bit_depth + 7) // 8
+    try:
+        raw = array("B", zlib.decompress(b"".join(compressed)))
+    except zlib.error as e:
+        raise PNGError("damaged image data: %s" % e)
+    if len(raw) < (row_bytes + 1) * height:
+        raise PNGError("image data for %d of %d rows" % (len(raw) // (row_bytes + 1), height))
+    scanlines = unfilter(raw, row_bytes, height, bpp)
+
+    # greyscale samples below 8 bits are scaled up to the full 0-255 range, and
+    # 16-bit samples keep their most significant byte
+    grey_scale = 255 // ((1 << bit_depth) - 1) if bit_depth < 8 else 1
+    shift = 8 if bit_depth == 16 else 0
+    # tRNS colour key for greyscale and RGB images, compared with the samples at the
+    # original bit depth, before they are reduced to 8 bits
+    key = None
+    if transparency is not None and colour_type in (0, 2):
+        key = tuple((transparency[i] << 8) | transparency[i + 1] for i in range(0, len(transparency) - 1, 2))
+
+    pixels = array("B", [0]) * (width * height * 4)
+    out = 0
+    for y in range(height):
+        samples = row_samples(scanlines[y * row_bytes:(y + 1) * row_bytes], width, channels, bit_depth)
+        for x in range(width):
+            s = samples[x * channels:(x + 1) * channels]
+            if colour_type == 3:
+                index = s[0]
+                if index * 3 + 3 > len(palette):
+                    raise PNGError("palette index %d past the %d colours of PLTE" % (index, len(palette) // 3))
+                r, g, b = palette[index * 3:index * 3 + 3]
+                a = transparency[index] if transparency is not None and index < len(transparency) else 255
+            elif colour_type in (0, 4):
+                r = g = b = (s[0] >> shift) * grey_scale
+                a = s[1] >> shift if colour_type == 4 else 255
+                if key is not None and (s[0],) == key:
+                    a = 0
+            else:
+                r, g, b = s[0] >> shift, s[1] >> shift, s[2] >> shift
+                a = s[3] >> shift if colour_type == 6 else 255
+                if key is not None and tuple(s[0:3]) == key:
+                    a = 0
+            pixels[out] = r
+            pixels[out + 1] = g
+            pixels[out + 2] = b
+            pixels[out + 3] = a
+            out += 4
+    return width, height, pixels
+
+def write_chunk(f, chunk_type, data):
+    f.write(struct.pack(">I", len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+# Writes RGBA bytes of width * height pixels as an 8-bit RGBA PNG.
+def write_png(path, width, height, pixels, compression=6):
+    pixels = as_bytes(pixels)
+    row_bytes = width * 4
+    write_png_rows(path, width, height,
+                   (pixels[y * row_bytes:(y + 1) * row_bytes] for y in range(height)), compression)
+
+# Row store (see stream.py) writing an 8-bit RGBA PNG of width * height pixels to
+# path, which takes the rows in order from the top and compresses them as they come,
+# so the whole image never has to be in memory. finish() ends the image once every
+# row is written, and close() closes the file, finished or not.
+class PNGRows(object):
+
+    def __init__(self, path, width, height, compression=6):
+        self.row_bytes = width * 4
+        self.next_row = 0
+        self.compressor = zlib.compressobj(compression)
+        self.file = open(path, "wb")
+        self.file.write(PNG_SIGNATURE)
+        write_chunk(self.file, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def write(self, y0, data):
+        if y0 != self.next_row:
+            raise ValueError("PNG rows written out of order: row %d after row %d" % (y0, self.next_row - 1))
+        data = as_bytes(data)
+        for start in range(0, len(data), self.row_bytes):
+            # filter type 0 (none) in front of every scanline
+            compressed = self.compressor.compress(b"\x00" + data[start:start + self.row_bytes])
+            if compressed:
+                write_chunk(self.file, b"IDAT", compressed)
+        self.next_row += len(data) // self.row_bytes
+
+    def finish(self):
+        write_chunk(self.file, b"IDAT", self.compressor.flush())
+        write_chunk(self.file, b"IEND", b"")
+
+    def close(self):
+        self.file.close()
+
+# Writes an 8-bit RGBA PNG from an iterable of height rows of RGBA bytes, compressing
+# them as they come, so the whole image never has to be in memory.
+def write_png_rows(path, width, height, rows, compression=6):
+    png = PNGRows(path, width, height, compression)
+    try:
+        for y, row in enumerate(rows):
+            png.write(y, row)
+        png.finish()
+    finally:
+        png.close()
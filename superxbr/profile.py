@@ -0,0 +1,108 @@
+# Profiling hooks: where the time of a scale goes, stage by stage.
+#
+# The scaling functions take a profile argument like they take evaluations: None,
+# the default, records nothing, and every hook then costs a function call that
+# returns at once, a few times per pass. Given a Profile, every stage records its
+# wall time, the pixels it covered and the bytes of pixel data it produced, summed
+# over the 2x steps and bands, and optionally the memory it allocated at its peak.
+#
+# The stages are the conversions to and from packed pixels (see pixels.py), the
+# allocation of the step buffers, the three passes, the incremental updates of
+# incremental.py, cache lookups and stores, and, in the GIMP plugin, reading and
+# writing the pixel regions and flattening the image.
+
+import json
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2: no allocation tracing
+    tracemalloc = None
+
+# Wall time clock, as precise as the platform offers.
+clock = getattr(time, "perf_counter", time.time)
+
+# Stage names of the passes, by pass number.
+PASS_STAGES = {1: "first pass", 2: "second pass", 3: "third pass"}
+
+# True if this Python can trace the peak allocation of every stage on its own.
+def can_trace_memory():
+    return tracemalloc is not None and hasattr(tracemalloc, "reset_peak")
+
+# Stage records of one scale, or several, in the order the stages first ran.
+# info holds anything worth reporting along with them (image size, engine, ...).
+# With memory, allocations are traced with tracemalloc, and every stage records
+# the most memory Python had allocated above its start at any point during it; this
+# slows the scale down considerably and needs Python 3.9 or later.
+class Profile(object):
+
+    def __init__(self, memory=False, **info):
+        self.stages = []
+        self.by_name = {}
+        self.info = info
+        self.memory = memory and can_trace_memory()
+        self.tracing = self.memory and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        self.start_time = clock()
+        self.end_time = None
+
+    # Adds a stage run to the record of the stage.
+    def record(self, name, seconds, pixels=0, data_bytes=0, allocated=None):
+        stage = self.by_name.get(name)
+        if stage is None:
+            stage = self.by_name[name] = {"stage": name, "calls": 0, "seconds": 0.0, "pixels": 0, "bytes": 0,
+                                          "allocated": None}
+            self.stages.append(stage)
+        stage["calls"] += 1
+        stage["seconds"] += seconds
+        stage["pixels"] += pixels
+        stage["bytes"] += data_bytes
+        if allocated is not None:
+            stage["allocated"] = max(stage["allocated"] or 0, allocated)
+
+    # Ends the profile: its total time stops, and tracing allocations too, if this
+    # profile started it.
+    def close(self):
+        if self.end_time is None:
+            self.end_time = clock()
+        if self.tracing:
+            tracemalloc.stop()
+        self.memory = self.tracing = False
+
+    # The report as a dict: info, the stages, and the wall time from making the
+    # profile to closing it (or to now) and the part of it the stages account for.
+    def report(self):
+        return {"info": self.info,
+                "stages": [dict(stage, pixels_per_second=stage["pixels"] / stage["seconds"]
+                                if stage["seconds"] else None) for stage in self.stages],
+                "stage_seconds": sum(stage["seconds"] for stage in self.stages),
+                "total_seconds": (self.end_time or clock()) - self.start_time}
+
+# Writes a report from Profile.report(), or a list of them, to a file as JSON.
+def write_report(path, report):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+# Starts timing a stage. Returns what stage_end() takes, or None if profile is None.
+def stage_start(profile):
+    if profile is None:
+        return None
+    if profile.memory:
+        tracemalloc.reset_peak()
+        return clock(), tracemalloc.get_traced_memory()[0]
+    return clock(), None
+
+# Ends a stage started with stage_start() and records it in profile, with the number
+# of pixels it covered and the bytes of pixel data it produced. Does nothing if
+# profile is None.
+def stage_end(profile, start, name, pixels=0, data_bytes=0):
+    if profile is None:
+        return
+    seconds = clock() - start[0]
+    allocated = None
+    if start[1] is not None:
+        allocated = tracemalloc.get_traced_memory()[1] - start[1]
+    profile.record(name, seconds, pixels, data_bytes, allocated)
@@ -0,0 +1,180 @@
+# Progress reporting and cancellation for front ends with a progress bar.
+#
+# The scalers report progress(step, steps, pass_number, fraction) after every band
+# of rows they finish (every row, for the reference loops): the fraction of one pass
+# of one 2x step. That is far too often to pass on to a progress bar that costs a
+# round trip to another process per update, like GIMP's, and the fraction starts
+# over with every pass. ThrottledProgress turns these calls into a single fraction
+# for the whole scale, weighting every pass by roughly how long it takes, and
+# passes it on at most UPDATES_PER_SECOND times a second.
+#
+# A ThrottledProgress also carries a Cancel: once it is cancelled, the next call of
+# the progress callback raises Cancelled, which stops the scale between two bands
+# and unwinds through the scalers, which free their buffers, worker processes and
+# temporary files on the way.
+
+import binascii
+from contextlib import contextmanager
+import os
+import signal
+
+from .profile import clock
+
+UPDATES_PER_SECOND = 20
+
+# Rough relative time of the three passes of a 2x step, by pass number. The second
+# and third passes sample more neighbours per pixel than the first; the benchmarks
+# (see benchmarks/bench.py) put them at about two and four times its time.
+PASS_WEIGHTS = {1: 1.0, 2: 2.0, 3: 4.0}
+
+class Cancelled(Exception):
+    pass
+
+# Contents of the cancel file at path, or None if there is none.
+def cancel_token(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+# Writes a new cancel file at path, which cancels every Cancel for that path made
+# before it (see below). Its contents are unique to every request.
+def request_cancel(path):
+    with open(path, "wb") as f:
+        f.write(binascii.hexlify(os.urandom(16)))
+
+# Cancellation of a running scale. cancel() may be called from a signal handler, or
+# another process may write the cancel file at path, if given, with request_cancel();
+# either cancels the scale at its next progress update. The file is never removed,
+# so that one request cancels every scale looking for it; a Cancel notes what the
+# file holds when it is made, and only a file written after that cancels it, so a
+# file left over from before does not cancel the next scale, and starting one scale
+# does not undo a request made for another one already running.
+class Cancel(object):
+
+    def __init__(self, path=None):
+        self.path = path
+        self.cancelled = False
+        self.token = None if path is None else cancel_token(path)
+
+    def cancel(self):
+        self.cancelled = True
+
+    # Looks for a cancel file written since the Cancel was made.
+    def poll(self):
+        if self.path is not None and os.path.exists(self.path) and cancel_token(self.path) != self.token:
+            self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled("scale cancelled")
+
+# Signal handlers cancel_on_signals() replaced, by signal number, while it is in effect.
+replaced_handlers = {}
+
+# Cancels cancel on SIGINT and SIGTERM while the with block runs, instead of
+# interrupting whatever runs at the time. Signal handlers can only be set from the
+# main thread; elsewhere signals are left alone. Worker processes forked meanwhile
+# must start with worker_signals(), see there.
+@contextmanager
+def cancel_on_signals(cancel):
+    previous = {}
+    try:
+        for name in ("SIGINT", "SIGTERM"):
+            number = getattr(signal, name, None)
+            if number is not None:
+                try:
+                    previous[number] = signal.signal(number, lambda signum, frame: cancel.cancel())
+                except ValueError:
+                    break
+        replaced_handlers.update(previous)
+        yield cancel
+    finally:
+        for number, handler in previous.items():
+            signal.signal(number, handler)
+            del replaced_handlers[number]
+
+# Initializer of worker pools: puts back the signal handlers cancel_on_signals()
+# replaced in the process the workers were forked from. A worker blocked waiting
+# for its next task never gets to run the Python handler it inherits, so it would
+# ignore the SIGTERM that terminating the pool sends it.
+def worker_signals():
+    for number, handler in replaced_handlers.items():
+        signal.signal(number, handler)
+
+# Fraction of a whole scale done when pass_number of 2x step step (counting from 1)
+# out of steps is fraction done. Every step has four times the output pixels of the
+# one before, and takes about four times as long.
+def scale_fraction(step, steps, pass_number, fraction):
+    total = (4 ** steps - 1) / 3.0
+    done = (4 ** (step - 1) - 1) / 3.0
+    passes = sum(PASS_WEIGHTS.values())
+    before = sum(PASS_WEIGHTS[n] for n in PASS_WEIGHTS if n < pass_number)
+    return (done + 4 ** (step - 1) * (before + PASS_WEIGHTS[pass_number] * fraction) / passes) / total
+
+# Reports fraction of several passes that run together, like the first two passes
+# of the streaming scaler, as progress(pass_number, fraction) of the one of them it
+# reaches into, so that weighting the passes gives the fraction of all of them.
+def report_passes(progress, pass_numbers, fraction):
+    weight = sum(PASS_WEIGHTS[n] for n in pass_numbers) * fraction
+    for pass_number in pass_numbers[:-1]:
+        if weight < PASS_WEIGHTS[pass_number]:
+            break
+        weight -= PASS_WEIGHTS[pass_number]
+    else:
+        pass_number = pass_numbers[-1]
+    progress(pass_number, min(1.0, weight / PASS_WEIGHTS[pass_number]))
+
+# Progress callback that passes a fraction of the whole work on to update(fraction),
+# at most UPDATES_PER_SECOND times a second and never backwards, and raises
+# Cancelled once cancel, if given, is cancelled. Call it with the fraction of the
+# work done, or use its scale() method as the progress callback of the scalers.
+# start and share map the fractions it is called with onto a part of the bar, for
+# work made of several scales: part() makes such a callback that shares this one's
+# update rate and cancellation.
+class ThrottledProgress(object):
+
+    def __init__(self, update, cancel=None, start=0.0, share=1.0, parent=None):
+        self.update = update
+        self.cancel = cancel
+        self.start = start
+        self.share = share
+        self.parent = parent
+        self.interval = 1.0 / UPDATES_PER_SECOND
+        self.last_time = None
+        self.last_fraction = -1.0
+
+    def __call__(self, fraction):
+        fraction = self.start + self.share * fraction
+        if self.parent is not None:
+            self.parent.report(fraction)
+        else:
+            self.report(fraction)
+
+    # The cancel file is looked for at the rate of the updates even while the fraction
+    # stands still, as it does when an incremental update starts over for another
+    # group of rows (see incremental.py).
+    def report(self, fraction):
+        cancel = self.cancel
+        if cancel is not None:
+            cancel.check()
+        now = clock()
+        if self.last_time is not None and now - self.last_time < self.interval and fraction < 1.0:
+            return
+        if cancel is not None:
+            cancel.poll()
+            cancel.check()
+        self.last_time = now
+        if fraction > self.last_fraction:
+            self.last_fraction = fraction
+            self.update(fraction)
+
+    def scale(self, step, steps, pass_number, fraction):
+        self(scale_fraction(step, steps, pass_number, fraction))
+
+    # Callback for the part of the bar from start to start + share, in this one's
+    # fractions.
+    def part(self, start, share):
+        return ThrottledProgress(self.update, self.cancel, self.start + self.share * start, self.share * share,
+                                 self.parent or self)
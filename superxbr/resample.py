@@ -0,0 +1,248 @@
+# Output sizes that are not a power of 2 times the original: 3x, 6x, or an exact
+# width and height. Super-xBR only scales by 2, so such a resize runs the smallest
+# cascade (see cascade.py) whose output covers the target size, and brings that
+# down to the exact size with an area filter: every output pixel is the average of
+# the scaled pixels it covers, partly covered ones weighted by how much of them it
+# covers. The filter is separable, rows first and then columns, with the weights of
+# every output column and row computed once per resize into tables of taps.
+#
+# The weights are integers summing to WEIGHT_ONE and the sums are rounded once, at
+# the end, so the result is the same exact integers whether NumPy filters whole
+# bands of rows at once or the plain Python loops filter one pixel at a time. The
+# channels are averaged the way the passes blend them, alpha included, without
+# premultiplying.
+#
+# The filter is a row store (see stream.py) that takes the scaled rows in order and
+# passes the filtered rows on as soon as all the rows they cover have come in, so
+# the oversized image is only ever held once: in memory as scale() returns it, in
+# the scratch files of mapped.py, or in the temporary file of the streaming scaler.
+
+from .core import engine_name, peak_memory, scale
+from .mapped import mapped_memory, scale_mapped
+from .pixels import rgb_to_rgba
+from .profile import stage_end, stage_start
+from .stream import BAND_ROWS, BufferRows, FileRows, scale_stream, stream_memory
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+WEIGHT_BITS = 16
+WEIGHT_ONE = 1 << WEIGHT_BITS
+
+# Half of the product of a column and a row weight, for rounding.
+ROUNDING = 1 << (2 * WEIGHT_BITS - 1)
+
+# Scaled rows the filter takes on at once; bounds its temporary arrays.
+FILTER_ROWS = 64
+
+# Smallest scale factor, a power of 2 or 1, that scales width * height pixels to at
+# least out_width * out_height.
+def cover_factor(width, height, out_width, out_height):
+    factor = 1
+    while width * factor < out_width or height * factor < out_height:
+        factor *= 2
+    return factor
+
+# Taps of the area filter from size pixels to out_size along one axis, as (indices,
+# weights): for every output pixel, the indices of the pixels it covers and their
+# integer weights, which sum to WEIGHT_ONE, padded to the same number of taps with
+# weights of 0. Output pixel i covers pixels i * size / out_size to
+# (i + 1) * size / out_size; in units of 1 / out_size all of this is integers, and
+# the weights are the differences of the rounded running totals of the coverage,
+# so they add up exactly.
+def weight_table(size, out_size):
+    indices = []
+    weights = []
+    for i in range(out_size):
+        low = i * size
+        high = low + size
+        covered = 0
+        rounded = 0
+        taps = []
+        tap_weights = []
+        for j in range(low // out_size, (high - 1) // out_size + 1):
+            covered += min(high, (j + 1) * out_size) - max(low, j * out_size)
+            total = (covered * WEIGHT_ONE + size // 2) // size
+            taps.append(j)
+            tap_weights.append(total - rounded)
+            rounded = total
+        indices.append(taps)
+        weights.append(tap_weights)
+    count = max(len(taps) for taps in indices) if indices else 0
+    for taps, tap_weights in zip(indices, weights):
+        tap_weights.extend([0] * (count - len(taps)))
+        taps.extend([taps[-1]] * (count - len(taps)))
+    return indices, weights
+
+# Row store that resizes the RGBA rows of a width * height image written to it, in
+# order from the top, to out_width * out_height, and writes the resized rows to the
+# row store destination as soon as they are complete. engine picks NumPy or the
+# plain Python loops ("python"), with the same result.
+class DownsampleRows(object):
+
+    def __init__(self, destination, width, height, out_width, out_height, engine="auto"):
+        self.destination = destination
+        self.width = width
+        self.out_width = out_width
+        self.out_height = out_height
+        self.vectorized = numpy is not None and engine_name(engine) != "python"
+        self.columns = weight_table(width, out_width)
+        self.rows = weight_table(height, out_height)
+        if self.vectorized:
+            self.columns = [numpy.array(table, dtype=numpy.int32) for table in self.columns]
+            self.kept = numpy.zeros((0, out_width, 4), dtype=numpy.int32)
+        else:
+            self.kept = []
+        # rows written so far, the first of them kept (resampled to out_width
+        # columns), and the next output row
+        self.next_row = 0
+        self.first_kept = 0
+        self.next_out = 0
+
+    def write(self, y0, data):
+        if y0 != self.next_row:
+            raise ValueError("rows to resize written out of order: row %d after row %d" % (y0, self.next_row - 1))
+        row_bytes = self.width * 4
+        for start in range(0, len(data), FILTER_ROWS * row_bytes):
+            chunk = data[start:start + FILTER_ROWS * row_bytes]
+            if self.vectorized:
+                self.kept = numpy.concatenate((self.kept, self.filter_columns_numpy(chunk)))
+            else:
+                self.kept.extend(self.filter_columns_python(chunk))
+            self.next_row += len(chunk) // row_bytes
+            self.flush()
+
+    # Writes the output rows whose taps have all come in, and drops the rows no
+    # output row needs any more.
+    def flush(self):
+        indices = self.rows[0]
+        end = self.next_out
+        while end < self.out_height and indices[end][-1] < self.next_row:
+            end += 1
+        if end == self.next_out:
+            return
+        if self.vectorized:
+            data = self.filter_rows_numpy(self.next_out, end)
+        else:
+            data = self.filter_rows_python(self.next_out, end)
+        self.destination.write(self.next_out, data)
+        self.next_out = end
+        if end < self.out_height:
+            drop = indices[end][0] - self.first_kept
+            self.kept = self.kept[drop:]
+            self.first_kept += drop
+
+    # Rows of RGBA bytes resampled to out_width columns: sums of the channels times
+    # the column weights, as an int32 array of rows * out_width * 4 or a list of lists.
+    def filter_columns_numpy(self, chunk):
+        pixels = numpy.frombuffer(chunk, dtype=numpy.uint8).reshape(-1, self.width, 4)
+        indices, weights = self.columns
+        sums = numpy.zeros((pixels.shape[0], self.out_width, 4), dtype=numpy.int32)
+        for tap in range(indices.shape[1]):
+            sums += pixels[:, indices[:, tap], :] * weights[:, tap, None]
+        return sums
+
+    def filter_columns_python(self, chunk):
+        chunk = bytearray(chunk)
+        row_bytes = self.width * 4
+        taps = list(zip(*self.columns))
+        rows = []
+        for start in range(0, len(chunk), row_bytes):
+            row = chunk[start:start + row_bytes]
+            sums = []
+            for indices, weights in taps:
+                for c in range(4):
+                    sums.append(sum(weight * row[4 * i + c] for i, weight in zip(indices, weights)))
+            rows.append(sums)
+        return rows
+
+    # Output rows out0 to out1 from the kept rows, as RGBA bytes.
+    def filter_rows_numpy(self, out0, out1):
+        indices = numpy.array(self.rows[0][out0:out1], dtype=numpy.intp) - self.first_kept
+        weights = numpy.array(self.rows[1][out0:out1], dtype=numpy.int64)
+        sums = numpy.zeros((out1 - out0, self.out_width, 4), dtype=numpy.int64)
+        for tap in range(indices.shape[1]):
+            sums += self.kept[indices[:, tap]] * weights[:, tap, None, None]
+        return ((sums + ROUNDING) >> (2 * WEIGHT_BITS)).astype(numpy.uint8).tobytes()
+
+    def filter_rows_python(self, out0, out1):
+        data = bytearray()
+        for indices, weights in zip(self.rows[0][out0:out1], self.rows[1][out0:out1]):
+            rows = [(self.kept[i - self.first_kept], weight) for i, weight in zip(indices, weights)]
+            data.extend((sum(row[k] * weight for row, weight in rows) + ROUNDING) >> (2 * WEIGHT_BITS)
+                        for k in range(self.out_width * 4))
+        return bytes(data)
+
+# Bytes of pixel buffers resize_rows() holds at its peak for the same arguments: those
+# of the cascade that covers the output (see core.peak_memory(), stream.stream_memory()
+# and mapped.mapped_memory()); the filter holds far less.
+def resize_memory(width, height, out_width, out_height, engine="auto", workers=1, stream=False,
+                  directory=None):
+    scale_factor = cover_factor(width, height, out_width, out_height)
+    if scale_factor == 1:
+        return width * height * 4
+    if stream:
+        return stream_memory(width, height, scale_factor, engine)
+    if directory is not None:
+        return mapped_memory(width, height, scale_factor, engine)
+    return peak_memory(width, height, scale_factor, engine, workers)
+
+# Resizes a flat RGBA (or RGB, if rgba is False) byte buffer of width * height pixels
+# to out_width * out_height, and writes the RGBA rows to the row store destination,
+# in order from the top. The smallest cascade covering the output runs as
+# superxbr.scale() does, or through the streaming scaler if stream is True (on a
+# single process), or with its buffers in scratch files in directory if given (see
+# mapped.py); the area filter then brings it to the exact size, unless it is that
+# size already. progress, evaluations, skip_transparent, cache and profile are as
+# for superxbr.scale(); the cache holds the covering scale, and profile also records
+# the filter.
+def resize_rows(pixels, destination, width, height, out_width, out_height, rgba=True, engine="auto", progress=None,
+                workers=1, evaluations=None, skip_transparent=False, cache=None, profile=None, stream=False,
+                directory=None):
+    if width < 1 or height < 1 or out_width < 1 or out_height < 1:
+        raise ValueError("cannot resize %dx%d pixels to %dx%d" % (width, height, out_width, out_height))
+    if len(pixels) != width * height * (4 if rgba else 3):
+        raise ValueError("pixel buffer does not match a %dx%d %s image" %
+                         (width, height, "RGBA" if rgba else "RGB"))
+    scale_factor = cover_factor(width, height, out_width, out_height)
+    scaled_width = width * scale_factor
+    scaled_height = height * scale_factor
+    if (scaled_width, scaled_height) != (out_width, out_height):
+        destination = DownsampleRows(destination, scaled_width, scaled_height, out_width, out_height, engine)
+
+    start = None
+    if scale_factor == 1:
+        start = stage_start(profile)
+        destination.write(0, pixels if rgba else rgb_to_rgba(pixels))
+    elif stream:
+        scaled = FileRows(scaled_width)
+        try:
+            scale_stream(BufferRows(pixels, width, 4 if rgba else 3), scaled, width, height, scale_factor, rgba,
+                         engine, progress, evaluations=evaluations, skip_transparent=skip_transparent,
+                         profile=profile)
+            start = stage_start(profile)
+            for y in range(0, scaled_height, BAND_ROWS):
+                destination.write(y, scaled.read(y, min(y + BAND_ROWS, scaled_height)))
+        finally:
+            scaled.close()
+    elif directory is not None:
+        scale_mapped(pixels, destination, width, height, scale_factor, rgba, engine, progress, workers, evaluations,
+                     skip_transparent, profile, directory)
+    else:
+        scaled = scale(pixels, width, height, scale_factor, rgba, engine, progress, workers, evaluations,
+                       skip_transparent, cache, profile)
+        start = stage_start(profile)
+        destination.write(0, scaled)
+    if start is not None and isinstance(destination, DownsampleRows):
+        stage_end(profile, start, "resample", out_width * out_height, out_width * out_height * 4)
+
+# Resizes like resize_rows(), and returns the result as RGBA bytes of size
+# out_width * out_height * 4.
+def resize(pixels, width, height, out_width, out_height, rgba=True, engine="auto", progress=None, workers=1,
+           evaluations=None, skip_transparent=False, cache=None, profile=None, stream=False, directory=None):
+    resized = bytearray(out_width * out_height * 4)
+    resize_rows(pixels, BufferRows(resized, out_width), width, height, out_width, out_height, rgba, engine,
+                progress, workers, evaluations, skip_transparent, cache, profile, stream, directory)
+    return bytes(resized)
@@ -0,0 +1,218 @@
+# Streaming scaler: scales an image band of rows by band of rows, so the memory it
+# needs grows with the image width but not with its height.
+#
+# Pixels come from and go to row stores: objects with read(y0, y1), returning rows
+# y0 to y1 as bytes, and write(y0, data), storing whole rows from row y0 on. The
+# GIMP plugin wraps its pixel regions this way; BufferRows and FileRows below cover
+# images in memory and in temporary files.
+#
+# Every 2x step sweeps over the image twice:
+#
+# - downwards, the first and second pass run on a window of rows that slides along
+#   the image. The first pass fills in rows just before the second pass needs them,
+#   and every band the second pass finishes goes to the output store.
+# - upwards, the third pass reads the bands back from the output store and
+#   overwrites them with the final rows. As in the whole-image engines, the row
+#   below a band already holds final pixels when the band is computed.
+#
+# The windows keep every row the passes sample around a band (see kernel.py), so no
+# sample is clamped anywhere but at the real image edges and the result is identical
+# to superxbr.scale(). Steps of a cascade other than the last write their output to
+# temporary files.
+
+from array import array
+import tempfile
+
+from .cascade import cascade_steps, step_progress
+from .core import get_engine, no_progress, valid_scale_factor
+from .kernel import add_evaluations, pass3_wavefronts
+from .profile import PASS_STAGES, stage_end, stage_start
+from .progress import report_passes
+
+# Output rows per band. Larger bands need more memory, but give the NumPy engine
+# longer rows of pixels to work on at once in the third pass.
+BAND_ROWS = 512
+
+# Rows around a band of output rows the first two passes need: the second pass
+# samples 3 rows above and 4 below a block, rounded to whole blocks here, and the
+# first pass samples 1 original row above and 2 below a block.
+PASS2_ABOVE = 4
+PASS2_BELOW = 6
+PASS1_BELOW = 2
+
+# The third pass samples 2 rows above and 1 below a pixel.
+PASS3_ABOVE = 2
+PASS3_BELOW = 1
+
+# Row store over an image in memory: a flat buffer (bytes, bytearray or array of
+# bytes) of channels bytes per pixel. Writing needs a bytearray or array.
+class BufferRows(object):
+
+    def __init__(self, pixels, width, channels=4):
+        self.pixels = pixels
+        self.row_bytes = width * channels
+
+    def read(self, y0, y1):
+        return self.pixels[y0 * self.row_bytes:y1 * self.row_bytes]
+
+    def write(self, y0, data):
+        if isinstance(self.pixels, array):
+            data = array("B", data)
+        self.pixels[y0 * self.row_bytes:y0 * self.row_bytes + len(data)] = data
+
+# Row store in an anonymous temporary file, holding RGBA rows of width pixels.
+class FileRows(object):
+
+    def __init__(self, width):
+        self.row_bytes = width * 4
+        self.file = tempfile.TemporaryFile(prefix="superxbr-")
+
+    def read(self, y0, y1):
+        self.file.seek(y0 * self.row_bytes)
+        return self.file.read((y1 - y0) * self.row_bytes)
+
+    def write(self, y0, data):
+        self.file.seek(y0 * self.row_bytes)
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+# Pixels the windows of a 2x step hold, for an original width and band height:
+# (window of output rows, window of original rows).
+def window_sizes(original_width, band_rows):
+    output_rows = band_rows + PASS2_ABOVE + PASS2_BELOW + 2 * PASS1_BELOW
+    original_rows = band_rows // 2 + (PASS2_ABOVE + PASS2_BELOW) // 2 + PASS1_BELOW
+    return output_rows * original_width * 2, original_rows * original_width
+
+# Bytes of pixel buffers scale_stream() holds at its peak: the windows of the last,
+# widest step.
+def stream_memory(width, height, scale_factor=2, engine="auto", band_rows=BAND_ROWS):
+    window, original = window_sizes(width * scale_factor // 2, min(band_rows, height * scale_factor))
+    return (window + original) * get_engine(engine).PIXEL_BYTES
+
+# Reads rows y0 to y1 of a row store into the start of an engine buffer. profile, if
+# given, records the reading and the conversion, see profile.py.
+def load_rows(module, store, rgba, width, y0, y1, buffer, profile=None):
+    count = (y1 - y0) * width
+    start = stage_start(profile)
+    data = store.read(y0, y1)
+    stage_end(profile, start, "read rows", count, len(data))
+    start = stage_start(profile)
+    buffer[0:count] = module.pixels_from_bytes(data, rgba)
+    stage_end(profile, start, "to pixels", count, count * module.PIXEL_BYTES)
+
+# Writes count pixels of an engine buffer, from pixel start on, to a row store from
+# row y0 on. profile, if given, records the conversion and the writing.
+def store_rows(module, store, y0, buffer, start_pixel, count, profile=None):
+    start = stage_start(profile)
+    data = module.pixels_to_bytes(buffer, start_pixel, count)
+    stage_end(profile, start, "to bytes", count, len(data))
+    start = stage_start(profile)
+    store.write(y0, data)
+    stage_end(profile, start, "write rows", count, len(data))
+
+# One 2x step from the source row store (RGBA, or RGB if rgba is False) of
+# original_width * original_height pixels to the output row store.
+# progress is called as progress(pass_number, fraction); the first two passes run
+# together and report as both, see progress.report_passes(). evaluations, if given, receives the evaluation
+# counts, see kernel.add_evaluations(). skip_transparent is described in kernel.py.
+# profile, if given, records every stage, summed over the bands, see profile.py.
+def stream_step(module, source, rgba, output, original_width, original_height, band_rows, progress,
+                evaluations=None, skip_transparent=False, profile=None):
+    out_width = original_width * 2
+    out_height = original_height * 2
+    band_rows = min(band_rows, out_height)
+    window_size, original_size = window_sizes(original_width, band_rows)
+    window = module.allocate(window_size)
+    original_pixel_data = module.allocate(original_size)
+
+    # Downwards: the window holds image rows window_top to filled, where the ones
+    # above the current band already went through the second pass.
+    window_top = 0
+    filled = 0
+    for y0 in range(0, out_height, band_rows):
+        y1 = min(out_height, y0 + band_rows)
+        top = max(0, y0 - PASS2_ABOVE)
+        bottom = min(out_height, y1 + PASS2_BELOW)
+
+        if top > window_top:
+            window[0:(filled - top) * out_width] = \
+                window[(top - window_top) * out_width:(filled - window_top) * out_width]
+            window_top = top
+
+        # the window is the output of the original rows from top // 2 on
+        s0 = top // 2
+        s1 = min(original_height, bottom // 2 + PASS1_BELOW)
+        load_rows(module, source, rgba, original_width, s0, s1, original_pixel_data, profile)
+        start = stage_start(profile)
+        add_evaluations(evaluations, 1, module.pass1_rows(original_pixel_data, original_width, s1 - s0, window,
+                                                          filled - top, bottom - top, skip_transparent))
+        stage_end(profile, start, PASS_STAGES[1], (bottom - filled) * out_width)
+        filled = bottom
+
+        start = stage_start(profile)
+        add_evaluations(evaluations, 2, module.pass2_interior(window, out_width, bottom - top, y0 - top, y1 - top,
+                                                              skip_transparent))
+        add_evaluations(evaluations, 2, module.pass2_border(window, out_width, bottom - top, y0 - top, y1 - top,
+                                                            skip_transparent))
+        stage_end(profile, start, PASS_STAGES[2], (y1 - y0) * out_width)
+        store_rows(module, output, y0, window, (y0 - top) * out_width, (y1 - y0) * out_width, profile)
+        report_passes(progress, (1, 2), float(y1)/out_height)
+
+    # Upwards: the window holds the band, the rows above it the third pass samples
+    # and the final row below it.
+    for y1 in range(out_height, 0, -band_rows):
+        y0 = max(0, y1 - band_rows)
+        top = max(0, y0 - PASS3_ABOVE)
+        bottom = min(out_height, y1 + PASS3_BELOW)
+        rows = bottom - top
+
+        load_rows(module, output, True, out_width, top, bottom, window, profile)
+        start = stage_start(profile)
+        add_evaluations(evaluations, 3, module.pass3_tile(window, out_width, rows, bottom - y1, bottom - y0,
+                                                          0, pass3_wavefronts(out_width, rows), skip_transparent))
+        stage_end(profile, start, PASS_STAGES[3], (y1 - y0) * out_width)
+        store_rows(module, output, y0, window, (y0 - top) * out_width, (y1 - y0) * out_width, profile)
+        progress(3, float(out_height - y0)/out_height)
+
+# Scales the image in the source row store (RGBA, or RGB if rgba is False) of
+# width * height pixels by scale_factor into the destination row store, which
+# receives RGBA rows. The destination is also read back from while scaling.
+# Takes the same options as superxbr.scale() and gives the same result. profile, if
+# given, also records reading and writing the row stores.
+def scale_stream(source, destination, width, height, scale_factor=2, rgba=True, engine="auto",
+                 progress=None, band_rows=BAND_ROWS, evaluations=None, skip_transparent=False, profile=None):
+    if not valid_scale_factor(scale_factor):
+        raise ValueError("scale factor not a power of 2: %r" % (scale_factor,))
+    if band_rows < 2:
+        raise ValueError("bands need at least 2 rows: %r" % (band_rows,))
+
+    module = get_engine(engine)
+    # bands of whole blocks
+    band_rows += band_rows % 2
+    steps = cascade_steps(scale_factor)
+    progress = progress or no_progress
+
+    step_source = source
+    temporary = []
+    try:
+        for step in range(steps):
+            if step == steps - 1:
+                output = destination
+            else:
+                output = FileRows(width * 2)
+                temporary.append(output)
+            stream_step(module, step_source, rgba, output, width, height, band_rows,
+                        step_progress(progress, step + 1, steps), evaluations, skip_transparent, profile)
+            # the step's source is no longer needed
+            if step_source is not source:
+                temporary.remove(step_source)
+                step_source.close()
+            step_source = output
+            rgba = True
+            width *= 2
+            height *= 2
+    finally:
+        for rows in temporary:
+            rows.close()